@@ -1,54 +1,39 @@
-import threading
 from networktables import NetworkTables
 import argparse
 from datetime import datetime
-import time
-import matplotlib.pyplot as plt
+from BufferedWriter import BufferedRowWriter, FormattedRowSink
+from NetworkTablesConnection import DEFAULT_ROBOT_IP, addConnectionArguments, connectToNetworkTables
 
 date_str = datetime.now().strftime('%Y%m%d%H%M%S')
 
 parser = argparse.ArgumentParser(description = 'Script to log data from robot. ')
 parser.add_argument('-o', '--output-file', action = 'store', default = date_str + '_XY_Accelerometer_Values.csv', help = 'output csv file name')
-args = parser.parse_args()
-print(args)
-
-cond = threading.Condition()
-notified = [False]
-
-def connectionListener(connected, info):
-    print(info, '; Connected=%s' % connected)
-    with cond:
-        notified[0] = True
-        cond.notify()
-
-NetworkTables.initialize(server='10.11.21.2') #127.0.0.1
-NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-with cond:
-    print("Waiting")
-    if not notified[0]:
-        cond.wait()
-
-# Insert your processing code here
-print("Connected!")
-table = NetworkTables.getTable('Shuffleboard/Drive')
-robotTable = NetworkTables.getTable('Robot')
-robotEnabled = robotTable.getBoolean('enabled', False)
-
-counter = 1000
-
-while counter > 0:
-   
-
-        instantXAcceleration = table.getNumber('Accelerometer/xInstantAccel', 0)
-        instantYAcceleration = table.getNumber('Accelerometer/yInstantAccel', 0)
-        currentTime = table.getNumber('Accelerometer/currentTime', 0)
-        print("currentTime = {}, instantXAcceleration = {}, instantYAcceleration = {}".format(currentTime, instantXAcceleration, instantYAcceleration))
-        counter -= 1
-        with open(args.output_file, 'a') as fh:
-            fh.write("{}, {}, {}\n".format(currentTime, instantXAcceleration, instantYAcceleration))
-                
-
-        
-            
-
+addConnectionArguments(parser, DEFAULT_ROBOT_IP)
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+
+    connectToNetworkTables(NetworkTables, args.robot_ip, args.robot_team, args.connect_timeout)
+    table = NetworkTables.getTable('Shuffleboard/Drive')
+    robotTable = NetworkTables.getTable('Robot')
+    robotEnabled = robotTable.getBoolean('enabled', False)
+
+    counter = 1000
+    # Samples are written on a separate thread instead of reopening the file each time
+    row_writer = BufferedRowWriter(FormattedRowSink(args.output_file, "{}, {}, {}\n", mode='a'))
+
+    try:
+        while counter > 0:
+            instantXAcceleration = table.getNumber('Accelerometer/xInstantAccel', 0)
+            instantYAcceleration = table.getNumber('Accelerometer/yInstantAccel', 0)
+            currentTime = table.getNumber('Accelerometer/currentTime', 0)
+            print("currentTime = {}, instantXAcceleration = {}, instantYAcceleration = {}".format(currentTime, instantXAcceleration, instantYAcceleration))
+            counter -= 1
+            row_writer.writeRow((currentTime, instantXAcceleration, instantYAcceleration))
+    finally:
+        row_writer.close()
+    NetworkTables.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import os
+import csv
+import json
+import math
+import struct
+import argparse
+
+# Binary capture file layout:
+#   8 bytes   magic, b'T1100CAP'
+#   4 bytes   format version, little endian unsigned int
+#   4 bytes   header length, little endian unsigned int
+#   header    UTF-8 JSON holding the input config and the column schema
+#   padding   zero bytes up to the next multiple of 8
+#   records   fixed-width little endian records, one per row, with one
+#             8 byte double or 1 byte boolean per column in column order
+MAGIC = b'T1100CAP'
+VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+TYPE_FORMATS = {"double": 'd', "boolean": '?'}
+NUMPY_FORMATS = {"double": '<f8', "boolean": '?'}
+# Rows converted to CSV at a time, keeps conversion memory bounded
+EXPORT_CHUNK_ROWS = 65536
+
+def recordFormat(columns):
+    # Unknown column types are stored as doubles
+    return '<' + ''.join(TYPE_FORMATS.get(column["type"], 'd') for column in columns)
+
+def dataOffset(header_length):
+    offset = PREAMBLE.size + header_length
+    return (offset + 7) // 8 * 8
+
+# Writes rows to a binary capture file. Used as a sink for BufferedRowWriter.
+class BinaryRowSink(object):
+    def __init__(self, file_path, columns, config=None):
+        # columns is a list of dictionaries with at least "name" and "type"
+        self.columns = columns
+        self.record = struct.Struct(recordFormat(columns))
+        header = json.dumps({"config": config, "columns": columns,
+                             "recordSize": self.record.size}).encode('utf-8')
+        self.file = open(file_path, 'wb')
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        self.file.write(header)
+        self.file.write(bytes(dataOffset(len(header)) - PREAMBLE.size - len(header)))
+
+    def writeRows(self, rows):
+        pack = self.record.pack
+        try:
+            data = b''.join([pack(*row) for row in rows])
+        except struct.error:
+            # Some values are missing (None), store them as NaN or False
+            data = b''.join([pack(*self.fillMissing(row)) for row in rows])
+        self.file.write(data)
+
+    def fillMissing(self, row):
+        filled = []
+        for column, value in zip(self.columns, row):
+            if value is None:
+                value = False if column["type"] == "boolean" else math.nan
+            filled.append(value)
+        return filled
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def readHeader(file_path):
+    with open(file_path, 'rb') as fp:
+        magic, version, header_length = PREAMBLE.unpack(fp.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise Exception("{} is not a binary capture file.".format(file_path))
+        if version != VERSION:
+            raise Exception("{} has capture format version {} but only version {} is supported.".format(file_path, version, VERSION))
+        header = json.loads(fp.read(header_length).decode('utf-8'))
+    header["dataOffset"] = dataOffset(header_length)
+    return header
+
+def readCapture(file_path):
+    # Returns the header and a dictionary of NumPy column views into a
+    # read-only memory map of the file. Nothing is copied until used.
+    import numpy as np
+    header = readHeader(file_path)
+    columns = header["columns"]
+    offsets = []
+    offset = 0
+    for column in columns:
+        offsets.append(offset)
+        offset += struct.calcsize('<' + TYPE_FORMATS.get(column["type"], 'd'))
+    record_dtype = np.dtype({"names": [column["name"] for column in columns],
+                             "formats": [NUMPY_FORMATS.get(column["type"], '<f8') for column in columns],
+                             "offsets": offsets,
+                             "itemsize": header["recordSize"]})
+    # Ignore a partial record at the end, e.x: after a crash
+    row_count = (os.path.getsize(file_path) - header["dataOffset"]) // header["recordSize"]
+    if row_count > 0:
+        records = np.memmap(file_path, dtype=record_dtype, mode='r',
+                            offset=header["dataOffset"], shape=(row_count,))
+    else:
+        records = np.zeros(0, dtype=record_dtype)
+    return header, {column["name"]: records[column["name"]] for column in columns}
+
+def exportCsv(capture_path, csv_path, no_labels=False):
+    header, columns = readCapture(capture_path)
+    names = [column["name"] for column in header["columns"]]
+    row_count = len(columns[names[0]]) if names else 0
+    with open(csv_path, 'w', newline='') as fp:
+        csv_writer = csv.writer(fp, dialect='unix')
+        if not no_labels:
+            csv_writer.writerow(names)
+        for start in range(0, row_count, EXPORT_CHUNK_ROWS):
+            end = min(start + EXPORT_CHUNK_ROWS, row_count)
+            # tolist() gives Python floats and bools, so the text matches
+            # what the collector writes for CSV output
+            chunk = [columns[name][start:end].tolist() for name in names]
+            csv_writer.writerows(zip(*chunk))
+    return row_count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description = 'Convert a binary robot data capture to CSV. ')
+    parser.add_argument('capture_file', help='Binary capture file written by RobotDataCollector')
+    parser.add_argument('-o', '--output-file', action='store', default=None, help='Name of the CSV file to write, defaults to the capture file name with a .csv extension')
+    parser.add_argument('-l', '--no-labels', action='store_true', help='Do not insert heading labels in the CSV output file')
+    args = parser.parse_args(argv)
+    output_file = args.output_file
+    if output_file is None:
+        output_file = os.path.splitext(args.capture_file)[0] + ".csv"
+    rows = exportCsv(args.capture_file, output_file, args.no_labels)
+    print("Wrote {} rows to {}".format(rows, output_file))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+import csv
+import time
+import queue
+import atexit
+import threading
+
+# Writes rows as CSV using the same dialect as the collector output
+class CsvRowSink(object):
+    def __init__(self, file_path, field_names=None, mode='w'):
+        self.file = open(file_path, mode, newline='')
+        self.csv_writer = csv.writer(self.file, dialect='unix')
+        if field_names is not None:
+            self.csv_writer.writerow(field_names)
+
+    def writeRows(self, rows):
+        self.csv_writer.writerows(rows)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# Writes rows as text lines built from a format string, e.x: "{}, {}\n"
+class FormattedRowSink(object):
+    def __init__(self, file_path, line_format, mode='w'):
+        self.file = open(file_path, mode)
+        self.line_format = line_format
+
+    def writeRows(self, rows):
+        line_format = self.line_format
+        self.file.write("".join([line_format.format(*row) for row in rows]))
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# Hands rows off to a dedicated writer thread through a bounded queue so that
+# file I/O never blocks the thread collecting samples. Rows are written to the
+# sink in batches and flushed after a number of rows or a period of time,
+# whichever comes first. When the queue is full new rows are dropped and
+# counted rather than blocking. Rows are written as given, so callers must
+# not modify a row after handing it to writeRow.
+class BufferedRowWriter(object):
+    STOP = object()
+
+    def __init__(self, sink, queue_size=10000, batch_size=500, flush_rows=1000, flush_interval=1.0, stats=None):
+        self.sink = sink
+        # Optional CollectorStats that gets the time spent writing each batch
+        self.stats = stats
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.high_water_mark = 0
+        self.dropped_rows = 0
+        self.written_rows = 0
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self.writerLoop, name="BufferedRowWriter", daemon=True)
+        self.thread.start()
+        # Make sure buffered rows reach the file even if the caller never
+        # gets to close the writer, e.x: after an unhandled exception
+        atexit.register(self.close)
+
+    def writeRow(self, row):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            self.dropped_rows += 1
+            return False
+        depth = self.queue.qsize()
+        if depth > self.high_water_mark:
+            self.high_water_mark = depth
+        return True
+
+    def writerLoop(self):
+        rows_since_flush = 0
+        last_flush = time.monotonic()
+        stopping = False
+        while not stopping:
+            # Wait for the first row of the batch, then take whatever else is
+            # already queued without waiting
+            batch = []
+            try:
+                row = self.queue.get(timeout=self.flush_interval)
+                if row is self.STOP:
+                    stopping = True
+                else:
+                    batch.append(row)
+            except queue.Empty:
+                pass
+            while not stopping and len(batch) < self.batch_size:
+                try:
+                    row = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is self.STOP:
+                    stopping = True
+                else:
+                    batch.append(row)
+            if self.error is not None:
+                # The sink failed, keep draining so that rows are not
+                # queued forever
+                continue
+            try:
+                if batch:
+                    write_start = time.perf_counter()
+                    self.sink.writeRows(batch)
+                    if self.stats is not None:
+                        self.stats.recordStage("write", time.perf_counter() - write_start)
+                    self.written_rows += len(batch)
+                    rows_since_flush += len(batch)
+                now = time.monotonic()
+                if rows_since_flush > 0 and (stopping or rows_since_flush >= self.flush_rows or now - last_flush >= self.flush_interval):
+                    self.sink.flush()
+                    rows_since_flush = 0
+                    last_flush = now
+            except Exception as e:
+                self.error = e
+        try:
+            self.sink.close()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        # The stop marker goes behind every queued row, so the writer thread
+        # writes and flushes all of them before it exits
+        self.queue.put(self.STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise Exception("Writing output failed: {}".format(self.error))
+
+    def printStats(self):
+        print("Rows written: {}, dropped: {}, queue high-water mark: {} of {}".format(
+            self.written_rows, self.dropped_rows, self.high_water_mark, self.queue.maxsize))
+
+# Row writer handed out by a RowWriterPool. It has the same interface as
+# BufferedRowWriter, but its rows are written by one of the pool's threads.
+class PooledRowWriter(object):
+    def __init__(self, worker, sink, stats=None):
+        self.worker = worker
+        self.sink = sink
+        self.stats = stats
+        self.high_water_mark = 0
+        self.dropped_rows = 0
+        self.written_rows = 0
+        self.rows_since_flush = 0
+        self.last_flush = time.monotonic()
+        self.error = None
+        self.closed = False
+        self.done = threading.Event()
+
+    def writeRow(self, row):
+        worker_queue = self.worker.queue
+        try:
+            worker_queue.put_nowait((self, row))
+        except queue.Full:
+            self.dropped_rows += 1
+            return False
+        depth = worker_queue.qsize()
+        if depth > self.high_water_mark:
+            self.high_water_mark = depth
+        return True
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        # Queued behind every row of this writer, so they are all written
+        # before the sink is closed. The worker already closed the sink if
+        # the pool was closed first.
+        if not self.done.is_set():
+            self.worker.queue.put((self, RowWriterPool.STOP))
+        self.done.wait()
+        if self.error is not None:
+            raise Exception("Writing output failed: {}".format(self.error))
+
+    def printStats(self):
+        print("Rows written: {}, dropped: {}, queue high-water mark: {} of {}".format(
+            self.written_rows, self.dropped_rows, self.high_water_mark, self.worker.queue.maxsize))
+
+# A thread of a RowWriterPool with the queue its writers put rows on
+class RowWriterPoolWorker(object):
+    def __init__(self, pool, index, queue_size):
+        self.pool = pool
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writers = []
+        self.thread = threading.Thread(target=self.writerLoop, name="RowWriterPool-{}".format(index), daemon=True)
+        self.thread.start()
+
+    def writerLoop(self):
+        pool = self.pool
+        stopping = False
+        while not stopping:
+            # Wait for the first row, then take whatever else is already
+            # queued and group the rows by writer
+            batches = {}
+            try:
+                items = [self.queue.get(timeout=pool.flush_interval)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < pool.batch_size:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            closing = []
+            for writer, row in items:
+                if writer is None:
+                    stopping = True
+                elif row is RowWriterPool.STOP:
+                    closing.append(writer)
+                else:
+                    batches.setdefault(writer, []).append(row)
+            for writer, batch in batches.items():
+                self.writeBatch(writer, batch)
+            now = time.monotonic()
+            for writer in self.writers:
+                if writer.rows_since_flush > 0 and (writer in closing or writer.rows_since_flush >= pool.flush_rows or now - writer.last_flush >= pool.flush_interval):
+                    self.flushWriter(writer, now)
+            for writer in closing:
+                self.closeWriter(writer)
+        # The pool is closing, writers that are still open are flushed and
+        # closed so that their rows are not lost
+        now = time.monotonic()
+        for writer in self.writers:
+            if writer.rows_since_flush > 0:
+                self.flushWriter(writer, now)
+            self.closeWriter(writer)
+
+    def writeBatch(self, writer, batch):
+        if writer.error is not None:
+            return
+        try:
+            write_start = time.perf_counter()
+            writer.sink.writeRows(batch)
+            if writer.stats is not None:
+                writer.stats.recordStage("write", time.perf_counter() - write_start)
+            writer.written_rows += len(batch)
+            writer.rows_since_flush += len(batch)
+        except Exception as e:
+            writer.error = e
+
+    def flushWriter(self, writer, now):
+        writer.rows_since_flush = 0
+        writer.last_flush = now
+        if writer.error is not None:
+            return
+        try:
+            writer.sink.flush()
+        except Exception as e:
+            writer.error = e
+
+    def closeWriter(self, writer):
+        try:
+            writer.sink.close()
+        except Exception as e:
+            if writer.error is None:
+                writer.error = e
+        with self.pool.lock:
+            self.writers = [open_writer for open_writer in self.writers if open_writer is not writer]
+        writer.done.set()
+
+# A fixed number of writer threads shared by many outputs, e.x: one per robot
+# when collecting from several robots. Every writer is served by a single
+# thread so its rows stay in order.
+class RowWriterPool(object):
+    STOP = object()
+
+    def __init__(self, workers=1, queue_size=10000, batch_size=500, flush_rows=1000, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.next_worker = 0
+        self.closed = False
+        self.workers = [RowWriterPoolWorker(self, index, queue_size) for index in range(max(1, workers))]
+        atexit.register(self.close)
+
+    def openWriter(self, sink, stats=None):
+        with self.lock:
+            worker = self.workers[self.next_worker % len(self.workers)]
+            self.next_worker += 1
+            writer = PooledRowWriter(worker, sink, stats)
+            # The list is replaced rather than changed so that the worker
+            # thread can iterate over it without the lock
+            worker.writers = worker.writers + [writer]
+        return writer
+
+    def close(self):
+        # Writers should be closed first, the threads close any writer that
+        # is still open before they stop
+        if self.closed:
+            return
+        self.closed = True
+        atexit.unregister(self.close)
+        for worker in self.workers:
+            worker.queue.put((None, None))
+        for worker in self.workers:
+            worker.thread.join()
@@ -0,0 +1,391 @@
+import os
+import csv
+import json
+import time
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import BinaryCapture
+import SparseCapture
+import RotatingCapture
+from CsvCapture import CSV_BOOLEANS, csvNumber
+
+# Column layouts of the files written by the older scripts, which have no
+# labels. They are told apart by the number of values in a row.
+ACCEL_COLUMNS = ["currentTime", "instantAccel"]
+ACCEL_XY_COLUMNS = ["currentTime", "xInstantAccel", "yInstantAccel"]
+STOPPING_DISTANCE_COLUMNS = ["drivingSpeed", "expectedDistance", "actualDistance", "stoppingDistance"]
+UNLABELED_LAYOUTS = {len(ACCEL_COLUMNS): ACCEL_COLUMNS,
+                     len(ACCEL_XY_COLUMNS): ACCEL_XY_COLUMNS,
+                     len(STOPPING_DISTANCE_COLUMNS): STOPPING_DISTANCE_COLUMNS}
+# Speeds closer than this are the same drivingSpeed setting
+SPEED_DECIMALS = 3
+
+def isNumber(text):
+    try:
+        float(text.strip().strip('"'))
+        return True
+    except ValueError:
+        return text.strip().strip('"') in CSV_BOOLEANS
+
+def parseCsvText(text, file_path):
+    # Returns the labels and a 2D array with one row per CSV row. The values
+    # are parsed by NumPy in one call, rows with missing values fall back to
+    # the csv module.
+    first_line, _, body = text.partition('\n')
+    first_row = next(csv.reader([first_line]), [])
+    if first_row and not all(isNumber(value) for value in first_row):
+        labels = first_row
+    else:
+        body = text
+        labels = UNLABELED_LAYOUTS.get(len(first_row))
+        if labels is None:
+            raise Exception("{} has no labels and {} values per row, which is not a known layout.".format(file_path, len(first_row)))
+    column_count = len(labels)
+    row_count = body.count('\n') + (0 if body.endswith('\n') or not body else 1)
+    flat = body.replace('"', '').replace('True', '1').replace('False', '0').replace('\n', ',')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            values = np.fromstring(flat, dtype=float, sep=',') if flat.strip(', ') else np.zeros(0)
+        if values.size != row_count * column_count:
+            raise ValueError("ragged rows")
+        return labels, values.reshape(row_count, column_count)
+    except (ValueError, DeprecationWarning):
+        rows = [[csvNumber(value) for value in row[:column_count]] + [float('nan')] * (column_count - len(row))
+                for row in csv.reader(body.splitlines()) if row]
+        return labels, np.array(rows, dtype=float).reshape(len(rows), column_count)
+
+def loadCapture(file_path):
+    # Returns a dictionary of float64 NumPy columns for a CSV capture, a
+    # binary or sparse capture or the manifest of a segmented capture
+    if file_path.endswith(RotatingCapture.MANIFEST_SUFFIX):
+        manifest = RotatingCapture.readManifest(file_path)
+        directory = os.path.dirname(file_path)
+        blocks = []
+        labels = manifest["labels"]
+        for segment in manifest["segments"]:
+            segment_path = os.path.join(directory, segment["file"])
+            with RotatingCapture.openSegment(segment_path, manifest["compression"]) as fp:
+                try:
+                    text = fp.read()
+                except EOFError:
+                    print("{} ends in a partial block, skipping it.".format(segment_path))
+                    continue
+            if text:
+                labels, values = parseCsvText(text, segment_path)
+                blocks.append(values)
+        if not blocks:
+            return {}
+        values = np.concatenate(blocks)
+        return {name: values[:, index] for index, name in enumerate(labels)}
+    with open(file_path, 'rb') as fp:
+        magic = fp.read(len(BinaryCapture.MAGIC))
+    if magic in [BinaryCapture.MAGIC, SparseCapture.MAGIC]:
+        reader = BinaryCapture if magic == BinaryCapture.MAGIC else SparseCapture
+        header, columns = reader.readCapture(file_path)
+        return {name: np.asarray(values, dtype=float) for name, values in columns.items()}
+    with open(file_path, newline='') as fp:
+        text = fp.read()
+    if not text.strip():
+        return {}
+    labels, values = parseCsvText(text, file_path)
+    return {name: values[:, index] for index, name in enumerate(labels)}
+
+def segmentStarts(time_values, runs=None):
+    # True where a new segment starts: at the first row, when the run
+    # changes or when time goes backwards, e.x: after a robot restart
+    starts = np.ones(len(time_values), dtype=bool)
+    starts[1:] = np.diff(time_values) < 0
+    if runs is not None:
+        starts[1:] |= np.diff(runs) != 0
+    return starts
+
+def cumulativeTrapezoid(values, time_values, starts, initial):
+    # Integrates values over time, starting again from initial[segment] at
+    # every segment start, in one pass over the arrays
+    steps = np.zeros(len(values))
+    steps[1:] = (values[1:] + values[:-1]) * 0.5 * np.diff(time_values)
+    steps[starts] = 0.0
+    totals = np.cumsum(steps)
+    segment = np.cumsum(starts) - 1
+    return totals - totals[np.flatnonzero(starts)][segment] + initial[segment]
+
+def segmentSlopes(x, y, segment, segment_count):
+    # Least squares slope of y over x within every segment, NaN for
+    # segments of a single sample
+    count = np.bincount(segment, minlength=segment_count)
+    sum_x = np.bincount(segment, x, segment_count)
+    sum_y = np.bincount(segment, y, segment_count)
+    sum_xx = np.bincount(segment, x * x, segment_count)
+    sum_xy = np.bincount(segment, x * y, segment_count)
+    denominator = count * sum_xx - sum_x * sum_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, (count * sum_xy - sum_x * sum_y) / denominator, np.nan)
+
+# Integrates instantAccel to velocity and position and compares the velocity
+# with instantVelocity when it was captured. Samples repeated by polling, with
+# the same currentTime as the sample before, are dropped first. Every run of
+# a sweep, and every restart of currentTime, is integrated on its own.
+def integrateAcceleration(columns, accel_name="instantAccel", accel_scale=1.0):
+    time_values = columns["currentTime"]
+    accel = columns[accel_name] * accel_scale
+    measured = columns.get("instantVelocity")
+    runs = columns.get("run")
+    keep = np.ones(len(time_values), dtype=bool)
+    keep[1:] = np.diff(time_values) != 0
+    if runs is not None:
+        keep[1:] |= np.diff(runs) != 0
+    keep &= np.isfinite(time_values) & np.isfinite(accel)
+    time_values = time_values[keep]
+    accel = accel[keep]
+    if runs is not None:
+        runs = runs[keep]
+    if measured is not None:
+        measured = measured[keep]
+    if len(time_values) < 2:
+        return None
+    starts = segmentStarts(time_values, runs)
+    start_indexes = np.flatnonzero(starts)
+    segment = np.cumsum(starts) - 1
+    initial_velocity = np.zeros(len(start_indexes)) if measured is None else np.nan_to_num(measured[start_indexes])
+    velocity = cumulativeTrapezoid(accel, time_values, starts, initial_velocity)
+    position = cumulativeTrapezoid(velocity, time_values, starts, np.zeros(len(start_indexes)))
+    result = {"samples": int(len(time_values)),
+              "droppedSamples": int(len(keep) - len(time_values)),
+              "segments": int(len(start_indexes)),
+              "seconds": float(np.sum(np.bincount(segment, np.diff(time_values, prepend=time_values[0]) * ~starts))),
+              "finalVelocity": float(velocity[-1]),
+              "finalPosition": float(position[-1]),
+              "time": time_values,
+              "velocity": velocity,
+              "position": position}
+    if measured is not None:
+        error = velocity - measured
+        finite = np.isfinite(error)
+        elapsed = time_values - time_values[start_indexes][segment]
+        # A constant accelerometer bias makes the error grow linearly, its
+        # slope is the bias in acceleration units
+        slopes = segmentSlopes(elapsed[finite], error[finite], segment[finite], len(start_indexes))
+        result.update({"velocityRmsError": float(np.sqrt(np.mean(error[finite] ** 2))) if finite.any() else float('nan'),
+                       "velocityMaxError": float(np.max(np.abs(error[finite]))) if finite.any() else float('nan'),
+                       "accelBias": float(np.nanmedian(slopes)) if np.isfinite(slopes).any() else float('nan')})
+    return result
+
+def stoppingDistances(columns):
+    # Returns (drivingSpeed, stopping distance) arrays with one value per
+    # drive, or None when the capture holds no drives
+    if all(name in columns for name in ["run", "drivingSpeed", "drivingDistance", "actualDistance"]):
+        # A RobotDataCollector sweep, the last row of a run is measured after
+        # the robot settled
+        runs = columns["run"]
+        if len(runs) == 0:
+            return None
+        last = np.append(np.flatnonzero(np.diff(runs) != 0), len(runs) - 1)
+        speeds = columns["drivingSpeed"][last]
+        if "stoppingDistance" in columns:
+            # Derived while collecting
+            return speeds, np.abs(columns["stoppingDistance"][last])
+        expected = columns["drivingDistance"][last] * np.where(speeds < 0, -1.0, 1.0)
+        return speeds, np.abs(columns["actualDistance"][last] - expected)
+    if "stoppingDistance" in columns and "drivingSpeed" in columns:
+        # Written by the stopping distance scripts, one row per drive
+        return columns["drivingSpeed"], np.abs(columns["stoppingDistance"])
+    return None
+
+def aggregateBySpeed(speeds, distances):
+    # Count, mean, standard deviation, min and max of the stopping distance
+    # of every drivingSpeed, over all repeated drives
+    finite = np.isfinite(speeds) & np.isfinite(distances)
+    speeds = np.round(speeds[finite], SPEED_DECIMALS)
+    distances = distances[finite]
+    unique_speeds, inverse, counts = np.unique(speeds, return_inverse=True, return_counts=True)
+    if len(unique_speeds) == 0:
+        return None
+    means = np.bincount(inverse, distances) / counts
+    variances = np.bincount(inverse, distances * distances) / counts - means * means
+    order = np.argsort(inverse, kind='stable')
+    group_starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return {"speed": unique_speeds,
+            "count": counts,
+            "mean": means,
+            "std": np.sqrt(np.maximum(variances, 0.0)),
+            "min": np.minimum.reduceat(distances[order], group_starts),
+            "max": np.maximum.reduceat(distances[order], group_starts)}
+
+def fitStoppingCurve(speeds, distances, degree=2):
+    # Fits stopping distance as a polynomial of |drivingSpeed|, separately
+    # for driving forward and backward. Returns {"forward": fit, "reverse": fit}
+    # with coefficients from the highest power down and the R squared.
+    fits = {}
+    finite = np.isfinite(speeds) & np.isfinite(distances)
+    for direction, mask in [("forward", speeds > 0), ("reverse", speeds < 0)]:
+        mask &= finite
+        x = np.abs(speeds[mask])
+        y = distances[mask]
+        if len(np.unique(x)) <= degree:
+            continue
+        coefficients = np.polyfit(x, y, degree)
+        residuals = y - np.polyval(coefficients, x)
+        total = np.sum((y - np.mean(y)) ** 2)
+        fits[direction] = {"coefficients": coefficients.tolist(),
+                           "rSquared": float(1.0 - np.sum(residuals ** 2) / total) if total > 0 else 1.0,
+                           "drives": int(len(x))}
+    return fits
+
+def describeFit(fit):
+    terms = []
+    degree = len(fit["coefficients"]) - 1
+    for power, coefficient in zip(range(degree, -1, -1), fit["coefficients"]):
+        terms.append("{:.4g}{}".format(coefficient, "" if power == 0 else ("*s" if power == 1 else "*s^{}".format(power))))
+    return " + ".join(terms)
+
+def plotStoppingDistance(aggregate, fits, image_path, title):
+    # Agg backend without pyplot, like GraphRenderer
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.errorbar(aggregate["speed"], aggregate["mean"], yerr=aggregate["std"], fmt='o', capsize=3, label='robot stopping distance')
+    for direction, fit in fits.items():
+        sign = 1.0 if direction == "forward" else -1.0
+        speeds = aggregate["speed"][aggregate["speed"] * sign > 0]
+        curve = np.linspace(0.0, np.max(np.abs(speeds)), 100)
+        axes.plot(curve * sign, np.polyval(fit["coefficients"], curve), label="{} fit, R^2 {:.3f}".format(direction, fit["rSquared"]))
+    axes.legend()
+    axes.set_xlabel("Speed in %/100")
+    axes.set_ylabel("Stopping Distance in inches")
+    axes.set_title(title)
+    figure.savefig(image_path)
+
+# Everything worth knowing about one capture file. Runs in the worker
+# processes, so only small results are sent back: per-drive stopping
+# distances and acceleration statistics without the integrated arrays.
+def analyzeCapture(file_path, accel_scale=1.0):
+    result = {"file": file_path, "rows": 0, "error": None}
+    try:
+        columns = loadCapture(file_path)
+        result["rows"] = int(len(next(iter(columns.values())))) if columns else 0
+        drives = stoppingDistances(columns)
+        if drives is not None:
+            result["speeds"], result["stoppingDistances"] = drives
+        accel = {}
+        if "currentTime" in columns:
+            for accel_name in ["instantAccel", "xInstantAccel", "yInstantAccel"]:
+                if accel_name in columns:
+                    integrated = integrateAcceleration(columns, accel_name, accel_scale)
+                    if integrated is not None:
+                        for name in ["time", "velocity", "position"]:
+                            del integrated[name]
+                        accel[accel_name] = integrated
+        result["acceleration"] = accel
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+def findCaptures(paths):
+    # Files are taken as given, directories are searched for CSV, binary and
+    # sparse captures and segment manifests
+    captures = []
+    for path in paths:
+        if not os.path.isdir(path):
+            captures.append(path)
+            continue
+        for directory, directory_names, file_names in os.walk(path):
+            directory_names.sort()
+            for file_name in sorted(file_names):
+                if file_name.endswith(RotatingCapture.MANIFEST_SUFFIX) or file_name.endswith('.bin') or file_name.endswith('.sparse') or \
+                   (file_name.endswith('.csv') and not file_name.endswith('_joined.csv')):
+                    captures.append(os.path.join(directory, file_name))
+    return captures
+
+def analyzeCaptures(captures, accel_scale=1.0, workers=None):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(captures))
+    if workers <= 1:
+        return [analyzeCapture(file_path, accel_scale) for file_path in captures]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Many small files are handed out in chunks to keep the overhead down
+        chunk_size = max(1, len(captures) // (workers * 4))
+        return list(pool.map(analyzeCapture, captures, [accel_scale] * len(captures), chunksize=chunk_size))
+
+def toJson(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, dict):
+        return {key: toJson(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [toJson(item) for item in value]
+    return value
+
+parser = argparse.ArgumentParser(description = 'Script to analyze captured accelerometer and stopping distance data. ')
+parser.add_argument('captures', nargs='+', help='Capture files, or directories searched for CSV and binary captures and segment manifests')
+parser.add_argument('--accel-scale', action='store', type=float, default=1.0,
+        help='Factor that turns instantAccel into velocity units per second, e.x: 386.09 for accelerometers reporting units of gravity when velocity is in inches per second')
+parser.add_argument('--fit-degree', action='store', type=int, default=2, help='Degree of the polynomial fitted to stopping distance over speed')
+parser.add_argument('--workers', action='store', type=int, default=None, help='Number of processes reading captures, defaults to the number of CPUs')
+parser.add_argument('-o', '--output-file', action='store', default=None, help='Write the results as JSON to this file')
+parser.add_argument('-p', '--plot', action='store', default=None, help='Draw stopping distance against speed to this PNG file')
+parser.add_argument('-v', '--verbose', action='store_true', help='Print the results of every capture')
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    start_time = time.perf_counter()
+    captures = findCaptures(args.captures)
+    results = analyzeCaptures(captures, args.accel_scale, args.workers)
+    rows = sum(result["rows"] for result in results)
+    print("Analyzed {} captures with {} rows in {:.3f} seconds".format(len(results), rows, time.perf_counter() - start_time))
+
+    for result in results:
+        if result["error"] is not None:
+            print("  {}: {}".format(result["file"], result["error"]))
+        elif args.verbose:
+            for accel_name, integrated in result["acceleration"].items():
+                line = "  {}: {} integrated over {} segments, {:.2f} s, final velocity {:.3f}, final position {:.3f}".format(
+                    result["file"], accel_name, integrated["segments"], integrated["seconds"],
+                    integrated["finalVelocity"], integrated["finalPosition"])
+                if "velocityRmsError" in integrated:
+                    line += ", velocity error rms {:.3f} max {:.3f}, bias {:.4f}".format(
+                        integrated["velocityRmsError"], integrated["velocityMaxError"], integrated["accelBias"])
+                print(line)
+
+    # Acceleration compared with instantVelocity over every capture
+    compared = [integrated for result in results for integrated in result.get("acceleration", {}).values()
+                if "velocityRmsError" in integrated]
+    if compared:
+        print("Integrated velocity against instantVelocity over {} captures: median rms error {:.3f}, worst max error {:.3f}, median bias {:.4f}".format(
+            len(compared), np.nanmedian([integrated["velocityRmsError"] for integrated in compared]),
+            np.nanmax([integrated["velocityMaxError"] for integrated in compared]),
+            np.nanmedian([integrated["accelBias"] for integrated in compared])))
+
+    # Stopping distance of every drive of every capture
+    drives = [(result["speeds"], result["stoppingDistances"]) for result in results if "speeds" in result]
+    aggregate = None
+    fits = {}
+    if drives:
+        speeds = np.concatenate([drive[0] for drive in drives])
+        distances = np.concatenate([drive[1] for drive in drives])
+        aggregate = aggregateBySpeed(speeds, distances)
+        fits = fitStoppingCurve(speeds, distances, args.fit_degree)
+    if aggregate is not None:
+        print("Stopping distance over {} drives".format(int(np.sum(aggregate["count"]))))
+        print("{:>8} {:>7} {:>9} {:>9} {:>9} {:>9}".format("speed", "drives", "mean", "std", "min", "max"))
+        for index, speed in enumerate(aggregate["speed"]):
+            print("{:>8.3f} {:>7} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}".format(speed, aggregate["count"][index], aggregate["mean"][index],
+                  aggregate["std"][index], aggregate["min"][index], aggregate["max"][index]))
+        for direction, fit in fits.items():
+            print("{} fit: d = {}, R^2 = {:.4f}".format(direction, describeFit(fit), fit["rSquared"]))
+        if args.plot is not None:
+            plotStoppingDistance(aggregate, fits, args.plot, "Stopping Distance vs. Speed")
+            print("Plotted stopping distance to {}".format(args.plot))
+
+    if args.output_file is not None:
+        with open(args.output_file, 'w') as fp:
+            json.dump(toJson({"captures": results, "stoppingDistance": aggregate, "fits": fits}), fp, indent=2)
+        print("Wrote results to {}".format(args.output_file))
+
+if __name__ == '__main__':
+    main()
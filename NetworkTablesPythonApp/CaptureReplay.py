@@ -0,0 +1,195 @@
+import time
+import argparse
+import threading
+import numpy as np
+from networktables import NetworkTables
+import BinaryCapture
+import SparseCapture
+from CaptureAnalysis import loadCapture
+from CollectorConfig import RUN_COLUMN_NAME, TIMESTAMP_SUFFIX, ConfigCompiler, loadCollectorConfig
+from CollectorInstrumentation import LatencyHistogram
+
+parser = argparse.ArgumentParser(description = 'Script to replay a recorded capture by serving its values on a local NetworkTables server, for testing dashboards and collectors without a robot. ')
+parser.add_argument('capture_file', help='CSV, binary or sparse capture, or segment manifest, written by RobotDataCollector')
+parser.add_argument('-i', '--input-file', action='store', default=None,
+        help='Input file the capture was recorded with, maps the columns to their tables. Binary and sparse captures hold their own input file, CSV captures default to robot_nt_names.json')
+parser.add_argument('-a', '--listen-address', action='store', default='127.0.0.1', help='Address the NetworkTables server listens on, use an empty string for all interfaces')
+parser.add_argument('-p', '--port', action='store', type=int, default=1735, help='Port the NetworkTables server listens on')
+parser.add_argument('-x', '--speed', action='store', type=float, default=1.0,
+        help='Replay speed compared to the recording, e.x: 50 replays a minute in a little over a second. NetworkTables sends at most one value per entry every 10 ms, so faster replays skip values on the wire')
+parser.add_argument('-f', '--as-fast-as-possible', action='store_true', help='Replay the rows one after the other without any pacing, for load testing')
+parser.add_argument('-t', '--time-column', action='store', default='currentTime', help='Column whose recorded time paces the replay')
+parser.add_argument('--max-gap', action='store', type=float, default=None,
+        help='Shorten pauses in the recording, e.x: between the runs of a sweep, to this many seconds')
+parser.add_argument('-l', '--loop', action='store', type=int, default=1, help='Number of times to replay the capture, 0 to repeat until Ctrl-C')
+parser.add_argument('-w', '--wait-for-clients', action='store', type=int, default=0, help='Wait for this many clients to connect before starting')
+parser.add_argument('--client-timeout', action='store', type=float, default=None, help='Give up waiting for clients after this many seconds')
+parser.add_argument('-v', '--verbose', action='store_true', help='Print more information about what happens')
+
+def loadReplayConfig(capture_file, input_file):
+    # Returns the compiled input file and column name -> (table name, entry
+    # name, type) for every column that came from an entry
+    with open(capture_file, 'rb') as fp:
+        magic = fp.read(len(BinaryCapture.MAGIC))
+    if magic in [BinaryCapture.MAGIC, SparseCapture.MAGIC] and input_file is None:
+        reader = BinaryCapture if magic == BinaryCapture.MAGIC else SparseCapture
+        header = reader.readHeader(capture_file)
+        if header["config"] is None:
+            raise Exception("{} does not hold its input file, give it with --input-file.".format(capture_file))
+        compiled = ConfigCompiler(capture_file, header["config"], None).compile()
+        # The columns name their entries, even for inputs
+        targets = {column["name"]: (column["table"], column["entry"], column["type"])
+                   for column in header["columns"] if column.get("table")}
+        return compiled, targets
+    compiled = loadCollectorConfig(input_file or 'robot_nt_names.json')
+    targets = {}
+    for config_entry in compiled.entries:
+        targets.setdefault(config_entry.short_name, (config_entry.table_name, config_entry.name, config_entry.type))
+    for sweep_input in compiled.inputs:
+        targets.setdefault(sweep_input.short_name, (sweep_input.table_name, sweep_input.name, sweep_input.type))
+    return compiled, targets
+
+def replayTimes(columns, time_column, max_gap):
+    # Seconds from the start of the replay at which every row is due. Time
+    # running backwards, e.x: a robot restart, is not waited for.
+    recorded = columns[time_column]
+    steps = np.zeros(len(recorded))
+    steps[1:] = np.nan_to_num(np.diff(recorded))
+    np.clip(steps, 0.0, max_gap, out=steps)
+    return np.cumsum(steps)
+
+class CaptureReplay(object):
+    def __init__(self, parsed_args):
+        self.args = parsed_args
+        self.columns = loadCapture(self.args.capture_file)
+        if not self.columns:
+            raise Exception("{} holds no rows.".format(self.args.capture_file))
+        self.row_count = len(next(iter(self.columns.values())))
+        self.compiled_config, self.targets = loadReplayConfig(self.args.capture_file, self.args.input_file)
+        if not self.args.as_fast_as_possible:
+            if self.args.time_column not in self.columns:
+                raise Exception("{} has no {} column to pace the replay, use --as-fast-as-possible or --time-column.".format(
+                    self.args.capture_file, self.args.time_column))
+            if self.args.speed <= 0:
+                raise Exception("The replay speed must be greater than zero, got {}.".format(self.args.speed))
+        self.lateness = LatencyHistogram()
+        # Number of connected clients, counted by a connection listener
+        self.clients = 0
+        self.clients_changed = threading.Condition()
+
+    def start(self):
+        NetworkTables.addConnectionListener(self.clientConnected)
+        NetworkTables.startServer(listenAddress=self.args.listen_address, port=self.args.port)
+        self.publishers = self.resolvePublishers()
+        # Collectors wait for the robot to be enabled, which only the capture
+        # may turn off again
+        robot_enabled = self.compiled_config.robot_enabled
+        NetworkTables.getTable(robot_enabled.table_name).getEntry(robot_enabled.name).setBoolean(True)
+        print("Serving {} rows of {} on {}:{}".format(self.row_count, self.args.capture_file,
+              self.args.listen_address or "*", self.args.port))
+
+    def resolvePublishers(self):
+        # One (setter, values) pair per replayed column. values holds None
+        # where the value did not change or is missing, so a row only sets
+        # the entries that changed, polled captures repeat most values.
+        publishers = []
+        derived_names = set(channel.name for channel in self.compiled_config.derived)
+        for name, values in self.columns.items():
+            # Clients compute derived columns themselves
+            if name == RUN_COLUMN_NAME or name.endswith(TIMESTAMP_SUFFIX) or name in derived_names:
+                continue
+            if name not in self.targets:
+                print("Column {} is not an entry of the input file, it is not replayed".format(name))
+                continue
+            table_name, entry_name, entry_type = self.targets[name]
+            entry = NetworkTables.getTable(table_name).getEntry(entry_name)
+            present = ~np.isnan(values)
+            changed = present.copy()
+            changed[1:] &= values[1:] != values[:-1]
+            if entry_type == "boolean":
+                setter = entry.setBoolean
+                values = values != 0
+            else:
+                setter = entry.setDouble
+            publishers.append((setter, np.where(changed, values, None).tolist()))
+            if self.args.verbose:
+                print("Replaying {} into {}/{}".format(name, table_name, entry_name))
+        if not publishers:
+            raise Exception("No column of {} matches an entry of the input file.".format(self.args.capture_file))
+        return publishers
+
+    def clientConnected(self, connected, info):
+        with self.clients_changed:
+            self.clients += 1 if connected else -1
+            self.clients_changed.notify_all()
+
+    def waitForClients(self):
+        if self.args.wait_for_clients <= 0:
+            return
+        print("Waiting for {} clients".format(self.args.wait_for_clients))
+        with self.clients_changed:
+            if not self.clients_changed.wait_for(lambda: self.clients >= self.args.wait_for_clients, self.args.client_timeout):
+                raise Exception("Only {} of {} clients connected within {} seconds.".format(
+                    self.clients, self.args.wait_for_clients, self.args.client_timeout))
+
+    def replayOnce(self):
+        publishers = self.publishers
+        flush = NetworkTables.flush
+        if self.args.as_fast_as_possible:
+            for index in range(self.row_count):
+                for setter, values in publishers:
+                    value = values[index]
+                    if value is not None:
+                        setter(value)
+                flush()
+            return
+        due_times = (replayTimes(self.columns, self.args.time_column, self.args.max_gap) / self.args.speed).tolist()
+        record = self.lateness.record
+        start_time = time.monotonic()
+        for index in range(self.row_count):
+            deadline = start_time + due_times[index]
+            now = time.monotonic()
+            if deadline > now:
+                time.sleep(deadline - now)
+                now = time.monotonic()
+            record(now - deadline)
+            for setter, values in publishers:
+                value = values[index]
+                if value is not None:
+                    setter(value)
+            flush()
+
+    def run(self):
+        self.waitForClients()
+        replays = 0
+        start_time = time.monotonic()
+        try:
+            while self.args.loop == 0 or replays < self.args.loop:
+                self.replayOnce()
+                replays += 1
+                if self.args.verbose:
+                    print("Replay {} done".format(replays))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            elapsed = time.monotonic() - start_time
+            rows = replays * self.row_count
+            print("Replayed {} rows in {:.3f} seconds, {:.0f} rows per second".format(rows, elapsed, rows / elapsed if elapsed > 0 else 0.0))
+            if self.lateness.count > 0:
+                lateness = self.lateness.summary()
+                print("Row lateness: p50={:.3f} ms, p99={:.3f} ms, max={:.3f} ms".format(
+                    lateness["p50"] * 1000.0, lateness["p99"] * 1000.0, lateness["max"] * 1000.0))
+            NetworkTables.flush()
+            # Give the clients a moment to receive the last values
+            time.sleep(0.1)
+            NetworkTables.shutdown()
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+    replay = CaptureReplay(args)
+    replay.start()
+    replay.run()
+
+if __name__ == '__main__':
+    main()
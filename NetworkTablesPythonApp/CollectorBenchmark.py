@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import resource
+import contextlib
+import multiprocessing
+from array import array
+from datetime import datetime
+
+date_str = datetime.now().strftime('%Y%m%d%H%M%S')
+
+parser = argparse.ArgumentParser(description = 'Benchmark the RobotDataCollector pipeline against a fake in-process NetworkTables backend. ')
+parser.add_argument('-e', '--entry-counts', action='store', type=int, nargs='+', default=[5, 50, 500], help='Numbers of entries to collect per sample')
+parser.add_argument('-c', '--sample-counts', action='store', type=int, nargs='+', default=[1000, 10000], help='Numbers of samples to collect')
+parser.add_argument('-f', '--formats', action='store', nargs='+', default=["csv", "binary"], help='Output formats to benchmark')
+parser.add_argument('-g', '--graphs', action='store', type=int, default=2, help='Number of graphs to generate for every run')
+parser.add_argument('-o', '--output-file', action='store', default=date_str + '_collector_benchmark.json', help='Name of the JSON file to write results to')
+parser.add_argument('--compare', action='store', nargs=2, metavar=('BASELINE', 'CURRENT'), default=None, help='Compare two result files instead of running the benchmark')
+
+LATENCY_PERCENTILES = [50, 90, 99, 99.9]
+OUTPUT_EXTENSIONS = {"binary": ".bin", "sparse": ".sparse"}
+
+# Minimal stand-in for the pynetworktables API used by RobotDataCollector.
+# Every read of a double returns a new value, like a robot that publishes
+# faster than the collector reads.
+class FakeEntry(object):
+    def __init__(self, key):
+        self.key = key
+        self.number = 0.0
+        self.boolean = True
+
+    def getDouble(self, defaultValue):
+        self.number += 1.0
+        return self.number
+
+    def getBoolean(self, defaultValue):
+        return self.boolean
+
+    def setDouble(self, value):
+        self.number = value
+
+    def setBoolean(self, value):
+        self.boolean = value
+
+    def addListener(self, listener, flags, paramIsNew=True):
+        return None
+
+    def removeListener(self, listener_id):
+        pass
+
+class FakeTable(object):
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+    def getEntry(self, key):
+        if key not in self.entries:
+            self.entries[key] = FakeEntry(key)
+        return self.entries[key]
+
+    def getNumber(self, key, defaultValue):
+        return self.getEntry(key).getDouble(defaultValue)
+
+    def getBoolean(self, key, defaultValue):
+        return self.getEntry(key).getBoolean(defaultValue)
+
+    def putNumber(self, key, value):
+        self.getEntry(key).setDouble(value)
+
+    def putBoolean(self, key, value):
+        self.getEntry(key).setBoolean(value)
+
+class FakeNetworkTables(object):
+    class NotifyFlags:
+        IMMEDIATE = 1
+        LOCAL = 2
+        NEW = 4
+        DELETE = 8
+        UPDATE = 16
+
+    def __init__(self):
+        self.tables = {}
+
+    def initialize(self, server=None):
+        pass
+
+    def startClientTeam(self, team):
+        pass
+
+    def addConnectionListener(self, listener, immediateNotify=False):
+        listener(True, "FakeNetworkTables")
+
+    def getTable(self, key):
+        if key not in self.tables:
+            self.tables[key] = FakeTable(key)
+        return self.tables[key]
+
+    def flush(self):
+        pass
+
+def buildConfig(entry_count, graph_count):
+    entries = [{"name": "Bench/value{}".format(index), "type": "double"} for index in range(entry_count - 1)]
+    entries.append({"name": "Bench/currentTime", "type": "double"})
+    graphs = []
+    for index in range(graph_count):
+        graphs.append({"title": "Bench graph {}".format(index),
+                       "xlabel": "Time", "ylabel": "Value",
+                       "dataX": "currentTime",
+                       "dataY": ["value{}".format(index % max(entry_count - 1, 1))]})
+    return {"controls": {"robotEnabled": {"table": "Robot", "entry": "enabled"},
+                         "triggerCommand": {"table": "Bench", "entry": "running"}},
+            "tables": {"Bench": entries},
+            "graphs": graphs}
+
+def percentiles(values):
+    ordered = sorted(values)
+    result = {}
+    for percentile in LATENCY_PERCENTILES:
+        if not ordered:
+            result["p{}".format(percentile)] = 0.0
+            continue
+        rank = int(round(percentile / 100.0 * (len(ordered) - 1)))
+        result["p{}".format(percentile)] = ordered[rank]
+    result["max"] = ordered[-1] if ordered else 0.0
+    return result
+
+def runCase(entry_count, sample_count, output_format, graph_count):
+    # Runs in its own process so that peak RSS belongs to this case only
+    import RobotDataCollector
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "bench.json")
+        with open(input_file, 'w') as fp:
+            json.dump(buildConfig(entry_count, graph_count), fp)
+        output_file = "bench" + OUTPUT_EXTENSIONS.get(output_format, ".csv")
+        args = RobotDataCollector.parser.parse_args(["-d", directory, "-o", output_file, "-i", input_file,
+                                                     "-m", "COUNT_MODE", "-c", str(sample_count),
+                                                     "-f", output_format, "--graph-workers", "1"])
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            collector = RobotDataCollector.RobotDataCollector(args, FakeNetworkTables())
+            # Time every sample by wrapping the bound method collectData uses
+            latencies = array('d')
+            collect_sample = collector.collectSample
+            def timedCollectSample(samples, row_writer):
+                start = time.perf_counter()
+                result = collect_sample(samples, row_writer)
+                latencies.append(time.perf_counter() - start)
+                return result
+            collector.collectSample = timedCollectSample
+            start = time.perf_counter()
+            collector.collectData()
+            collect_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            collector.generateGraphs()
+            graph_seconds = time.perf_counter() - start
+        output_bytes = os.path.getsize(os.path.join(directory, output_file))
+    latency = percentiles(latencies)
+    return {"entries": entry_count,
+            "samples": sample_count,
+            "format": output_format,
+            "collectSeconds": collect_seconds,
+            "samplesPerSecond": sample_count / collect_seconds if collect_seconds > 0 else 0.0,
+            "latencyMicroseconds": {name: value * 1e6 for name, value in latency.items()},
+            "graphSeconds": graph_seconds,
+            "outputBytes": output_bytes,
+            # ru_maxrss is in kilobytes on Linux
+            "peakRssKb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def runBenchmark(args):
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for entry_count in args.entry_counts:
+        for sample_count in args.sample_counts:
+            for output_format in args.formats:
+                with context.Pool(1) as pool:
+                    result = pool.apply(runCase, (entry_count, sample_count, output_format, args.graphs))
+                print("{entries:4d} entries {samples:7d} samples {format:>6}: {samplesPerSecond:10.0f} samples/s, "
+                      "p50 {p50:8.1f} us, p99 {p99:8.1f} us, graphs {graphSeconds:6.3f} s, peak RSS {peakRssKb} kB".format(
+                          p50=result["latencyMicroseconds"]["p50"], p99=result["latencyMicroseconds"]["p99"], **result))
+                results.append(result)
+    report = {"created": datetime.now().isoformat(),
+              "python": sys.version.split()[0],
+              "platform": platform.platform(),
+              "cpus": multiprocessing.cpu_count(),
+              "results": results}
+    with open(args.output_file, 'w') as fp:
+        json.dump(report, fp, indent=2)
+    print("Wrote results to {}".format(args.output_file))
+
+def compareResults(baseline_file, current_file):
+    with open(baseline_file) as fp:
+        baseline = json.load(fp)
+    with open(current_file) as fp:
+        current = json.load(fp)
+    baseline_results = {(r["entries"], r["samples"], r["format"]): r for r in baseline["results"]}
+    print("{:>7} {:>7} {:>6} {:>12} {:>12} {:>8} {:>10} {:>10} {:>8}".format(
+        "entries", "samples", "format", "base/s", "current/s", "speedup", "base p99", "curr p99", "graphs"))
+    for result in current["results"]:
+        key = (result["entries"], result["samples"], result["format"])
+        if key not in baseline_results:
+            continue
+        base = baseline_results[key]
+        speedup = result["samplesPerSecond"] / base["samplesPerSecond"] if base["samplesPerSecond"] else 0.0
+        graph_ratio = base["graphSeconds"] / result["graphSeconds"] if result["graphSeconds"] else 0.0
+        print("{:7d} {:7d} {:>6} {:12.0f} {:12.0f} {:7.2f}x {:10.1f} {:10.1f} {:7.2f}x".format(
+            key[0], key[1], key[2], base["samplesPerSecond"], result["samplesPerSecond"], speedup,
+            base["latencyMicroseconds"]["p99"], result["latencyMicroseconds"]["p99"], graph_ratio))
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    if args.compare is not None:
+        compareResults(*args.compare)
+    else:
+        runBenchmark(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import socket
+import argparse
+import tempfile
+
+# Thin client for CollectorDaemon. Only the standard library is imported so
+# that a job returns in milliseconds, the daemon already holds the
+# NetworkTables connection.
+#
+# Protocol: one JSON object per line in each direction. A job is e.x:
+#   {"job": "put", "key": "/Shuffleboard/Drive/DataCollection", "value": false}
+# and every reply holds "ok", plus "result" on success or "error" on failure.
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'nt_collector.sock')
+# Seconds to wait for a reply, stop waits for the capture to finish writing
+DEFAULT_TIMEOUT = 30.0
+
+def sendJob(job, socket_path=DEFAULT_SOCKET, timeout=DEFAULT_TIMEOUT):
+    # Returns the result of the job, raises if the daemon reported an error
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        try:
+            client.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            raise Exception("No collector daemon is listening on {}, start one with CollectorDaemon.py.".format(socket_path))
+        client.sendall((json.dumps(job) + "\n").encode('utf-8'))
+        reply = b''
+        while not reply.endswith(b"\n"):
+            data = client.recv(65536)
+            if not data:
+                break
+            reply += data
+    if not reply:
+        raise Exception("The collector daemon closed the connection without replying.")
+    reply = json.loads(reply.decode('utf-8'))
+    if not reply["ok"]:
+        raise Exception(reply["error"])
+    return reply.get("result")
+
+def parseValue(text):
+    # Values are JSON, e.x: false, 1.5 or "text". Anything else is a string.
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+parser = argparse.ArgumentParser(description = 'Script to send a job to a running CollectorDaemon. ')
+parser.add_argument('--socket', action='store', default=DEFAULT_SOCKET, help='Unix socket the daemon listens on')
+parser.add_argument('--timeout', action='store', type=float, default=DEFAULT_TIMEOUT, help='Seconds to wait for the daemon to reply')
+jobs = parser.add_subparsers(dest='job', metavar='JOB')
+jobs.required = True
+jobs.add_parser('state', help='Print the connection, robot enabled and capture state')
+get_parser = jobs.add_parser('get', help='Print mirrored entries with the time they were received')
+get_parser.add_argument('prefix', nargs='?', default='/', help='Only print entries whose key starts with this, e.x: /Shuffleboard/Drive')
+put_parser = jobs.add_parser('put', help='Put a value into an entry and send it right away')
+put_parser.add_argument('key', help='Full key of the entry, e.x: /Shuffleboard/Drive/DataCollection')
+put_parser.add_argument('value', help='Value to put as JSON, e.x: false, 1.5 or "text"')
+jobs.add_parser('capture', help='Start a capture, every argument after capture is passed on to RobotDataCollector, e.x: capture -m TIME_MODE -s 5. The connection options are ignored')
+stop_parser = jobs.add_parser('stop', help='Turn off DataCollection on the robot and stop the running capture')
+stop_parser.add_argument('--no-wait', action='store_true', help='Return without waiting for the capture to finish writing')
+jobs.add_parser('shutdown', help='Stop the capture and the daemon')
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    # argparse cannot leave options like -m to another parser, so the
+    # RobotDataCollector options are split off by hand
+    collector_argv = []
+    if 'capture' in argv:
+        index = argv.index('capture')
+        argv, collector_argv = argv[:index + 1], argv[index + 1:]
+    args = parser.parse_args(argv)
+    job = {"job": args.job}
+    if args.job == 'get':
+        job["prefix"] = args.prefix
+    elif args.job == 'put':
+        job["key"] = args.key
+        job["value"] = parseValue(args.value)
+    elif args.job == 'capture':
+        job["args"] = collector_argv
+        # Relative paths of the capture are relative to the client
+        job["cwd"] = os.getcwd()
+    elif args.job == 'stop':
+        job["wait"] = not args.no_wait
+    try:
+        result = sendJob(job, args.socket, args.timeout)
+    except Exception as e:
+        print(e)
+        sys.exit(1)
+    if args.job == 'get':
+        for key in sorted(result):
+            value, received, updates = result[key]
+            print("{} = {} (received {:.3f}, {} updates)".format(key, value, received, updates))
+    elif result is not None:
+        print(json.dumps(result, indent=2, sort_keys=True))
+
+if __name__ == '__main__':
+    main()
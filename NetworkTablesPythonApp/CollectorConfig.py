@@ -0,0 +1,409 @@
+import os
+import json
+import pickle
+import hashlib
+from collections import namedtuple
+import GraphConfig
+import SweepEngine
+import DerivedChannels
+from DerivedChannels import DerivedChannel, parseExpression
+from SweepEngine import CARTESIAN_SWEEP, compileSweepInput, sweepRuns
+
+# TOP LEVEL INPUT FILE KEYWORDS
+CONTROLS = "controls"
+TABLES = "tables"
+GRAPHS = "graphs"
+SNAPSHOT = "snapshot"
+DERIVED = "derived"
+TRIGGERS = "triggers"
+# CONTROLS property keywords
+CONTROL_ROBOT_ENABLED = "robotEnabled"
+CONTROL_TRIGGER_CMD = "triggerCommand"
+CONTROL_COMMAND_SETTLE = "commandSettle"
+CONTROL_TABLE = "table"
+CONTROL_ENTRY = "entry"
+# triggerCommand property keywords
+TRIGGER_CMD_INPUTS = "inputs"
+TRIGGER_CMD_SWEEP = "sweep"
+# TABLE propery keywords
+TABLE_ELEMENT_NAME = "name"
+TABLE_ELEMENT_TYPE = "type"
+TABLE_ELEMENT_TYPE_BOOLEAN = "boolean"
+TABLE_ELEMENT_TYPE_DOUBLE = "double"
+TABLE_ELEMENT_TYPES = [TABLE_ELEMENT_TYPE_DOUBLE, TABLE_ELEMENT_TYPE_BOOLEAN]
+# SNAPSHOT property keywords
+SNAPSHOT_ENTRIES = "entries"
+SNAPSHOT_TIMEOUT = "timeout"
+SNAPSHOT_DEFAULT_TIMEOUT = 0.01
+# DERIVED property keywords
+DERIVED_NAME = "name"
+DERIVED_EXPRESSION = "expression"
+DERIVED_TYPE = "type"
+# TRIGGERS property keywords
+TRIGGER_NAME = "name"
+TRIGGER_CONDITION = "condition"
+# Column holding the index of the sweep run a sample belongs to
+RUN_COLUMN_NAME = "run"
+# Suffix of the columns holding the time an entry value was received
+TIMESTAMP_SUFFIX = "_time"
+
+# Compiled input files are kept here, named after the hash of the file
+CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'Team1100Tools', 'configs')
+# Change whenever CompiledConfig changes so that old cache files are ignored
+CACHE_VERSION = 3
+# Modules whose code compiles input files. A cache file is only used by
+# the same code.
+COMPILER_MODULES = [__file__, DerivedChannels.__file__, SweepEngine.__file__, GraphConfig.__file__]
+
+# A control entry like robotEnabled
+ControlEntry = namedtuple('ControlEntry', ['table_name', 'name'])
+# An entry of the tables block, in input file order
+ConfigEntry = namedtuple('ConfigEntry', ['table_name', 'name', 'short_name', 'type'])
+# Everything the collector needs from an input file, checked once. Lists are
+# tuples so that a compiled config can be shared and cached as is.
+#   source            the input file as loaded, stored in binary captures
+#   robot_enabled     ControlEntry
+#   trigger_command   ControlEntry
+#   command_settle    ControlEntry or None
+#   entries           tuple of ConfigEntry, the entries of every table
+#   inputs            tuple of SweepInput without NetworkTables entries
+#   sweep             sweep mode of the inputs
+#   graphs            tuple of the graphs of the input file
+#   graph_columns     frozenset of the columns the graphs use
+#   snapshot_entries  tuple of short names, or None to use the graphed entries
+#   snapshot_timeout  seconds the updates of one robot cycle arrive within
+#   derived           tuple of DerivedChannel, computed columns in order
+#   triggers          tuple of boolean DerivedChannel, the trigger conditions
+CompiledConfig = namedtuple('CompiledConfig', ['path', 'digest', 'source', 'robot_enabled', 'trigger_command',
+                                               'command_settle', 'entries', 'inputs', 'sweep',
+                                               'graphs', 'graph_columns', 'snapshot_entries', 'snapshot_timeout',
+                                               'derived', 'triggers'])
+
+def isNumber(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Checks every part of an input file and collects all the problems found,
+# so that a broken file can be fixed in one go
+class ConfigCompiler(object):
+    def __init__(self, path, source, digest):
+        self.path = path
+        self.source = source
+        self.digest = digest
+        self.errors = []
+
+    def error(self, message, *values):
+        self.errors.append(message.format(*values))
+
+    def compile(self):
+        if not isinstance(self.source, dict):
+            raise Exception("{} must hold a JSON object.".format(self.path))
+        robot_enabled, trigger_command, command_settle, inputs, sweep = self.compileControls()
+        entries = self.compileTables(inputs)
+        short_names = set(entry.short_name for entry in entries)
+        short_names.update(sweep_input.short_name for sweep_input in inputs)
+        derived = self.compileDerived(short_names, bool(inputs))
+        # Derived columns can be graphed but not waited for in a snapshot
+        snapshot_entries, snapshot_timeout = self.compileSnapshot(short_names)
+        short_names.update(channel.name for channel in derived)
+        graphs, graph_columns = self.compileGraphs(short_names)
+        triggers = self.compileTriggers(short_names)
+        if self.errors:
+            raise Exception("{} has {} error{}:\n  {}".format(self.path, len(self.errors),
+                            "" if len(self.errors) == 1 else "s", "\n  ".join(self.errors)))
+        return CompiledConfig(self.path, self.digest, self.source, robot_enabled, trigger_command,
+                              command_settle, entries, inputs, sweep,
+                              graphs, graph_columns, snapshot_entries, snapshot_timeout, derived, triggers)
+
+    def compileControl(self, controls, control_name, required=True):
+        if not control_name in controls:
+            if required:
+                self.error("{} has no {} entry.", CONTROLS, control_name)
+            return None
+        control = controls[control_name]
+        if not isinstance(control, dict):
+            self.error("{}/{} must be an object with a {} and an {}.", CONTROLS, control_name, CONTROL_TABLE, CONTROL_ENTRY)
+            return None
+        valid = True
+        for label in [CONTROL_TABLE, CONTROL_ENTRY]:
+            if not isinstance(control.get(label), str) or not control[label]:
+                self.error("{}/{} has no {} name.", CONTROLS, control_name, label)
+                valid = False
+        if not valid:
+            return None
+        return ControlEntry(control[CONTROL_TABLE], control[CONTROL_ENTRY])
+
+    def compileControls(self):
+        controls = self.source.get(CONTROLS)
+        if not isinstance(controls, dict):
+            self.error("The {} object is missing.", CONTROLS)
+            return None, None, None, (), CARTESIAN_SWEEP
+        robot_enabled = self.compileControl(controls, CONTROL_ROBOT_ENABLED)
+        trigger_command = self.compileControl(controls, CONTROL_TRIGGER_CMD)
+        command_settle = self.compileControl(controls, CONTROL_COMMAND_SETTLE, required=False)
+        # Any other control still has to name an entry
+        for control_name in controls:
+            if control_name not in [CONTROL_ROBOT_ENABLED, CONTROL_TRIGGER_CMD, CONTROL_COMMAND_SETTLE]:
+                self.compileControl(controls, control_name)
+        inputs, sweep = (), CARTESIAN_SWEEP
+        trigger = controls.get(CONTROL_TRIGGER_CMD)
+        if isinstance(trigger, dict) and TRIGGER_CMD_INPUTS in trigger:
+            inputs, sweep = self.compileInputs(trigger)
+        return robot_enabled, trigger_command, command_settle, inputs, sweep
+
+    def compileInputs(self, trigger):
+        sweep = trigger.get(TRIGGER_CMD_SWEEP, CARTESIAN_SWEEP)
+        input_tables = trigger[TRIGGER_CMD_INPUTS]
+        if not isinstance(input_tables, dict):
+            self.error("{}/{}/{} must be an object of table names.", CONTROLS, CONTROL_TRIGGER_CMD, TRIGGER_CMD_INPUTS)
+            return (), sweep
+        inputs = []
+        for table_name, input_entries in input_tables.items():
+            if not isinstance(input_entries, list):
+                self.error("The inputs of table {} must be a list.", table_name)
+                continue
+            for input_entry in input_entries:
+                if not isinstance(input_entry, dict):
+                    self.error("The inputs of table {} must be objects, got {}.", table_name, json.dumps(input_entry))
+                    continue
+                try:
+                    sweep_input = compileSweepInput(table_name, input_entry)
+                except Exception as e:
+                    self.error("{}", e)
+                    continue
+                if sweep_input.type not in TABLE_ELEMENT_TYPES:
+                    self.error("The input {} from table {} has unknown type {}, expected one of {}.",
+                               sweep_input.name, table_name, sweep_input.type, ", ".join(TABLE_ELEMENT_TYPES))
+                    continue
+                inputs.append(sweep_input._replace(values=tuple(sweep_input.values)))
+        if not inputs:
+            self.error("{}/{}/{} holds no inputs.", CONTROLS, CONTROL_TRIGGER_CMD, TRIGGER_CMD_INPUTS)
+            return (), sweep
+        # Catches unknown sweep modes and zip sweeps of unequal length
+        try:
+            sweepRuns(inputs, sweep)
+        except Exception as e:
+            self.error("{}", e)
+        return tuple(inputs), sweep
+
+    def compileTables(self, inputs):
+        tables = self.source.get(TABLES)
+        if not isinstance(tables, dict) or not tables:
+            self.error("The {} object is missing or holds no tables to collect data from.", TABLES)
+            return ()
+        # Columns are named after the last part of the entry name, so two
+        # entries may not share it. A sweep input can also be listed in a
+        # table, the collector then only records it once.
+        input_columns = {sweep_input.short_name: (sweep_input.table_name, sweep_input.name) for sweep_input in inputs}
+        if inputs:
+            input_columns[RUN_COLUMN_NAME] = None
+        columns = {}
+        entries = []
+        for table_name, table_entries in tables.items():
+            if not isinstance(table_entries, list):
+                self.error("Table {} must be a list of entries.", table_name)
+                continue
+            for entry in table_entries:
+                if not isinstance(entry, dict) or not isinstance(entry.get(TABLE_ELEMENT_NAME), str):
+                    self.error("Every entry of table {} needs a {}, got {}.", table_name, TABLE_ELEMENT_NAME, json.dumps(entry))
+                    continue
+                name = entry[TABLE_ELEMENT_NAME]
+                sample_type = entry.get(TABLE_ELEMENT_TYPE, TABLE_ELEMENT_TYPE_DOUBLE)
+                if sample_type not in TABLE_ELEMENT_TYPES:
+                    self.error("Entry {} of table {} has unknown type {}, expected one of {}.",
+                               name, table_name, sample_type, ", ".join(TABLE_ELEMENT_TYPES))
+                    continue
+                short_name = name.split('/')[-1]
+                if short_name in columns:
+                    self.error("Entry {} of table {} has the same column name as {} of table {}.",
+                               name, table_name, columns[short_name][1], columns[short_name][0])
+                    continue
+                if short_name in input_columns and input_columns[short_name] != (table_name, name):
+                    self.error("Entry {} of table {} has the same column name as {}.", name, table_name,
+                               "the run column" if input_columns[short_name] is None else "the input {} of table {}".format(input_columns[short_name][1], input_columns[short_name][0]))
+                    continue
+                columns[short_name] = (table_name, name)
+                entries.append(ConfigEntry(table_name, name, short_name, sample_type))
+        return tuple(entries)
+
+    def isColumn(self, name, short_names):
+        if name in short_names or name == RUN_COLUMN_NAME:
+            return True
+        # Receive time columns are added with --timestamps
+        return name.endswith(TIMESTAMP_SUFFIX) and name[:-len(TIMESTAMP_SUFFIX)] in short_names
+
+    def compileGraphs(self, short_names):
+        graphs = self.source.get(GRAPHS, [])
+        if not isinstance(graphs, list):
+            self.error("{} must be a list of graphs.", GRAPHS)
+            return (), frozenset()
+        graph_columns = set()
+        for index, graph in enumerate(graphs):
+            if not isinstance(graph, dict):
+                self.error("Graph {} must be an object.", index + 1)
+                continue
+            graph_title = graph.get(GraphConfig.GRAPH_TITLE, "number {}".format(index + 1))
+            missing = [label for label in GraphConfig.GRAPH_REQUIRED_LABELS if label not in graph]
+            if missing:
+                self.error("Graph '{}' has no {}.", graph_title, ", ".join(missing))
+                continue
+            x_field_name, y_field_names = GraphConfig.graphFieldNames(graph)
+            if not y_field_names:
+                self.error("Graph '{}' has no {} entries.", graph_title, GraphConfig.GRAPH_DATAY)
+            for field_name in [x_field_name] + y_field_names:
+                if not self.isColumn(field_name, short_names):
+                    self.error("Graph '{}' uses {}, which is not collected from any table.", graph_title, field_name)
+            max_points = graph.get(GraphConfig.GRAPH_MAX_POINTS, 0)
+            if not isNumber(max_points) or max_points < 0:
+                self.error("Graph '{}' has a {} of {}, expected a number of points.", graph_title, GraphConfig.GRAPH_MAX_POINTS, max_points)
+            graph_columns.add(x_field_name)
+            graph_columns.update(y_field_names)
+        return tuple(graphs), frozenset(graph_columns)
+
+    def compileDerived(self, short_names, has_run_column):
+        derived = self.source.get(DERIVED, [])
+        if not isinstance(derived, list):
+            self.error("{} must be a list of computed columns.", DERIVED)
+            return ()
+        channels = []
+        derived_names = set()
+        for index, definition in enumerate(derived):
+            if not isinstance(definition, dict) or not isinstance(definition.get(DERIVED_NAME), str) or not definition[DERIVED_NAME]:
+                self.error("Derived column {} needs a {}, got {}.", index + 1, DERIVED_NAME, json.dumps(definition))
+                continue
+            name = definition[DERIVED_NAME]
+            channel_type = definition.get(DERIVED_TYPE, TABLE_ELEMENT_TYPE_DOUBLE)
+            if name in short_names or name in derived_names or (has_run_column and name == RUN_COLUMN_NAME):
+                self.error("Derived column {} has the same name as another column.", name)
+                continue
+            if channel_type not in TABLE_ELEMENT_TYPES:
+                self.error("Derived column {} has unknown type {}, expected one of {}.", name, channel_type, ", ".join(TABLE_ELEMENT_TYPES))
+                continue
+            try:
+                tree, columns = parseExpression(name, definition.get(DERIVED_EXPRESSION))
+            except Exception as e:
+                self.error("{}", e)
+                continue
+            # Only columns collected or derived before can be used, receive
+            # times are checked by the collector once it knows about --timestamps
+            for column in columns:
+                if not self.isColumn(column, short_names) and column not in derived_names:
+                    self.error("Derived column {} uses {}, which is not collected from any table or derived before it.", name, column)
+            derived_names.add(name)
+            channels.append(DerivedChannel(name, definition[DERIVED_EXPRESSION], channel_type, columns))
+        return tuple(channels)
+
+    def compileTriggers(self, short_names):
+        # Conditions on the collected and derived columns, only used by
+        # triggered captures
+        triggers = self.source.get(TRIGGERS, [])
+        if not isinstance(triggers, list):
+            self.error("{} must be a list of trigger conditions.", TRIGGERS)
+            return ()
+        channels = []
+        trigger_names = set()
+        for index, definition in enumerate(triggers):
+            if not isinstance(definition, dict) or not isinstance(definition.get(TRIGGER_NAME), str) or not definition[TRIGGER_NAME]:
+                self.error("Trigger {} needs a {}, got {}.", index + 1, TRIGGER_NAME, json.dumps(definition))
+                continue
+            name = definition[TRIGGER_NAME]
+            if name in trigger_names:
+                self.error("Trigger {} is listed more than once.", name)
+                continue
+            try:
+                tree, columns = parseExpression(name, definition.get(TRIGGER_CONDITION), "Trigger")
+            except Exception as e:
+                self.error("{}", e)
+                continue
+            for column in columns:
+                if not self.isColumn(column, short_names):
+                    self.error("Trigger {} uses {}, which is not collected from any table or derived.", name, column)
+            trigger_names.add(name)
+            channels.append(DerivedChannel(name, definition[TRIGGER_CONDITION], TABLE_ELEMENT_TYPE_BOOLEAN, columns))
+        return tuple(channels)
+
+    def compileSnapshot(self, short_names):
+        snapshot = self.source.get(SNAPSHOT, {})
+        if not isinstance(snapshot, dict):
+            self.error("{} must be an object.", SNAPSHOT)
+            return None, SNAPSHOT_DEFAULT_TIMEOUT
+        timeout = snapshot.get(SNAPSHOT_TIMEOUT, SNAPSHOT_DEFAULT_TIMEOUT)
+        if not isNumber(timeout) or timeout <= 0:
+            self.error("{}/{} must be a number of seconds above 0, got {}.", SNAPSHOT, SNAPSHOT_TIMEOUT, timeout)
+        names = snapshot.get(SNAPSHOT_ENTRIES)
+        if names is None:
+            return None, timeout
+        if not isinstance(names, list) or not names:
+            self.error("{}/{} must be a list of entry names.", SNAPSHOT, SNAPSHOT_ENTRIES)
+            return None, timeout
+        snapshot_entries = []
+        for name in names:
+            short_name = str(name).split('/')[-1]
+            if short_name not in short_names:
+                self.error("Snapshot entry {} is not collected from any table.", name)
+            snapshot_entries.append(short_name)
+        return tuple(snapshot_entries), timeout
+
+def compilerDigest():
+    # Hash of the source of the compiler, so that editing it compiles every
+    # input file again even when CACHE_VERSION was not changed
+    compiler_hash = hashlib.sha256()
+    for module_path in COMPILER_MODULES:
+        try:
+            with open(module_path, 'rb') as fp:
+                compiler_hash.update(fp.read())
+        except OSError:
+            # e.x: run from a zip file, fall back on CACHE_VERSION alone
+            return ""
+    return compiler_hash.hexdigest()
+
+COMPILER_DIGEST = compilerDigest()
+
+def cachePath(digest):
+    # Named after the hash of the input file and of the compiler
+    cache_key = hashlib.sha256("{}.{}".format(digest, COMPILER_DIGEST).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIRECTORY, "{}.v{}.pickle".format(cache_key, CACHE_VERSION))
+
+def readCachedConfig(digest):
+    try:
+        with open(cachePath(digest), 'rb') as fp:
+            compiled = pickle.load(fp)
+    except Exception:
+        # Missing, unreadable or from an older version, compile again
+        return None
+    if not isinstance(compiled, CompiledConfig) or compiled.digest != digest:
+        return None
+    return compiled
+
+def writeCachedConfig(compiled):
+    cache_path = cachePath(compiled.digest)
+    temp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+    try:
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        with open(temp_path, 'wb') as fp:
+            pickle.dump(compiled, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        # Readers never see a half written file
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        # The cache only saves time, collection works without it
+        print("Could not cache {}: {}".format(compiled.path, e))
+
+# Loads and checks an input file. A file that compiled before is loaded from
+# the cache, found by the hash of its content and of the compiler, so editing
+# the file or the compiler always compiles it again. Raises one exception
+# listing every problem found.
+def loadCollectorConfig(path, use_cache=True):
+    with open(path, 'rb') as fp:
+        content = fp.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if use_cache:
+        compiled = readCachedConfig(digest)
+        if compiled is not None:
+            return compiled._replace(path=path)
+    try:
+        source = json.loads(content.decode('utf-8'))
+    except ValueError as e:
+        raise Exception("{} is not valid JSON: {}".format(path, e))
+    compiled = ConfigCompiler(path, source, digest).compile()
+    if use_cache:
+        writeCachedConfig(compiled)
+    return compiled
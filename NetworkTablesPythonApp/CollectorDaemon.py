@@ -0,0 +1,256 @@
+import io
+import os
+import json
+import time
+import socket
+import argparse
+import threading
+import contextlib
+import socketserver
+from datetime import datetime
+from networktables import NetworkTables
+import RobotDataCollector
+from CollectorClient import DEFAULT_SOCKET
+from NetworkTablesConnection import DEFAULT_ROBOT_IP, addConnectionArguments, connectToNetworkTables, disconnectFromNetworkTables
+
+parser = argparse.ArgumentParser(description = 'Script that stays connected to the robot and runs jobs sent with CollectorClient.py, so that state, stop and capture do not have to reconnect every time. ')
+addConnectionArguments(parser, DEFAULT_ROBOT_IP)
+parser.add_argument('--socket', action='store', default=DEFAULT_SOCKET, help='Unix socket to listen on for jobs')
+parser.add_argument('-i', '--input-file', action='store', default='robot_nt_names.json', help='Input file whose robotEnabled control is reported by the state job')
+parser.add_argument('-v', '--verbose', action='store_true', help='Print every job received')
+
+# Entry StopDataCollection turns off, the stop job does the same
+DATA_COLLECTION_TABLE = 'Shuffleboard/Drive'
+DATA_COLLECTION_ENTRY = 'DataCollection'
+
+# Capture states reported by the state job
+CAPTURE_WAITING = "waiting"
+CAPTURE_COLLECTING = "collecting"
+CAPTURE_GRAPHING = "graphing"
+CAPTURE_DONE = "done"
+CAPTURE_STOPPED = "stopped"
+CAPTURE_FAILED = "failed"
+
+# One RobotDataCollector run started by a capture job
+class CaptureJob(object):
+    def __init__(self, collector_args, nt):
+        self.args = collector_args
+        self.collector = RobotDataCollector.RobotDataCollector(collector_args, nt, connected=True)
+        self.state = CAPTURE_WAITING
+        self.error = None
+        self.start_time = time.time()
+        self.thread = threading.Thread(target=self.run, name="Capture", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            if self.collector.waitForRobotEnabled():
+                self.state = CAPTURE_COLLECTING
+                self.collector.collectData()
+                self.state = CAPTURE_GRAPHING
+                self.collector.generateGraphs()
+            self.state = CAPTURE_DONE if self.collector.isCollecting() else CAPTURE_STOPPED
+        except Exception as e:
+            self.error = e
+            self.state = CAPTURE_FAILED
+            print("Capture failed: {}".format(e))
+        finally:
+            self.collector.close()
+
+    def isRunning(self):
+        return self.thread.is_alive()
+
+    def stop(self, wait_timeout=None):
+        self.collector.requestStop()
+        self.thread.join(wait_timeout)
+
+    def status(self):
+        stats = self.collector.stats
+        return {"state": self.state,
+                "output_file": os.path.join(self.args.output_directory, self.args.output_file),
+                "samples": stats.samples if stats is not None else 0,
+                "started": self.start_time,
+                "error": None if self.error is None else str(self.error)}
+
+# Reads one JSON job per line and answers each with one JSON line
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                job = json.loads(line.decode('utf-8'))
+                reply = {"ok": True, "result": self.server.collector_daemon.runJob(job)}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            # bytes and other values JSON does not know are sent as text
+            self.wfile.write((json.dumps(reply, default=str) + "\n").encode('utf-8'))
+            self.wfile.flush()
+            if reply["ok"] and job["job"] == 'shutdown':
+                # shutdown waits for serve_forever, which runs on another thread
+                self.server.shutdown()
+                return
+
+class CollectorDaemon(object):
+    def __init__(self, parsed_args, nt=NetworkTables):
+        self.args = parsed_args
+        self.nt = nt
+        self.capture = None
+        self.capture_lock = threading.Lock()
+        # Full key -> [value, receive time, number of updates], kept up to
+        # date by a listener on every entry
+        self.mirror = {}
+        self.mirror_lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.enabled_key = self.loadEnabledKey()
+        self.jobs = {"state": self.stateJob,
+                     "get": self.getJob,
+                     "put": self.putJob,
+                     "capture": self.captureJob,
+                     "stop": self.stopJob,
+                     "shutdown": self.shutdownJob}
+
+    def loadEnabledKey(self):
+        table_name, entry_name = 'Robot', 'enabled'
+        if os.path.exists(self.args.input_file):
+            with open(self.args.input_file) as fp:
+                controls = json.load(fp).get(RobotDataCollector.RobotDataCollector.CONTROLS, {})
+            enabled_ctrl = controls.get(RobotDataCollector.RobotDataCollector.CONTROL_ROBOT_ENABLED)
+            if enabled_ctrl is not None:
+                table_name, entry_name = enabled_ctrl["table"], enabled_ctrl["entry"]
+        return "/{}/{}".format(table_name.strip('/'), entry_name)
+
+    def connect(self):
+        connectToNetworkTables(self.nt, self.args.robot_ip, self.args.robot_team, self.args.connect_timeout)
+        # Entries the robot sent while connecting are delivered right away
+        self.nt.addEntryListener(self.mirrorListener, immediateNotify=True, localNotify=True)
+
+    def mirrorListener(self, key, value, is_new):
+        received = time.monotonic() - self.start_time
+        with self.mirror_lock:
+            mirrored = self.mirror.get(key)
+            if mirrored is None:
+                self.mirror[key] = [value, received, 1]
+            else:
+                mirrored[0] = value
+                mirrored[1] = received
+                mirrored[2] += 1
+
+    def serve(self):
+        if os.path.exists(self.args.socket):
+            # A socket file nobody listens on is left over from a daemon that
+            # did not exit cleanly
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.args.socket)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    os.remove(self.args.socket)
+                else:
+                    raise Exception("A collector daemon is already listening on {}.".format(self.args.socket))
+        server = socketserver.ThreadingUnixStreamServer(self.args.socket, JobHandler)
+        server.daemon_threads = True
+        server.collector_daemon = self
+        print("Listening for jobs on {}".format(self.args.socket))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(self.args.socket)
+
+    def runJob(self, job):
+        if self.args.verbose:
+            print("Job: {}".format(job))
+        name = job.get("job")
+        if name not in self.jobs:
+            raise Exception("Unknown job {}, expected one of {}.".format(name, ", ".join(sorted(self.jobs))))
+        return self.jobs[name](job)
+
+    def stateJob(self, job):
+        with self.mirror_lock:
+            enabled = self.mirror.get(self.enabled_key)
+        with self.capture_lock:
+            capture = None if self.capture is None else self.capture.status()
+        return {"connected": self.nt.isConnected(),
+                "enabled": None if enabled is None else enabled[0],
+                "capture": capture}
+
+    def getJob(self, job):
+        prefix = job.get("prefix", "/")
+        with self.mirror_lock:
+            return {key: list(mirrored) for key, mirrored in self.mirror.items() if key.startswith(prefix)}
+
+    def putJob(self, job):
+        key = job["key"]
+        if not self.nt.getEntry(key).setValue(job["value"]):
+            raise Exception("Could not put {} into {}, the entry holds a different type.".format(job["value"], key))
+        # Send the change now instead of at the next periodic update
+        self.nt.flush()
+        return None
+
+    def parseCaptureArgs(self, job):
+        argv = job.get("args", [])
+        # argparse reports bad options on stderr and exits, turn that into
+        # an error for the client
+        errors = io.StringIO()
+        try:
+            with contextlib.redirect_stderr(errors):
+                collector_args = RobotDataCollector.parseArgs(argv)
+        except SystemExit:
+            raise Exception("Invalid capture options, {}".format(errors.getvalue().strip().splitlines()[-1]))
+        # The default output file is named when RobotDataCollector is
+        # imported, so give every capture of the daemon its own name
+        default_output_file = RobotDataCollector.parser.get_default('output_file')
+        if os.path.splitext(collector_args.output_file)[0] == os.path.splitext(default_output_file)[0]:
+            extension = os.path.splitext(collector_args.output_file)[1]
+            collector_args.output_file = datetime.now().strftime('%Y%m%d%H%M%S') + '_robot_data' + extension
+        cwd = job.get("cwd", os.getcwd())
+        collector_args.input_file = os.path.join(cwd, collector_args.input_file)
+        collector_args.output_directory = os.path.join(cwd, collector_args.output_directory)
+        return collector_args
+
+    def captureJob(self, job):
+        collector_args = self.parseCaptureArgs(job)
+        with self.capture_lock:
+            if self.capture is not None and self.capture.isRunning():
+                raise Exception("A capture to {} is still running, stop it first.".format(self.capture.args.output_file))
+            self.capture = CaptureJob(collector_args, self.nt)
+            return self.capture.status()
+
+    def stopJob(self, job):
+        # Same as StopDataCollection.py, plus the running capture is stopped
+        self.nt.getTable(DATA_COLLECTION_TABLE).putBoolean(DATA_COLLECTION_ENTRY, False)
+        self.nt.flush()
+        with self.capture_lock:
+            capture = self.capture
+        if capture is None:
+            return None
+        capture.stop(None if job.get("wait", True) else 0)
+        return capture.status()
+
+    def shutdownJob(self, job):
+        with self.capture_lock:
+            capture = self.capture
+        if capture is not None:
+            capture.stop()
+        return None
+
+    def shutdown(self):
+        with self.capture_lock:
+            capture = self.capture
+        if capture is not None and capture.isRunning():
+            capture.stop()
+        disconnectFromNetworkTables(self.nt)
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+
+    daemon = CollectorDaemon(args)
+    daemon.connect()
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        daemon.shutdown()
+
+if __name__ == '__main__':
+    main()
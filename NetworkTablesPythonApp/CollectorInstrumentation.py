@@ -0,0 +1,197 @@
+import json
+import time
+
+# Latency histogram with HDR-style log-linear buckets. Values are kept in
+# nanoseconds with 32 buckets per power of two, so every recorded value is
+# reported within about 3% and recording only costs a few integer operations.
+class LatencyHistogram(object):
+    SUB_BUCKET_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    LINEAR_LIMIT = 2 * SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = [0] * 1100
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def bucketIndex(self, value):
+        if value < self.LINEAR_LIMIT:
+            return value
+        shift = value.bit_length() - 1 - self.SUB_BUCKET_BITS
+        return self.LINEAR_LIMIT + (shift - 1) * self.SUB_BUCKETS + (value >> shift) - self.SUB_BUCKETS
+
+    def bucketValue(self, index):
+        # Middle of the range of values that fall in the bucket
+        if index < self.LINEAR_LIMIT:
+            return index
+        shift = (index - self.LINEAR_LIMIT) // self.SUB_BUCKETS + 1
+        mantissa = (index - self.LINEAR_LIMIT) % self.SUB_BUCKETS + self.SUB_BUCKETS
+        return (mantissa << shift) + (1 << (shift - 1))
+
+    def record(self, seconds):
+        value = int(seconds * 1e9)
+        if value < 0:
+            value = 0
+        index = self.bucketIndex(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile):
+        # Returns seconds
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(round(percentile / 100.0 * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucketValue(index), self.max) / 1e9
+        return self.max / 1e9
+
+    def summary(self):
+        return {"count": self.count,
+                "mean": (self.total / self.count / 1e9) if self.count else 0.0,
+                "min": (self.min or 0) / 1e9,
+                "p50": self.percentile(50),
+                "p90": self.percentile(90),
+                "p99": self.percentile(99),
+                "p99.9": self.percentile(99.9),
+                "max": self.max / 1e9}
+
+# Prints at most one message per interval and counts the ones it drops, so
+# verbose output cannot slow down sampling
+class RateLimitedPrinter(object):
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.last_print = None
+        self.suppressed = 0
+
+    def print(self, message_format, *values):
+        now = time.monotonic()
+        if self.last_print is not None and now - self.last_print < self.interval:
+            self.suppressed += 1
+            return
+        self.last_print = now
+        message = message_format.format(*values)
+        if self.suppressed:
+            message += " ({} similar messages suppressed)".format(self.suppressed)
+            self.suppressed = 0
+        print(message)
+
+# Counters and latency histograms for every stage of the collection loop
+class CollectorStats(object):
+    STAGES = ["acquire", "build", "enqueue", "write", "graph"]
+    # Intervals this many times longer than the average are reported as gaps
+    GAP_FACTOR = 5.0
+    # Samples before gap detection starts, to let the average settle
+    GAP_WARMUP = 10
+    MAX_RECORDED_GAPS = 100
+
+    def __init__(self, column_names, gap_threshold=None):
+        self.column_names = column_names
+        self.gap_threshold = gap_threshold
+        self.stages = {stage: LatencyHistogram() for stage in self.STAGES}
+        self.intervals = LatencyHistogram()
+        self.samples = 0
+        self.start_time = None
+        self.last_time = None
+        self.average_interval = None
+        self.gaps = []
+        self.gap_count = 0
+        self.longest_gap = 0.0
+        self.duplicate_rows = 0
+        self.unchanged = [0] * len(column_names)
+        self.previous_row = None
+
+    def recordSample(self, start, acquired, built, enqueued, row):
+        # start, acquired, built and enqueued are time.perf_counter() values
+        # taken around each stage of one sample. acquired is None when the
+        # values were not read by the sample, e.x: for entry updates.
+        stages = self.stages
+        if acquired is None:
+            acquired = start
+        else:
+            stages["acquire"].record(acquired - start)
+        stages["build"].record(built - acquired)
+        stages["enqueue"].record(enqueued - built)
+        self.samples += 1
+        if self.last_time is None:
+            self.start_time = start
+        else:
+            self.recordInterval(start, start - self.last_time)
+        self.last_time = start
+        previous_row = self.previous_row
+        if previous_row is not None:
+            if row == previous_row:
+                self.duplicate_rows += 1
+            # Counted in place, the sampling thread does this for every row
+            unchanged = self.unchanged
+            for index, value, previous in zip(range(len(unchanged)), row, previous_row):
+                if value == previous:
+                    unchanged[index] += 1
+        self.previous_row = row
+
+    def recordInterval(self, now, interval):
+        self.intervals.record(interval)
+        threshold = self.gap_threshold
+        if threshold is None and self.average_interval is not None and self.samples > self.GAP_WARMUP:
+            threshold = self.GAP_FACTOR * self.average_interval
+        if threshold is not None and interval > threshold:
+            self.gap_count += 1
+            self.longest_gap = max(self.longest_gap, interval)
+            if len(self.gaps) < self.MAX_RECORDED_GAPS:
+                self.gaps.append({"at": now - interval - self.start_time, "length": interval})
+        else:
+            # Gaps are left out of the average so that they stay visible
+            if self.average_interval is None:
+                self.average_interval = interval
+            else:
+                self.average_interval += (interval - self.average_interval) * 0.05
+
+    def recordStage(self, stage, seconds):
+        self.stages[stage].record(seconds)
+
+    def summary(self):
+        unchanged = {name: count for name, count in zip(self.column_names, self.unchanged)}
+        elapsed = (self.last_time - self.start_time) if self.samples > 1 else 0.0
+        return {"samples": self.samples,
+                "seconds": elapsed,
+                "samplesPerSecond": (self.samples - 1) / elapsed if elapsed > 0 else 0.0,
+                "stages": {stage: histogram.summary() for stage, histogram in self.stages.items() if histogram.count},
+                "intervals": self.intervals.summary(),
+                "gapCount": self.gap_count,
+                "longestGap": self.longest_gap,
+                "gaps": self.gaps,
+                "duplicateRows": self.duplicate_rows,
+                "unchangedValues": unchanged}
+
+    def printSummary(self):
+        summary = self.summary()
+        print("Collected {} samples in {:.3f} seconds ({:.1f} samples per second)".format(
+            summary["samples"], summary["seconds"], summary["samplesPerSecond"]))
+        print("{:>8} {:>9} {:>10} {:>10} {:>10} {:>10}".format("stage", "count", "mean us", "p50 us", "p99 us", "max us"))
+        for stage, values in summary["stages"].items():
+            print("{:>8} {:>9} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                stage, values["count"], values["mean"] * 1e6, values["p50"] * 1e6, values["p99"] * 1e6, values["max"] * 1e6))
+        intervals = summary["intervals"]
+        print("Sample interval p50={:.3f} ms, p99={:.3f} ms, max={:.3f} ms".format(
+            intervals["p50"] * 1e3, intervals["p99"] * 1e3, intervals["max"] * 1e3))
+        print("Gaps: {}, longest {:.3f} ms".format(summary["gapCount"], summary["longestGap"] * 1e3))
+        if summary["samples"] > 1:
+            print("Rows identical to the previous row: {} ({:.1f}%)".format(
+                summary["duplicateRows"], 100.0 * summary["duplicateRows"] / (summary["samples"] - 1)))
+            for name, count in summary["unchangedValues"].items():
+                print("  {} unchanged in {:.1f}% of samples".format(name, 100.0 * count / (summary["samples"] - 1)))
+
+    def writeJson(self, file_path):
+        with open(file_path, 'w') as fp:
+            json.dump(self.summary(), fp, indent=2)
@@ -1,78 +1,79 @@
-import threading
+import json
 from networktables import NetworkTables
 import argparse
 from datetime import datetime
-import time
-import matplotlib.pyplot as plt
+from ControlPlane import ControlPlane
+from SweepEngine import SweepEngine, CARTESIAN_SWEEP
+from NetworkTablesConnection import DEFAULT_ROBOT_IP, addConnectionArguments, connectToNetworkTables
 
 date_str = datetime.now().strftime('%Y%m%d%H%M%S')
 
 parser = argparse.ArgumentParser(description = 'Script to log data from robot. ')
 parser.add_argument('-o', '--output-file', action = 'store', default = date_str + '_Compensated_Distance_Data.csv', help = 'output csv file name')
-args = parser.parse_args()
-print(args)
-
-cond = threading.Condition()
-notified = [False]
-
-def connectionListener(connected, info):
-    print(info, '; Connected=%s' % connected)
-    with cond:
-        notified[0] = True
-        cond.notify()
-
-NetworkTables.initialize(server='10.11.21.2') #127.0.0.1
-NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-with cond:
-    print("Waiting")
-    if not notified[0]:
-        cond.wait()
-
-# Insert your processing code here
-print("Connected!")
-table = NetworkTables.getTable('Shuffleboard/Drive')
-robotTable = NetworkTables.getTable('Robot')
-robotEnabled = robotTable.getBoolean('enabled', False)
-
-print("Waiting for robot to be enabled")
-    
-while not robotEnabled:
-    time.sleep(1)
-    robotEnabled = robotTable.getBoolean('enabled', False)
-
-print("Robot is enabled")
-
-# This retrieves a boolean at /SmartDashboard/foo
-table.putBoolean('DataCollection', True)
-dataCollection = True
-commandCurrentState = table.getBoolean('DriveCompensatedDistance/DriveCompensatedDistance/running', False)
-commandPreviousState = False
-commandJustStopped = False
-
-table.putBoolean('DriveCompensatedDistance/DriveCompensatedDistance/running', True)
-
-distanceValue = 36
-speedValues = [0.1, -0.1, 0.2, -0.2, 0.3, -0.3, 0.4, -0.4, 0.5, -0.5, 0.6, -0.6, 0.7, -0.7, 0.8, -0.8, 0.9, -0.9, 1.0, -1.0]
-counter = len(speedValues) - 1 # start at index 1
-stoppingDistanceValues = []
-
-
-table.putNumber('DriveDistance/drivingDistance', distanceValue)
-table.putNumber('DriveDistance/drivingSpeed', speedValues[0])
-
-while table.getBoolean('DataCollection', False):
-    dataCollection = table.getBoolean('DataCollection', False)
-    if not dataCollection:
-        break
-    
-    commandPreviousState = commandCurrentState
-    commandCurrentState = table.getBoolean('DriveCompensatedDistance/DriveCompensatedDistance/running', False)
-    commandJustStopped = commandPreviousState and not commandCurrentState
-
+parser.add_argument('-i', '--input-file', action = 'store', default = None,
+        help = 'Input file whose triggerCommand inputs define the sweep of drivingDistance and drivingSpeed, e.x: robot_1121_accel_values.json. Sweeps 36 inches at speeds from -1.0 to 1.0 by default')
+parser.add_argument('--settle-time', action='store', type=float, default=0.5, help='Seconds actualDistance has to stay still after the command stops before it is measured')
+parser.add_argument('--settle-tolerance', action='store', type=float, default=0.01, help='Changes of actualDistance up to this many inches do not count as moving')
+parser.add_argument('--command-timeout', action='store', type=float, default=30.0, help='Give up if a drive does not finish within this many seconds')
+addConnectionArguments(parser, DEFAULT_ROBOT_IP)
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+
+    connectToNetworkTables(NetworkTables, args.robot_ip, args.robot_team, args.connect_timeout)
+    table = NetworkTables.getTable('Shuffleboard/Drive')
+    runningEntryName = 'DriveCompensatedDistance/DriveCompensatedDistance/running'
+
+    # Wait on listeners instead of polling the entries
+    controlPlane = ControlPlane()
+    robotEnabled = controlPlane.watchBoolean('Robot', 'enabled')
+    dataCollection = controlPlane.watchBoolean('Shuffleboard/Drive', 'DataCollection')
+    commandRunning = controlPlane.watchBoolean('Shuffleboard/Drive', runningEntryName)
+    actualDistanceWatcher = controlPlane.watchSettle('Shuffleboard/Drive', 'Data/actualDistance', args.settle_tolerance)
+
+    print("Waiting for robot to be enabled")
+    robotEnabled.waitFor(True)
+    print("Robot is enabled")
+
+    # This retrieves a boolean at /SmartDashboard/foo
+    dataCollection.set(True)
+
+    sweepInputs = {'Shuffleboard/Drive': [
+        {'name': 'DriveDistance/drivingDistance', 'type': 'double', 'values': [36]},
+        {'name': 'DriveDistance/drivingSpeed', 'type': 'double',
+         'values': [0.1, -0.1, 0.2, -0.2, 0.3, -0.3, 0.4, -0.4, 0.5, -0.5, 0.6, -0.6, 0.7, -0.7, 0.8, -0.8, 0.9, -0.9, 1.0, -1.0]}]}
+    sweepMode = CARTESIAN_SWEEP
+    if args.input_file is not None:
+        with open(args.input_file) as fp:
+            triggerCommand = json.load(fp)['controls']['triggerCommand']
+        sweepInputs = triggerCommand['inputs']
+        sweepMode = triggerCommand.get('sweep', CARTESIAN_SWEEP)
+    sweep = SweepEngine(sweepInputs, sweepMode)
+    print("Sweeping {} over {} runs".format(", ".join(sweep.inputNames()), len(sweep)))
+    speedValues = []
+    distanceValues = []
+    stoppingDistanceValues = []
+
+    for run in sweep.runs():
+        # The inputs go out together with the trigger in one flush
+        sweep.applyRun(run)
+        # Count falling edges from before the start so a fast stop is not missed
+        commandStops = commandRunning.falling_edges
+        commandRunning.set(True)
+        NetworkTables.flush()
+
+        # Sleep until the command stops or data collection is turned off
+        commandJustStopped = controlPlane.waitUntil(
+            lambda: commandRunning.falling_edges > commandStops or not dataCollection.value, args.command_timeout)
+        if not dataCollection.value:
+            break
+        if not commandJustStopped:
+            raise Exception("The drive with {} did not finish within {} seconds.".format(sweep.describeRun(run), args.command_timeout))
 
-    if commandJustStopped:
-        time.sleep(3)
+        # Measure once the robot has come to a stop
+        if not actualDistanceWatcher.waitForSettle(args.settle_time, args.command_timeout):
+            print("actualDistance did not settle within {} seconds, measuring anyway".format(args.command_timeout))
         drivingSpeed = table.getNumber('DriveDistance/drivingSpeed', 0)
         sign = 1
         if drivingSpeed < 0:
@@ -80,37 +81,34 @@ while table.getBoolean('DataCollection', False):
         expectedDistance = table.getNumber('DriveDistance/drivingDistance', 0) * sign
         actualDistance = table.getNumber('Data/actualDistance', 0)
         stoppingDistance = abs(actualDistance - expectedDistance)
+        speedValues.append(drivingSpeed)
+        distanceValues.append(abs(expectedDistance))
         stoppingDistanceValues.append(stoppingDistance)
         print("drivingSpeed = {}, expectedDistance = {}, actualDistance {}, stoppingDistance = {}".format(drivingSpeed, expectedDistance, actualDistance, stoppingDistance))
 
         with open(args.output_file, 'a') as fh:
             fh.write("{}, {}, {}, {} \n".format(drivingSpeed, expectedDistance, actualDistance, stoppingDistance))
 
-        if counter > 0:           
-            table.putNumber('DriveDistance/drivingSpeed', speedValues[len(speedValues) - counter])
-            #print('drivingSpeed = {}'.format(speedValues[len(speedValues) - counter]))
-            counter -= 1     
-            table.putBoolean('DriveCompensatedDistance/DriveCompensatedDistance/running', True)
-            
-
-        elif counter == 0:
-            print("Done collecting data")
-            l = list(zip(speedValues,stoppingDistanceValues))
-            l.sort()
-            x = [t[0] for t in l]
-            y = [t[1] for t in l]
-
-            fig, ax = plt.subplots()
-
-            line1, = ax.plot(x,y,label='robot stopping distance')
-            imgFileName = args.output_file[0:-3] + "png"
-
-            ax.legend()
-            ax.set_xlabel("Speed in %/100")
-            ax.set_ylabel("Stopping Distance in inches")
-            ax.set_title("Compensated Stopping Distance vs. Speed for a Distance of {} Inches".format(distanceValue))
-            fig.savefig(imgFileName)
-
-            break
-            
-
+    controlPlane.close()
+    NetworkTables.shutdown()
+
+    if len(stoppingDistanceValues) == len(sweep):
+        print("Done collecting data")
+        # Only load NumPy and matplotlib once there is something to analyze.
+        # Repeated drives at a speed are averaged, the error bars are their
+        # spread.
+        import numpy as np
+        import CaptureAnalysis
+        speeds = np.array(speedValues, dtype=float)
+        distances = np.array(stoppingDistanceValues, dtype=float)
+        aggregate = CaptureAnalysis.aggregateBySpeed(speeds, distances)
+        fits = CaptureAnalysis.fitStoppingCurve(speeds, distances)
+        for direction, fit in fits.items():
+            print("{} fit: d = {}, R^2 = {:.4f}".format(direction, CaptureAnalysis.describeFit(fit), fit["rSquared"]))
+        imgFileName = args.output_file[0:-3] + "png"
+        CaptureAnalysis.plotStoppingDistance(aggregate, fits, imgFileName,
+            "Compensated Stopping Distance vs. Speed for a Distance of {} Inches".format(
+            ", ".join("{:g}".format(distance) for distance in sorted(set(distanceValues)))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import time
+import threading
+from networktables import NetworkTables
+
+# Follows a boolean entry through a NetworkTables listener and counts its
+# rising and falling edges, so waiting for a change sleeps until the update
+# arrives instead of polling getBoolean.
+class BooleanWatcher(object):
+    def __init__(self, condition, entry, flags, default=False):
+        self.condition = condition
+        self.entry = entry
+        self.value = entry.getBoolean(default)
+        self.rising_edges = 0
+        self.falling_edges = 0
+        self.listener_id = entry.addListener(self.valueChanged, flags)
+
+    def valueChanged(self, entry, key, value, is_new):
+        # Called from the NetworkTables thread
+        with self.condition:
+            self.update(bool(value))
+
+    def update(self, value):
+        # The caller holds the condition
+        if value and not self.value:
+            self.rising_edges += 1
+        elif not value and self.value:
+            self.falling_edges += 1
+        self.value = value
+        self.condition.notify_all()
+
+    def set(self, value):
+        # Listeners are not told about our own changes, so apply them here.
+        # This also means a robot reply can never arrive before the change
+        # it replies to.
+        with self.condition:
+            self.entry.setBoolean(value)
+            self.update(value)
+
+    def waitFor(self, value, timeout=None):
+        # Returns False if the entry did not have the value within timeout
+        with self.condition:
+            return self.condition.wait_for(lambda: self.value == value, timeout)
+
+    def waitForRise(self, count=None, timeout=None):
+        # Waits for a rising edge after the count-th one, by default for the
+        # next one. Take count from rising_edges before causing the change.
+        with self.condition:
+            if count is None:
+                count = self.rising_edges
+            return self.condition.wait_for(lambda: self.rising_edges > count, timeout)
+
+    def waitForFall(self, count=None, timeout=None):
+        with self.condition:
+            if count is None:
+                count = self.falling_edges
+            return self.condition.wait_for(lambda: self.falling_edges > count, timeout)
+
+# Follows a number entry and remembers when it last moved by more than
+# tolerance, e.x: to tell when a robot has come to a stop. NetworkTables only
+# sends values that changed, so no updates at all also counts as settled.
+class SettleWatcher(object):
+    def __init__(self, condition, entry, flags, tolerance=0.01):
+        self.condition = condition
+        self.entry = entry
+        self.tolerance = tolerance
+        self.value = entry.getDouble(0)
+        # Value at the last change, small changes are measured against it so
+        # that a slow creep still counts as moving
+        self.reference = self.value
+        self.last_change = time.monotonic()
+        self.listener_id = entry.addListener(self.valueChanged, flags)
+
+    def valueChanged(self, entry, key, value, is_new):
+        with self.condition:
+            self.value = value
+            if abs(value - self.reference) > self.tolerance:
+                self.reference = value
+                self.last_change = time.monotonic()
+                self.condition.notify_all()
+
+    def isSettled(self, settle_time, since=None):
+        # since is a time.monotonic() value before which changes are ignored,
+        # e.x: the time a command stopped
+        last_change = self.last_change
+        if since is not None:
+            last_change = max(last_change, since)
+        return time.monotonic() - last_change >= settle_time
+
+    def waitForSettle(self, settle_time, timeout=None):
+        # Waits until the value has not moved for settle_time seconds,
+        # counting from now at the earliest. Returns False on timeout.
+        start_time = time.monotonic()
+        deadline = None if timeout is None else start_time + timeout
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                quiet = now - max(self.last_change, start_time)
+                if quiet >= settle_time:
+                    return True
+                remaining = settle_time - quiet
+                if deadline is not None:
+                    if now >= deadline:
+                        return False
+                    remaining = min(remaining, deadline - now)
+                self.condition.wait(remaining)
+
+# Event-driven waits on robot control entries, like enabled, running and
+# DataCollection. All watchers share one condition so that a wait can depend
+# on several entries at once.
+class ControlPlane(object):
+    def __init__(self, nt=NetworkTables):
+        self.nt = nt
+        self.condition = threading.Condition()
+        self.flags = nt.NotifyFlags.NEW | nt.NotifyFlags.UPDATE
+        self.watchers = []
+
+    def watchBoolean(self, table_name, key, default=False):
+        entry = self.nt.getTable(table_name).getEntry(key)
+        watcher = BooleanWatcher(self.condition, entry, self.flags, default)
+        self.watchers.append(watcher)
+        return watcher
+
+    def watchSettle(self, table_name, key, tolerance=0.01):
+        entry = self.nt.getTable(table_name).getEntry(key)
+        watcher = SettleWatcher(self.condition, entry, self.flags, tolerance)
+        self.watchers.append(watcher)
+        return watcher
+
+    def waitUntil(self, predicate, timeout=None):
+        # predicate is checked every time a watched entry changes. Returns
+        # its last result, so False means the wait timed out.
+        with self.condition:
+            return self.condition.wait_for(predicate, timeout)
+
+    def close(self):
+        for watcher in self.watchers:
+            watcher.entry.removeListener(watcher.listener_id)
+        self.watchers = []
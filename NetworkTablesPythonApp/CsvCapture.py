@@ -0,0 +1,13 @@
+# Values of the CSV captures written by RobotDataCollector. CsvRowSink writes
+# booleans as True and False and every other value as a number.
+CSV_BOOLEANS = {"True": 1.0, "False": 0.0}
+
+def csvNumber(text):
+    # Booleans become 1.0 and 0.0, anything that is not a number NaN
+    text = text.strip()
+    if text in CSV_BOOLEANS:
+        return CSV_BOOLEANS[text]
+    try:
+        return float(text)
+    except ValueError:
+        return float('nan')
@@ -0,0 +1,208 @@
+import ast
+import math
+from collections import namedtuple
+
+# Derived columns are computed from the other columns of every row as it is
+# collected, e.x: in the derived section of an input file
+#   "derived": [
+#     {"name": "expectedDistance", "expression": "drivingDistance * sign(drivingSpeed)"},
+#     {"name": "stoppingDistance", "expression": "abs(actualDistance - expectedDistance)"},
+#     {"name": "integratedVelocity", "expression": "integral(instantAccel)"}
+#   ]
+# An expression uses Python syntax and may use the columns of the row, the
+# derived columns listed before it, numbers, arithmetic, comparisons,
+# and/or/not, x if condition else y and these functions:
+#   abs, min, max, round, sqrt, hypot, atan2, sin, cos, sign, isnan
+#   prev(x)            value of x in the previous row, x itself in the first
+#   delta(x)           x minus prev(x)
+#   integral(x[, t])   running trapezoidal integral of x over the column t,
+#                      currentTime by default
+# prev, delta and integral start over with every run of a sweep.
+DerivedChannel = namedtuple('DerivedChannel', ['name', 'expression', 'type', 'columns'])
+
+DEFAULT_TIME_COLUMN = "currentTime"
+CONSTANTS = {"pi": math.pi}
+
+def sign(value):
+    return -1.0 if value < 0 else 1.0
+
+FUNCTIONS = {"abs": abs,
+             "min": min,
+             "max": max,
+             "round": round,
+             "sqrt": math.sqrt,
+             "hypot": math.hypot,
+             "atan2": math.atan2,
+             "sin": math.sin,
+             "cos": math.cos,
+             "sign": sign,
+             "isnan": math.isnan}
+# Functions that keep state between rows, with their number of arguments
+STATEFUL_FUNCTIONS = {"prev": (1, 1), "delta": (1, 1), "integral": (1, 2)}
+
+ALLOWED_NODES = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp,
+                 ast.Call, ast.Name, ast.Load, ast.Constant,
+                 ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+                 ast.USub, ast.UAdd, ast.Not, ast.And, ast.Or,
+                 ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+def parseExpression(name, expression, kind="Derived column"):
+    # Checks an expression and returns its syntax tree and the columns it
+    # uses, in order of first use. Raises on anything but the arithmetic
+    # described above. kind names the expression in error messages.
+    if not isinstance(expression, str) or not expression.strip():
+        raise Exception("{} {} has no expression.".format(kind, name))
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise Exception("{} {} has an invalid expression '{}': {}.".format(kind, name, expression, e.msg))
+    columns = []
+    function_nodes = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise Exception("{} {} uses {} in '{}', which expressions do not support.".format(
+                kind, name, type(node).__name__, expression))
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise Exception("{} {} uses {!r} in '{}', only numbers are supported.".format(kind, name, node.value, expression))
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.keywords:
+                raise Exception("{} {} calls a function in '{}' that is not supported.".format(kind, name, expression))
+            function_nodes.add(node.func)
+            function_name = node.func.id
+            if function_name in STATEFUL_FUNCTIONS:
+                least, most = STATEFUL_FUNCTIONS[function_name]
+                if not least <= len(node.args) <= most:
+                    raise Exception("{} {} calls {} with {} arguments in '{}'.".format(
+                        kind, name, function_name, len(node.args), expression))
+                if function_name == "integral" and len(node.args) == 1 and DEFAULT_TIME_COLUMN not in columns:
+                    columns.append(DEFAULT_TIME_COLUMN)
+            elif function_name not in FUNCTIONS:
+                raise Exception("{} {} calls unknown function {}, expected one of {}.".format(
+                    kind, name, function_name, ", ".join(sorted(list(FUNCTIONS) + list(STATEFUL_FUNCTIONS)))))
+        elif isinstance(node, ast.Name) and node not in function_nodes and node.id not in CONSTANTS and node.id not in columns:
+            columns.append(node.id)
+    return tree, tuple(columns)
+
+# Turns column names into row[index] and stateful calls into calls of the
+# evaluator, with a state slot for every call
+class RowExpressionCompiler(ast.NodeTransformer):
+    def __init__(self, column_indexes, allocateSlot):
+        self.column_indexes = column_indexes
+        self.allocateSlot = allocateSlot
+
+    def visit_Name(self, node):
+        if node.id in CONSTANTS:
+            return ast.copy_location(ast.Constant(CONSTANTS[node.id]), node)
+        row = ast.Name(id='row', ctx=ast.Load())
+        return ast.copy_location(ast.Subscript(value=row, slice=ast.Constant(self.column_indexes[node.id]), ctx=ast.Load()), node)
+
+    def visit_Call(self, node):
+        function_name = node.func.id
+        args = [self.visit(arg) for arg in node.args]
+        if function_name in STATEFUL_FUNCTIONS:
+            if function_name == "integral" and len(args) == 1:
+                args.append(self.visit(ast.Name(id=DEFAULT_TIME_COLUMN, ctx=ast.Load())))
+            args.insert(0, ast.Constant(self.allocateSlot()))
+            function_name = "_" + function_name
+        return ast.copy_location(ast.Call(func=ast.Name(id=function_name, ctx=ast.Load()), args=args, keywords=[]), node)
+
+# Evaluates the derived columns of an input file row by row. Every
+# expression is compiled once to a function of the row, appendTo then adds
+# the derived values to the end of a row. A derived column that uses a
+# column not collected in the current mode, e.x: a sweep input outside of
+# COMMAND_INPUT_MODE, holds NaN (False for booleans) and is listed in
+# unavailable. With chained False the expressions are only evaluated, e.x:
+# for the conditions of triggers, cannot use each other and must only use
+# collected columns.
+class DerivedColumns(object):
+    def __init__(self, channels, column_indexes, kind="Derived column", chained=True):
+        # column_indexes maps the name of every collected column to its index
+        # in the row, derived columns are added after them in order
+        self.channels = tuple(channels)
+        self.state = []
+        # (name, missing column names) of every derived column left empty
+        self.unavailable = []
+        namespace = dict(FUNCTIONS)
+        namespace.update({"__builtins__": {}, "_prev": self.prev, "_delta": self.delta, "_integral": self.integral})
+        column_indexes = dict(column_indexes)
+        next_index = max(column_indexes.values()) + 1 if column_indexes else 0
+        self.functions = []
+        for channel in self.channels:
+            value_type, default = (bool, False) if channel.type == "boolean" else (float, float('nan'))
+            missing = [column for column in channel.columns if column not in column_indexes]
+            if missing and not chained:
+                raise Exception("{} {} uses {}, which {} not collected in this mode, e.x: inputs are only collected while sweeping and receive times with timestamps.".format(
+                    kind, channel.name, ", ".join(missing), "is" if len(missing) == 1 else "are"))
+            if missing:
+                # Derived columns using this one get NaN from it in turn
+                self.unavailable.append((channel.name, tuple(missing)))
+                self.functions.append((lambda row, default=default: default, default))
+            else:
+                tree, columns = parseExpression(channel.name, channel.expression, kind)
+                body = RowExpressionCompiler(column_indexes, self.allocateSlot).visit(tree.body)
+                function_tree = ast.Expression(ast.Lambda(args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='row')], kwonlyargs=[],
+                                                                             kw_defaults=[], defaults=[]), body=body))
+                ast.fix_missing_locations(function_tree)
+                function = eval(compile(function_tree, "<derived {}>".format(channel.name), 'eval'), namespace)
+                self.functions.append((self.typed(function, value_type), default))
+            if chained:
+                column_indexes[channel.name] = next_index
+                next_index += 1
+
+    def typed(self, function, value_type):
+        # Booleans are written as True and False, everything else as numbers
+        return lambda row: value_type(function(row))
+
+    def allocateSlot(self):
+        self.state.append(None)
+        return len(self.state) - 1
+
+    def reset(self):
+        # Called at the start of every run
+        for slot in range(len(self.state)):
+            self.state[slot] = None
+
+    def prev(self, slot, value):
+        previous = self.state[slot]
+        self.state[slot] = value
+        return value if previous is None else previous
+
+    def delta(self, slot, value):
+        return value - self.prev(slot, value)
+
+    def integral(self, slot, value, time_value):
+        # state is [last value, last time, total]. Samples that repeat a time
+        # or go back in time add nothing, missing values are skipped.
+        state = self.state[slot]
+        if value != value or time_value != time_value:
+            return 0.0 if state is None else state[2]
+        if state is None:
+            self.state[slot] = [value, time_value, 0.0]
+            return 0.0
+        elapsed = time_value - state[1]
+        if elapsed > 0:
+            state[2] += (value + state[0]) * 0.5 * elapsed
+        state[0] = value
+        state[1] = time_value
+        return state[2]
+
+    def appendTo(self, row):
+        for function, default in self.functions:
+            try:
+                value = function(row)
+            except (ArithmeticError, ValueError, TypeError):
+                # e.x: a division by zero or the sqrt of a negative number
+                value = default
+            row.append(value)
+        return row
+
+    def evaluate(self, row):
+        # Returns the value of every expression without changing the row
+        values = []
+        for function, default in self.functions:
+            try:
+                value = function(row)
+            except (ArithmeticError, ValueError, TypeError):
+                value = default
+            values.append(value)
+        return values
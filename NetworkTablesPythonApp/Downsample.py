@@ -0,0 +1,56 @@
+import numpy as np
+
+# Reduces a series to at most two points per bucket by keeping the minimum
+# and maximum of every bucket in their original order, so spikes remain
+# visible however many points are dropped. Use one bucket per pixel of
+# plot width.
+def minMaxDecimate(x, y, buckets):
+    n = len(y)
+    if buckets <= 0 or n <= 2 * buckets:
+        return x, y
+    size = n // buckets
+    usable = size * buckets
+    blocks = y[:usable].reshape(buckets, size)
+    base = np.arange(buckets) * size
+    indexes = np.concatenate([base + blocks.argmin(axis=1), base + blocks.argmax(axis=1)])
+    indexes.sort()
+    if usable < n:
+        # Always keep the most recent point
+        indexes = np.append(indexes, n - 1)
+    return x[indexes], y[indexes]
+
+# Largest-Triangle-Three-Buckets downsampling. Keeps the first and last
+# points and, from every bucket in between, the point forming the largest
+# triangle with the point kept from the previous bucket and the average of
+# the next bucket. This keeps the visual shape of a trace with far fewer
+# points. x must be sorted.
+def largestTriangleThreeBuckets(x, y, threshold):
+    n = len(x)
+    if threshold < 3 or n <= threshold:
+        return x, y
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i holds the points edges[i] up to, but not including, edges[i + 1]
+    edges = (np.arange(threshold - 1) * ((n - 2) / (threshold - 2))).astype(np.intp) + 1
+    edges[-1] = n - 1
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Every bucket is compared against the average of the bucket after it,
+    # the last bucket against the last point
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+    selected = np.empty(threshold, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = edges[bucket]
+        end = edges[bucket + 1]
+        previous_x = x[previous]
+        previous_y = y[previous]
+        areas = np.abs((previous_x - next_x[bucket]) * (y[start:end] - previous_y) -
+                       (previous_x - x[start:end]) * (next_y[bucket] - previous_y))
+        previous = start + int(areas.argmax())
+        selected[bucket + 1] = previous
+    return x[selected], y[selected]
@@ -0,0 +1,66 @@
+import time
+from CollectorInstrumentation import LatencyHistogram
+
+# Runs a callback at a fixed rate using deadlines computed from a monotonic
+# start time, so a slow tick never pushes back the ticks that follow it.
+# If a tick overruns past one or more later deadlines, those ticks are
+# skipped and counted instead of being run late.
+class FixedRateScheduler(object):
+    JITTER_PERCENTILES = [50, 90, 99, 99.9]
+
+    def __init__(self, rate, duration=None):
+        if rate <= 0:
+            raise Exception("The sample rate must be greater than zero, got {}.".format(rate))
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.duration = duration
+        self.ticks = 0
+        self.skipped_ticks = 0
+        self.elapsed = 0.0
+        # How late each tick started compared to its deadline. A histogram
+        # keeps memory use the same however long the scheduler runs.
+        self.lateness = LatencyHistogram()
+
+    def run(self, tick, keep_running=None):
+        period = self.period
+        start_time = time.monotonic()
+        end_time = None
+        if self.duration is not None:
+            end_time = start_time + self.duration
+        tick_index = 0
+        try:
+            while keep_running is None or keep_running():
+                deadline = start_time + tick_index * period
+                if end_time is not None and deadline >= end_time:
+                    break
+                now = time.monotonic()
+                if deadline > now:
+                    time.sleep(deadline - now)
+                    now = time.monotonic()
+                self.lateness.record(now - deadline)
+                tick()
+                self.ticks += 1
+                # Skip every deadline that already passed while the tick ran
+                tick_index += 1
+                current_index = int((time.monotonic() - start_time) / period)
+                if current_index > tick_index:
+                    self.skipped_ticks += current_index - tick_index
+                    tick_index = current_index
+        finally:
+            self.elapsed = time.monotonic() - start_time
+
+    def achievedRate(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.ticks / self.elapsed
+
+    def jitterPercentiles(self):
+        return {percentile: self.lateness.percentile(percentile) for percentile in self.JITTER_PERCENTILES}
+
+    def printReport(self):
+        print("Collected {} samples in {:.3f} seconds".format(self.ticks, self.elapsed))
+        print("Requested rate: {:.1f} Hz, achieved rate: {:.1f} Hz".format(self.rate, self.achievedRate()))
+        print("Skipped ticks (overruns): {}".format(self.skipped_ticks))
+        jitter = ", ".join("p{}={:.3f} ms".format(p, v * 1000.0) for p, v in self.jitterPercentiles().items())
+        max_lateness = self.lateness.max / 1e9
+        print("Start jitter: {}, max={:.3f} ms".format(jitter, max_lateness * 1000.0))
@@ -1,43 +1,24 @@
-import threading
 from networktables import NetworkTables
 import argparse
-import time
+from NetworkTablesConnection import DEFAULT_ROBOT_IP, addConnectionArguments, connectToNetworkTables
 
 
-parser = argparse.ArgumentParser(description = 'Script to log data from robot. ')
-args = parser.parse_args()
-print(args)
-
-cond = threading.Condition()
-notified = [False]
-
-def connectionListener(connected, info):
-    print(info, '; Connected=%s' % connected)
-    with cond:
-        notified[0] = True
-        cond.notify()
-
-NetworkTables.initialize(server='10.11.21.2') #10.11.21.2 #127.0.0.1
-NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-
-with cond:
-    print("Waiting")
-    if not notified[0]:
-        cond.wait()
-
-# Insert your processing code here
-print("Connected!")
-table = NetworkTables.getTable('Robot')
-
-# This retrieves a boolean at /SmartDashboard/foo
-
-enabled = table.getBoolean('enabled', False)
-print("enabled: {}".format(enabled))
-time.sleep(1)
-
+parser = argparse.ArgumentParser(description = 'Script to print whether the robot is enabled. ')
+addConnectionArguments(parser, DEFAULT_ROBOT_IP)
 
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
 
+    # Every entry has been received once connected, so no need to wait
+    connectToNetworkTables(NetworkTables, args.robot_ip, args.robot_team, args.connect_timeout)
+    table = NetworkTables.getTable('Robot')
 
+    # This retrieves a boolean at /SmartDashboard/foo
 
+    enabled = table.getBoolean('enabled', False)
+    print("enabled: {}".format(enabled))
+    NetworkTables.shutdown()
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import os
+
+# GRAPH propery keywords of the input file
+GRAPH_TITLE = "title"
+GRAPH_YLABEL = "ylabel"
+GRAPH_XLABEL = "xlabel"
+GRAPH_DATAX = "dataX"
+GRAPH_DATAY = "dataY"
+GRAPH_MAX_POINTS = "maxPoints"
+GRAPH_REQUIRED_LABELS = [GRAPH_TITLE, GRAPH_YLABEL, GRAPH_XLABEL,
+                         GRAPH_DATAX, GRAPH_DATAY]
+
+def graphFieldNames(graph):
+    # dataY may be a single name or a list of names
+    y_names = graph[GRAPH_DATAY]
+    if isinstance(y_names, str):
+        y_names = [y_names]
+    x_field_name = graph[GRAPH_DATAX].split('/')[-1]
+    y_field_names = [ y.split('/')[-1] for y in y_names]
+    return x_field_name, y_field_names
+
+def doGraphLablesExist(graph):
+    graph_title = "no title"
+    if GRAPH_TITLE in graph:
+        graph_title = graph[GRAPH_TITLE]
+    for label in GRAPH_REQUIRED_LABELS:
+        if not label in graph:
+            print("Label '{}' expected in graph '{}' but not found. Skipping graph.".format(label, graph_title))
+            return False
+    return True
+
+def doGraphFieldNamesExist(graph, x_field_name, y_field_names, available_field_names):
+    graph_title = graph[GRAPH_TITLE]
+    if x_field_name not in available_field_names:
+        print("Field name {} for graph {} was not found in the samples collected. Skipping Graph.".format(x_field_name, graph_title))
+        return False
+    if len(y_field_names) == 0:
+        print("There were no {} entries provided for graph {}. Skipping Graph.".format(GRAPH_DATAY, graph_title))
+        return False
+    for y_name in y_field_names:
+        if y_name not in available_field_names:
+            print("Field name {} for graph {} was not found in the samples collected. Skipping Graph.".format(y_name, graph_title))
+            return False
+    return True
+
+# Turns the graphs of an input file into render jobs for GraphRenderer,
+# skipping graphs with missing labels or columns. Images are named after
+# output_file, e.x: data.csv gives data_velocity_vs_time.png.
+def buildGraphJobs(graphs, available_field_names, output_directory, output_file, graph_points):
+    jobs = []
+    # For each graph
+    for graph in graphs:
+        # check that all lables exist for this graph
+        if not doGraphLablesExist(graph):
+            continue # skip this graph
+        # Graph x and y field names from the graph
+        x_field_name, y_field_names = graphFieldNames(graph)
+        # Make sure X and Y sample values are present and valid
+        if not doGraphFieldNamesExist(graph, x_field_name, y_field_names, available_field_names):
+            continue # skip this graph
+        img_file_name = os.path.splitext(output_file)[0] + "_" + graph[GRAPH_TITLE].replace(" ","_").lower() + ".png"
+        img_file_path = os.path.join(output_directory, img_file_name)
+        jobs.append({"title": graph[GRAPH_TITLE],
+                     "xlabel": graph[GRAPH_XLABEL],
+                     "ylabel": graph[GRAPH_YLABEL],
+                     "dataX": x_field_name,
+                     "dataY": y_field_names,
+                     "imagePath": img_file_path,
+                     "maxPoints": graph.get(GRAPH_MAX_POINTS, graph_points)})
+    return jobs
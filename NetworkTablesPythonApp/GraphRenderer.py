@@ -0,0 +1,104 @@
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from Downsample import largestTriangleThreeBuckets
+
+# Renders graphs to PNG files with the Agg backend, without pyplot, so no
+# global figure state is kept between graphs. Each job is a dictionary with
+# title, xlabel, ylabel, dataX (column name), dataY (list of column names),
+# imagePath and maxPoints, the number of points each line is downsampled to
+# (0 to plot every point).
+def renderGraph(job, columns, verbose=False):
+    start_time = time.perf_counter()
+    # Sort every line by the X column
+    x_values = np.asarray(columns[job["dataX"]], dtype=float)
+    order = np.argsort(x_values, kind='stable')
+    x = x_values[order]
+    lines = []
+    for y_name in job["dataY"]:
+        y = np.asarray(columns[y_name], dtype=float)[order]
+        lines.append(largestTriangleThreeBuckets(x, y, job["maxPoints"]))
+    if verbose and len(x) > 0:
+        print("Graph '{}': {} samples from X={} to X={}, plotting {} points per line".format(
+            job["title"], len(x), x[0], x[-1], len(lines[0][0]) if lines else 0))
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    # Graph each line on the plot
+    for data_label, (line_x, line_y) in zip(job["dataY"], lines):
+        ax.plot(line_x, line_y, label=data_label)
+    # Set graph properties
+    ax.legend()
+    ax.set_xlabel(job["xlabel"])
+    ax.set_ylabel(job["ylabel"])
+    ax.set_title(job["title"])
+    # Save an image of the graph
+    fig.savefig(job["imagePath"])
+    return job["title"], job["imagePath"], time.perf_counter() - start_time
+
+def renderSharedGraph(job, column_blocks, verbose=False):
+    # Attach to the columns the parent process placed in shared memory
+    blocks = []
+    columns = {}
+    try:
+        for name, (block_name, dtype, length) in column_blocks.items():
+            block = shared_memory.SharedMemory(name=block_name)
+            blocks.append(block)
+            columns[name] = np.ndarray((length,), dtype=dtype, buffer=block.buf)
+        return renderGraph(job, columns, verbose)
+    finally:
+        # Views must be released before the blocks can be closed
+        columns.clear()
+        for block in blocks:
+            block.close()
+
+def poolContext():
+    # Never fork a process that has NetworkTables threads running
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Import matplotlib once in the fork server instead of in every worker
+        context.set_forkserver_preload(["GraphRenderer"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+# Renders every job and returns a list of (title, image path, seconds).
+# With more than one worker the graphs are rendered in a process pool and
+# the columns are shared with the workers through shared memory instead of
+# being pickled.
+def renderGraphs(jobs, columns, workers=None, verbose=False):
+    if not jobs:
+        return []
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        return [renderGraph(job, columns, verbose) for job in jobs]
+
+    blocks = {}
+    column_blocks = {}
+    try:
+        for job in jobs:
+            for name in [job["dataX"]] + job["dataY"]:
+                if name in column_blocks:
+                    continue
+                values = np.ascontiguousarray(columns[name])
+                block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+                blocks[name] = block
+                np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+                column_blocks[name] = (block.name, values.dtype.str, len(values))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=poolContext()) as pool:
+            futures = []
+            for job in jobs:
+                # Only hand each worker the columns its graph uses
+                job_blocks = {name: column_blocks[name] for name in [job["dataX"]] + job["dataY"]}
+                futures.append(pool.submit(renderSharedGraph, job, job_blocks, verbose))
+            return [future.result() for future in futures]
+    finally:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
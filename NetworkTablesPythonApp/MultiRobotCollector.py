@@ -0,0 +1,124 @@
+import os
+import copy
+import argparse
+import threading
+from networktables import NetworkTablesInstance
+import RobotDataCollector
+from BufferedWriter import RowWriterPool
+
+parser = argparse.ArgumentParser(description = 'Script to log data from several robots at once. Every other option is passed on to the RobotDataCollector of each robot, see RobotDataCollector.py -h. ',
+                                 allow_abbrev=False)
+parser.add_argument('--robots', action='store', nargs='+', required=True,
+        help='Robots to collect from, each a team number like 1100 or an IP address like 10.11.0.2 or 127.0.0.1:1736, optionally prefixed with a name like practice=1100. The name, or the address, is added to the output file names')
+parser.add_argument('--writer-threads', action='store', type=int, default=1, help='Number of threads writing the output files of all robots')
+
+# One robot to collect from and the outcome of collecting from it
+class RobotTarget(object):
+    def __init__(self, text):
+        name, _, address = text.rpartition('=')
+        self.address = address
+        self.name = name or address.replace('.', '-').replace(':', '-')
+        self.collector = None
+        self.error = None
+        self.thread = None
+        # Set once collecting from the robot has ended
+        self.finished = threading.Event()
+
+    def collectorArgs(self, collector_args):
+        robot_args = copy.copy(collector_args)
+        if self.address.isdigit():
+            robot_args.robot_team = int(self.address)
+            robot_args.robot_ip = None
+        else:
+            robot_args.robot_ip = self.address
+        base, extension = os.path.splitext(collector_args.output_file)
+        robot_args.output_file = "{}_{}{}".format(base, self.name, extension)
+        return robot_args
+
+class MultiRobotCollector(object):
+    def __init__(self, parsed_args, collector_args):
+        self.args = parsed_args
+        self.collector_args = collector_args
+        self.robots = [RobotTarget(text) for text in self.args.robots]
+        names = [robot.name for robot in self.robots]
+        if len(set(names)) != len(names):
+            raise Exception("Every robot needs its own name, got {}.".format(", ".join(names)))
+        # Rows of every robot are written by the same few threads
+        self.writer_pool = RowWriterPool(self.args.writer_threads,
+                                         flush_rows=collector_args.flush_rows,
+                                         flush_interval=collector_args.flush_interval)
+        self.stopping = threading.Event()
+
+    def collectFromRobot(self, robot):
+        try:
+            # Every robot gets its own NetworkTables client
+            nt = NetworkTablesInstance.create()
+            robot.collector = RobotDataCollector.RobotDataCollector(robot.collectorArgs(self.collector_args), nt, self.writer_pool)
+            if self.stopping.is_set():
+                # Ctrl-C came while the collector was being created
+                robot.collector.requestStop()
+            if robot.collector.waitForRobotEnabled():
+                robot.collector.collectData()
+        except Exception as e:
+            robot.error = e
+            print("Collecting from {} failed: {}".format(robot.name, e))
+        finally:
+            robot.finished.set()
+
+    def collectData(self):
+        for robot in self.robots:
+            robot.thread = threading.Thread(target=self.collectFromRobot, args=(robot,), name="Robot-{}".format(robot.name), daemon=True)
+            robot.thread.start()
+        try:
+            for robot in self.robots:
+                # Wait with a timeout so that Ctrl-C still reaches this thread
+                while not robot.finished.wait(0.5):
+                    pass
+        except KeyboardInterrupt:
+            # Every collector closes its writer once stopped, so all the rows
+            # collected so far are written before the pool is closed
+            print("Stopping the collection from every robot")
+            self.stopping.set()
+            for robot in self.robots:
+                if robot.collector is not None:
+                    robot.collector.requestStop()
+            for robot in self.robots:
+                # Not Thread.join, which can return early once Ctrl-C
+                # interrupted it
+                robot.finished.wait()
+        finally:
+            self.writer_pool.close()
+
+    def generateGraphs(self):
+        for robot in self.robots:
+            if robot.collector is not None and robot.error is None:
+                robot.collector.generateGraphs()
+
+    def printSummary(self):
+        print("{:>16} {:>24} {:>10}  {}".format("robot", "address", "samples", "status"))
+        for robot in self.robots:
+            samples = 0
+            if robot.collector is not None and robot.collector.stats is not None:
+                samples = robot.collector.stats.samples
+            status = "ok" if robot.error is None else "failed: {}".format(robot.error)
+            print("{:>16} {:>24} {:>10}  {}".format(robot.name, robot.address, samples, status))
+
+    def shutdown(self):
+        for robot in self.robots:
+            if robot.collector is not None:
+                robot.collector.nt.shutdown()
+
+def main(argv=None):
+    args, collector_argv = parser.parse_known_args(argv)
+    collector_args = RobotDataCollector.parseArgs(collector_argv)
+    print(args)
+    print(collector_args)
+
+    multi_collector = MultiRobotCollector(args, collector_args)
+    multi_collector.collectData()
+    multi_collector.generateGraphs()
+    multi_collector.printSummary()
+    multi_collector.shutdown()
+
+if __name__ == '__main__':
+    main()
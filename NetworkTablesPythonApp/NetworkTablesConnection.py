@@ -0,0 +1,55 @@
+import time
+import threading
+from networktables import NetworkTables
+
+DEFAULT_ROBOT_TEAM = 1100
+DEFAULT_ROBOT_IP = '10.11.21.2'
+# Seconds the client keeps running after a flush so that the network thread
+# gets to send the changes before shutdown drops them
+DISCONNECT_GRACE = 0.1
+
+def addConnectionArguments(parser, default_robot_ip=None):
+    # Adds the options connectToNetworkTables takes to an argparse parser
+    parser.add_argument('-t', '--robot-team', action='store', default=DEFAULT_ROBOT_TEAM, type=int, help='Robot team number')
+    parser.add_argument('-a', '--robot-ip', action='store', default=default_robot_ip,
+            help='IP Address of the robot to connect to, e.x: 10.11.21.2 or 127.0.0.1, optionally followed by :PORT. Uses the team number when not given')
+    parser.add_argument('--connect-timeout', action='store', type=float, default=None, help='Give up if the robot cannot be reached within this many seconds, waits forever by default')
+
+# Starts nt as a client of the robot and waits until it is connected. Once
+# connected every entry of the robot has been received, so values can be read
+# right away. robot_ip may end in :PORT, e.x: for a simulator. Without
+# robot_ip the robot is found from its team number.
+def connectToNetworkTables(nt=NetworkTables, robot_ip=None, robot_team=DEFAULT_ROBOT_TEAM, timeout=None):
+    cond = threading.Condition()
+    notified = [False]
+
+    def connectionListener(connected, info):
+        print(info, '; Connected=%s' % connected)
+        with cond:
+            notified[0] = True
+            cond.notify()
+
+    # Decide whether to start using team number or IP address
+    if robot_ip is None:
+        nt.startClientTeam(robot_team)
+    elif ':' in robot_ip:
+        host, port = robot_ip.rsplit(':', 1)
+        nt.initialize(server=(host, int(port)))
+    else:
+        nt.initialize(server=robot_ip)
+
+    nt.addConnectionListener(connectionListener, immediateNotify=True)
+
+    with cond:
+        print("Waiting")
+        if not cond.wait_for(lambda: notified[0], timeout):
+            raise Exception("Could not connect to the robot within {} seconds.".format(timeout))
+
+    print("Connected!")
+
+# Sends every pending change to the robot and stops the client. Use it
+# instead of sleeping a second before exit to make sure the last puts go out.
+def disconnectFromNetworkTables(nt=NetworkTables):
+    nt.flush()
+    time.sleep(DISCONNECT_GRACE)
+    nt.shutdown()
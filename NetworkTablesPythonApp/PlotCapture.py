@@ -0,0 +1,108 @@
+import os
+import csv
+import json
+import time
+import argparse
+import BinaryCapture
+import SparseCapture
+import RotatingCapture
+import GraphConfig
+from CsvCapture import csvNumber
+
+parser = argparse.ArgumentParser(description = 'Script to graph a CSV, binary or sparse capture written by RobotDataCollector. ')
+parser.add_argument('capture_file', help='CSV, binary or sparse capture file, or the manifest of a segmented capture, written by RobotDataCollector')
+parser.add_argument('-i', '--input-file', action='store', default=None,
+        help='Input file whose graphs are drawn. Defaults to the input file stored in a binary or sparse capture, or robot_nt_names.json for CSV captures')
+parser.add_argument('-d', '--output-directory', action='store', default=None, help='Name of directory to store the images, defaults to the directory of the capture file')
+parser.add_argument('--graph-workers', action='store', type=int, default=None, help='Number of processes used to render graphs, defaults to the number of CPUs')
+parser.add_argument('--graph-points', action='store', type=int, default=2000, help='Number of points each graph line is downsampled to, 0 plots every point. A graph can override it with a {} entry'.format(GraphConfig.GRAPH_MAX_POINTS))
+parser.add_argument('-v', '--verbose', action='store_true', help='Print more information about what happens')
+
+def isBinaryCapture(file_path):
+    with open(file_path, 'rb') as fp:
+        return fp.read(len(BinaryCapture.MAGIC)) == BinaryCapture.MAGIC
+
+def readColumns(labels, rows, field_names, file_path):
+    # Reads only the named columns, booleans become 1.0 and 0.0
+    import numpy as np
+    indexes = {name: labels.index(name) for name in field_names if name in labels}
+    if field_names and not indexes:
+        print("None of {} are in the labels of {}, it may have been written without labels.".format(", ".join(sorted(field_names)), file_path))
+    values = {name: [] for name in indexes}
+    for row in rows:
+        for name, index in indexes.items():
+            values[name].append(csvNumber(row[index]) if index < len(row) else float('nan'))
+    return {name: np.array(column, dtype=float) for name, column in values.items()}
+
+def readCsvColumns(file_path, field_names):
+    with open(file_path, newline='') as fp:
+        reader = csv.reader(fp)
+        labels = next(reader, None)
+        if labels is None:
+            raise Exception("{} is empty.".format(file_path))
+        return readColumns(labels, reader, field_names, file_path)
+
+def readSegmentColumns(manifest_path, field_names):
+    # Streams the segments, so only the named columns are held in memory
+    labels = RotatingCapture.readManifest(manifest_path)["labels"] or []
+    return readColumns(labels, RotatingCapture.readRows(manifest_path), field_names, manifest_path)
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+
+    config = None
+    segmented = args.capture_file.endswith(RotatingCapture.MANIFEST_SUFFIX)
+    binary = not segmented and isBinaryCapture(args.capture_file)
+    if binary:
+        header, columns = BinaryCapture.readCapture(args.capture_file)
+        config = header["config"]
+    elif not segmented and SparseCapture.isSparseCapture(args.capture_file):
+        # Rebuilt into dense columns like a binary capture
+        header, columns = SparseCapture.readCapture(args.capture_file)
+        config = header["config"]
+        binary = True
+    if args.input_file is not None or config is None:
+        with open(args.input_file or 'robot_nt_names.json') as fp:
+            config = json.load(fp)
+    graphs = config.get("graphs", [])
+    if not graphs:
+        print("No graphs to generate.")
+        return
+
+    if not binary:
+        field_names = set()
+        for graph in graphs:
+            if GraphConfig.GRAPH_DATAX in graph and GraphConfig.GRAPH_DATAY in graph:
+                x_field_name, y_field_names = GraphConfig.graphFieldNames(graph)
+                field_names.add(x_field_name)
+                field_names.update(y_field_names)
+        if segmented:
+            columns = readSegmentColumns(args.capture_file, field_names)
+        else:
+            columns = readCsvColumns(args.capture_file, field_names)
+
+    output_directory = args.output_directory
+    if output_directory is None:
+        output_directory = os.path.dirname(args.capture_file) or '.'
+    # Images are named after the capture, e.x: data_manifest.json gives data_velocity_vs_time.png
+    image_base_name = os.path.basename(args.capture_file)
+    if segmented:
+        image_base_name = image_base_name[:-len(RotatingCapture.MANIFEST_SUFFIX)] + ".csv"
+    jobs = GraphConfig.buildGraphJobs(graphs, columns, output_directory, image_base_name, args.graph_points)
+    graph_columns = {}
+    for job in jobs:
+        for field_name in [job["dataX"]] + job["dataY"]:
+            graph_columns[field_name] = columns[field_name]
+
+    # matplotlib is only loaded here, after the capture has been read
+    from GraphRenderer import renderGraphs
+    start_time = time.perf_counter()
+    results = renderGraphs(jobs, graph_columns, args.graph_workers, args.verbose)
+    for title, img_file_path, render_time in results:
+        print("Rendered graph '{}' to {} in {:.3f} seconds".format(title, img_file_path, render_time))
+    if results:
+        print("Rendered {} graphs in {:.3f} seconds".format(len(results), time.perf_counter() - start_time))
+
+if __name__ == '__main__':
+    main()
@@ -1,421 +1,770 @@
 import os
-import csv
-import json
+import math
 import time
+import queue
 import threading
 from networktables import NetworkTables
 import argparse
+from collections import namedtuple
 from datetime import datetime
-import matplotlib.pyplot as plt
+from FixedRateScheduler import FixedRateScheduler
+from BufferedWriter import BufferedRowWriter, CsvRowSink
+from BinaryCapture import BinaryRowSink
+from SparseCapture import SparseRowSink, DEFAULT_KEYFRAME_ROWS
+from DerivedChannels import DerivedColumns
+from TriggeredCapture import EventRowSink, TriggeredRowWriter, parseTriggerArgument
+from RotatingCapture import RotatingRowSink, COMPRESSIONS, NO_COMPRESSION, manifestPath
+from SampleStore import ColumnarSampleStore
+import GraphConfig
+from CollectorInstrumentation import CollectorStats, RateLimitedPrinter
+from ControlPlane import ControlPlane
+from SweepEngine import SweepEngine
+import CollectorConfig
+from NetworkTablesConnection import addConnectionArguments, connectToNetworkTables
 
 date_str = datetime.now().strftime('%Y%m%d%H%M%S')
 COMMAND_MODE = "COMMAND_MODE"
 COMMAND_INPUT_MODE = "COMMAND_INPUT_MODE"
 COUNT_MODE = "COUNT_MODE"
 TIME_MODE = "TIME_MODE"
+TRIGGER_MODE = "TRIGGER_MODE"
+CSV_FORMAT = "csv"
+BINARY_FORMAT = "binary"
+SPARSE_FORMAT = "sparse"
+SINGLE_OUTPUT = "single"
+PER_RUN_OUTPUT = "per-run"
+# Rows kept in memory for graphs by default when the output rotates or is
+# triggered, which are meant for runs of any length
+ROTATING_MAX_SAMPLE_ROWS = 1000000
+# Rows kept before a trigger by default when entry updates are recorded,
+# whose rate is not known up front
+DEFAULT_TRIGGER_BUFFER_ROWS = 100000
 
 parser = argparse.ArgumentParser(description = 'Script to log data from robot. ')
 parser.add_argument('-d', '--output-directory', action='store', default='./', help='Name of directory to store the output file')
 parser.add_argument('-o', '--output-file', action='store', default=date_str + '_robot_data.csv', help='Name of file to use for writing collected data')
 parser.add_argument('-i', '--input-file', action='store', default='robot_nt_names.json', help='List of names to query from NetworkTables and store in the output file')
-parser.add_argument('-m', '--sample-mode', action='store', choices=[COMMAND_MODE, COMMAND_INPUT_MODE, COUNT_MODE, TIME_MODE], default=COUNT_MODE,
-        help='Defines the samples collection mode. {} indicates that a command will be executed and samples collected for the duration of the command. {} indicates that a command will be executed for all provided inputs and data will be collected each time that the command is executed. {} indicates that a specified sample count of samples will be collected. {} indicates that samples will be collected for a period of time.'.format(COMMAND_MODE, COMMAND_INPUT_MODE, COUNT_MODE, TIME_MODE))
+parser.add_argument('--no-config-cache', action='store_true', help='Check and compile the input file even if it has not changed since the last run, and do not cache the result')
+parser.add_argument('-m', '--sample-mode', action='store', choices=[COMMAND_MODE, COMMAND_INPUT_MODE, COUNT_MODE, TIME_MODE, TRIGGER_MODE], default=COUNT_MODE,
+        help='Defines the samples collection mode. {} indicates that a command will be executed and samples collected for the duration of the command. {} indicates that a command will be executed for all provided inputs and data will be collected each time that the command is executed. {} indicates that a specified sample count of samples will be collected. {} indicates that samples will be collected for a period of time. {} indicates that samples will be collected until stopped and only the samples around each trigger will be written, one file per event named after the output file with _eventNNNN added.'.format(COMMAND_MODE, COMMAND_INPUT_MODE, COUNT_MODE, TIME_MODE, TRIGGER_MODE))
 parser.add_argument('-c', '--sample-count', action='store', type=int, default=1, help='Defines the number of samples collect before exiting')
-parser.add_argument('-t', '--robot-team', action='store', default=1100, type=int, help='Robot team number')
-parser.add_argument('-a', '--robot-ip', action='store', default=None, help='IP Address of the robot to connect to, e.x: 10.11.21.2 or 127.0.0.1')
+parser.add_argument('-r', '--sample-rate', action='store', type=float, default=50.0, help='Defines the rate in Hz at which samples are collected in {}, {}, {} and {}'.format(TIME_MODE, COMMAND_MODE, COMMAND_INPUT_MODE, TRIGGER_MODE))
+parser.add_argument('-s', '--sample-duration', action='store', type=float, default=10.0, help='Defines the number of seconds to collect samples for in {}'.format(TIME_MODE))
+addConnectionArguments(parser)
+parser.add_argument('--trigger', action='append', default=None,
+        help='Condition that triggers an event in {}, as NAME=CONDITION or only CONDITION, added to the triggers of the input file. A trigger fires when its condition turns true, a condition that holds when collection starts waits until it turns false and true again. Can be given more than once, e.x: --trigger "bump=abs(instantAccel) > 200" --trigger running'.format(TRIGGER_MODE))
+parser.add_argument('--pre-trigger', action='store', type=float, default=1.0, help='Number of seconds of samples before a trigger written to its event file')
+parser.add_argument('--post-trigger', action='store', type=float, default=2.0, help='Number of seconds of samples after the last trigger of an event written to its event file')
+parser.add_argument('--trigger-buffer-rows', action='store', type=int, default=None,
+        help='Keep at most this many samples in memory for the pre-trigger window. Twice the samples of the window at the sample rate by default, or {} when entry updates are recorded'.format(DEFAULT_TRIGGER_BUFFER_ROWS))
+parser.add_argument('--max-events', action='store', type=int, default=None, help='Stop {} after this many events, runs until stopped by default'.format(TRIGGER_MODE))
+parser.add_argument('-e', '--event-driven', action='store_true', help='Record a row for every NetworkTables entry update instead of polling all entries in a loop')
+parser.add_argument('-T', '--timestamps', action='store_true',
+        help='Add a <name>_time column for every entry holding the time its current value was received, in seconds since collection started. NetworkTables does not forward the robot-side change time, so this is the time the update reached this computer')
+parser.add_argument('--snapshot', action='store_true',
+        help='Record one row per robot cycle, once the updates of the entries of the snapshot group in the input file for that cycle have arrived, so the values of a row belong together. Entries that did not change in a cycle keep their last value. Uses the graphed entries when the input file has no snapshot group')
+parser.add_argument('-f', '--format', action='store', choices=[CSV_FORMAT, BINARY_FORMAT, SPARSE_FORMAT], default=CSV_FORMAT,
+        help='Defines the output file format. {} writes fixed-width binary records that can be converted to CSV with BinaryCapture.py. {} only writes the values that changed since the previous row, plus a full row every --keyframe-rows rows, and is converted to CSV with SparseCapture.py'.format(BINARY_FORMAT, SPARSE_FORMAT))
+parser.add_argument('--keyframe-rows', action='store', type=int, default=DEFAULT_KEYFRAME_ROWS, help='Number of rows between the full rows of {} output'.format(SPARSE_FORMAT))
+parser.add_argument('--sweep-output', action='store', choices=[SINGLE_OUTPUT, PER_RUN_OUTPUT], default=SINGLE_OUTPUT,
+        help='How {} stores the runs of a sweep. {} writes every run to the output file with a run column holding the run index, {} writes each run to its own file named after the output file with _runNNN added'.format(COMMAND_INPUT_MODE, SINGLE_OUTPUT, PER_RUN_OUTPUT))
 parser.add_argument('-l', '--no-labels', action='store_true', help='Do not insert heading labels in the CSV output file')
+parser.add_argument('--keep-all-columns', action='store_true', help='Keep every collected column in memory instead of only the columns used by graphs')
+parser.add_argument('--max-sample-rows', action='store', type=int, default=None,
+        help='Keep at most this many rows in memory for graphs, thinning them out evenly over the run once reached. Unlimited by default, or {} when the output rotates or in {}'.format(ROTATING_MAX_SAMPLE_ROWS, TRIGGER_MODE))
+parser.add_argument('--compression', action='store', choices=COMPRESSIONS, default=NO_COMPRESSION,
+        help='Write CSV output as a series of segments compressed in blocks, listed in a _manifest.json file next to them. Join them with RotatingCapture.py')
+parser.add_argument('--rotate-size', action='store', type=float, default=None, help='Start a new output segment once the current one holds this many megabytes, implies segmented output')
+parser.add_argument('--rotate-interval', action='store', type=float, default=None, help='Start a new output segment once the current one is this many seconds old, implies segmented output')
+parser.add_argument('--flush-rows', action='store', type=int, default=1000, help='Flush the output file after this many rows have been written')
+parser.add_argument('--flush-interval', action='store', type=float, default=1.0, help='Flush the output file at least this often, in seconds')
+parser.add_argument('--graph-workers', action='store', type=int, default=None, help='Number of processes used to render graphs, defaults to the number of CPUs')
+parser.add_argument('--graph-points', action='store', type=int, default=2000, help='Number of points each graph line is downsampled to, 0 plots every point. A graph can override it with a {} entry'.format("maxPoints"))
+parser.add_argument('--enable-timeout', action='store', type=float, default=None, help='Give up if the robot is not enabled within this many seconds, waits forever by default')
+parser.add_argument('--command-timeout', action='store', type=float, default=None, help='Give up if a command does not finish and settle within this many seconds, waits forever by default')
+parser.add_argument('--settle-time', action='store', type=float, default=0.5,
+        help='After a command stops, keep collecting until the {} entry has not moved for this many seconds'.format("commandSettle"))
+parser.add_argument('--settle-tolerance', action='store', type=float, default=0.01, help='Changes of the {} entry up to this size do not count as moving'.format("commandSettle"))
+parser.add_argument('--stats-json', action='store_true', help='Write the timing summary as JSON next to the output file')
+parser.add_argument('--gap-threshold', action='store', type=float, default=None, help='Report intervals between samples longer than this many seconds as gaps, by default intervals 5 times longer than average are gaps')
+parser.add_argument('--print-interval', action='store', type=float, default=1.0, help='Minimum number of seconds between verbose per-sample messages')
 parser.add_argument('-v', '--verbose', action='store_true', help='Print more information about what happens')
-args = parser.parse_args()
-print(args)
+# One resolved NetworkTables entry of the compiled sample plan
+SamplePlanEntry = namedtuple('SamplePlanEntry', ['table_name', 'name', 'short_name', 'type',
+                                                 'column', 'entry', 'getter', 'default'])
 
 class RobotDataCollector(object):
     # TOP LEVEL INPUT FILE KEYWORDS
-    CONTROLS = "controls"
-    TABLES = "tables"
-    GRAPHS = "graphs"
+    CONTROLS = CollectorConfig.CONTROLS
+    TABLES = CollectorConfig.TABLES
+    GRAPHS = CollectorConfig.GRAPHS
+    SNAPSHOT = CollectorConfig.SNAPSHOT
     # CONTROLS property keywords
-    CONTROL_ROBOT_ENABLED = "robotEnabled"
-    CONTROL_TRIGGER_CMD = "triggerCommand"
+    CONTROL_ROBOT_ENABLED = CollectorConfig.CONTROL_ROBOT_ENABLED
+    CONTROL_TRIGGER_CMD = CollectorConfig.CONTROL_TRIGGER_CMD
+    # Optional entry that has to settle after the command stops, e.x:
+    # Data/actualDistance while the robot brakes
+    CONTROL_COMMAND_SETTLE = CollectorConfig.CONTROL_COMMAND_SETTLE
+    # triggerCommand property keywords
+    TRIGGER_CMD_INPUTS = CollectorConfig.TRIGGER_CMD_INPUTS
+    TRIGGER_CMD_SWEEP = CollectorConfig.TRIGGER_CMD_SWEEP
+    # Column holding the index of the sweep run a sample belongs to
+    RUN_COLUMN_NAME = CollectorConfig.RUN_COLUMN_NAME
     # TABLE propery keywords
-    TABLE_ELEMENT_NAME = "name"
-    TABLE_ELEMENT_TYPE = "type"
-    TABLE_ELEMENT_TYPE_BOOLEAN = "boolean"
-    TABLE_ELEMENT_TYPE_DOUBLE = "double"
+    TABLE_ELEMENT_NAME = CollectorConfig.TABLE_ELEMENT_NAME
+    TABLE_ELEMENT_TYPE = CollectorConfig.TABLE_ELEMENT_TYPE
+    TABLE_ELEMENT_TYPE_BOOLEAN = CollectorConfig.TABLE_ELEMENT_TYPE_BOOLEAN
+    TABLE_ELEMENT_TYPE_DOUBLE = CollectorConfig.TABLE_ELEMENT_TYPE_DOUBLE
+    # SNAPSHOT property keywords
+    SNAPSHOT_ENTRIES = CollectorConfig.SNAPSHOT_ENTRIES
+    SNAPSHOT_TIMEOUT = CollectorConfig.SNAPSHOT_TIMEOUT
+    # Updates of one robot cycle arrive together, updates more than this
+    # many seconds after the first one of a cycle start the next cycle
+    SNAPSHOT_DEFAULT_TIMEOUT = CollectorConfig.SNAPSHOT_DEFAULT_TIMEOUT
+    # Suffix of the columns holding the time an entry value was received
+    TIMESTAMP_SUFFIX = CollectorConfig.TIMESTAMP_SUFFIX
     # GRAPH propery keywords
-    GRAPH_TITLE = "title"
-    GRAPH_YLABEL = "ylabel"
-    GRAPH_XLABEL = "xlabel"
-    GRAPH_DATAX = "dataX"
-    GRAPH_DATAY = "dataY"
-    GRAPH_REQUIRED_LABELS = [GRAPH_TITLE, GRAPH_YLABEL, GRAPH_XLABEL,
-                             GRAPH_DATAX, GRAPH_DATAY]
-    def __init__(self, parsed_args):
+    GRAPH_TITLE = GraphConfig.GRAPH_TITLE
+    GRAPH_YLABEL = GraphConfig.GRAPH_YLABEL
+    GRAPH_XLABEL = GraphConfig.GRAPH_XLABEL
+    GRAPH_DATAX = GraphConfig.GRAPH_DATAX
+    GRAPH_DATAY = GraphConfig.GRAPH_DATAY
+    GRAPH_MAX_POINTS = GraphConfig.GRAPH_MAX_POINTS
+    GRAPH_REQUIRED_LABELS = GraphConfig.GRAPH_REQUIRED_LABELS
+    # Seconds to wait for an entry update before re-checking the sample mode
+    UPDATE_WAIT_TIMEOUT = 0.1
+    def __init__(self, parsed_args, nt=NetworkTables, writer_pool=None, connected=False):
         self.args = parsed_args
-        self.connectToNetworkTables()
-        self.config = self.loadInputFile()
-        self.samples = {}
+        # NetworkTables instance to collect from, the process-wide one by default
+        self.nt = nt
+        # Optional RowWriterPool shared with other collectors
+        self.writer_pool = writer_pool
+        # Set by requestStop to end the collection early
+        self.stop_requested = threading.Event()
+        # connected means nt is already connected, e.x: by CollectorDaemon
+        if not connected:
+            self.connectToNetworkTables()
+        self.compiled_config = self.loadInputFile()
+        # The input file as loaded, for binary capture headers
+        self.config = self.compiled_config.source
+        self.samples = ColumnarSampleStore([])
+        self.stats = None
         self.field_names = []
+        self.entry_listeners = []
+        self.run_index = 0
         if (self.args.verbose):
             print("Input:")
             print(self.config)
             print("")
         self.verifyConfigControls()
+        self.watchControls()
 
     def loadInputFile(self):
-        json_content = ""
-        with open(self.args.input_file) as fp:
-            json_content = json.load(fp)
-        return json_content
+        # Checked and compiled once, later runs load it from the cache
+        return CollectorConfig.loadCollectorConfig(self.args.input_file, not self.args.no_config_cache)
 
     def connectToNetworkTables(self):
-        cond = threading.Condition()
-        notified = [False]
-
-        def connectionListener(connected, info):
-            print(info, '; Connected=%s' % connected)
-            with cond:
-                notified[0] = True
-                cond.notify()
-
-        # Decide whether to start using team number or IP address
-        if self.args.robot_ip is None:
-            NetworkTables.startClientTeam(self.args.robot_team)
-        else:
-            NetworkTables.initialize(server=self.args.robot_ip)
-
-        NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-        with cond:
-            print("Waiting")
-            if not notified[0]:
-                cond.wait()
-
-        # Insert your processing code here
-        print("Connected!")
+        connectToNetworkTables(self.nt, self.args.robot_ip, self.args.robot_team, self.args.connect_timeout)
 
     def verifyConfigControls(self):
-        if not self.CONTROLS in self.config:
-            raise Exception("Controls section missing from input file.")
-        controls = self.config[self.CONTROLS]
-        if not self.CONTROL_ROBOT_ENABLED in controls:
-            raise Exception("No network table entry identified for determining robot enable/disable state.")
-        self.robotEnabledCtrl = controls[self.CONTROL_ROBOT_ENABLED]
-        if not type(self.robotEnabledCtrl) is dict:
-            raise Exception("The " + self.CONTROL_ROBOT_ENABLED + " entry MUST be a dictionary type in the json input file!")
-        if not self.robotEnabledCtrl:
-            raise Exception("Multiple " + self.CONTROL_ROBOT_ENABLED + " entries provided in json input file. Only one is supported!")
-        if not self.CONTROL_TRIGGER_CMD in controls:
-            raise Exception("No trigger command supplied.")
-        self.triggerCommandCtrl = controls[self.CONTROL_TRIGGER_CMD]
-        if not type(self.triggerCommandCtrl) is dict:
-            raise Exception("The triggerCommand entry MUST be a dictionary type in the json input file!")
-        # Verify that all control objects have a table name
-        # and network tables table entry
-        required_control_labels = ["table", "entry"]
-        for control_name in self.config[self.CONTROLS]:
-            control_obj = self.config[self.CONTROLS][control_name]
-            for label in required_control_labels:
-                if label not in control_obj:
-                    raise Exception("The {} entry must have a dictionary entry for {} but none was found!".format(control_name, label))
-        self.commandInputs = None
-        # If mode is COMMAND_INPUT_MODE, then check to make sure an input section exists for the command
-        if self.args.sample_mode == COMMAND_INPUT_DONE:
-            if not "input" in self.config[self.CONTROLS][self.CONTROL_TRIGGER_CMD]:
-                raise Exception("The mode {} was used, but the {} entry does not have an 'inputs' key!".format(self.args.sample_mode, self.CONTROL_TRIGGER_CMD))
-            self.commandInputs = self.config[self.CONTROLS][self.CONTROL_TRIGGER_CMD]["inputs"]
-            if not type(self.commandInputs) is dict:
-                raise Exception("The command inputs entry MUST be a dictionary type in the json input file!")
-            # Check that every input entry has the required labels
-            required_input_lables = ["name", "type", "rangeStart", "rangeEnd", "increment"]
-            for input_table in self.commandInputs:
-                for input_entry in input_table:
-                    for label in required_input_lables:
-                        if not label in input_entry:
-                            raise Exception("The entry {} from table {} must have a dictionary entry for {} but none was found!".format(input_entry, input_table, label))
-
+        # loadInputFile has checked the input file, only the checks that
+        # depend on the sample mode are left
+        self.sweep = None
+        if self.args.sample_mode == COMMAND_INPUT_MODE:
+            if not self.compiled_config.inputs:
+                raise Exception("The mode {} was used, but the {} entry does not have an '{}' key!".format(self.args.sample_mode, self.CONTROL_TRIGGER_CMD, self.TRIGGER_CMD_INPUTS))
+            self.sweep = SweepEngine(self.compiled_config.inputs, self.compiled_config.sweep, self.nt)
+            print("Sweeping {} over {} runs".format(", ".join(self.sweep.inputNames()), len(self.sweep)))
+
+    def watchControls(self):
+        # Follow the control entries with listeners instead of polling them
+        self.control_plane = ControlPlane(self.nt)
+        robot_enabled = self.compiled_config.robot_enabled
+        self.robot_enabled = self.control_plane.watchBoolean(robot_enabled.table_name, robot_enabled.name)
+        # Note that the trigger cmd should look something like this:
+        # "DriveCompensatedDistance/DriveCompensatedDistance/running"
+        trigger_command = self.compiled_config.trigger_command
+        self.command_running = self.control_plane.watchBoolean(trigger_command.table_name, trigger_command.name)
+        self.command_settle = None
+        command_settle = self.compiled_config.command_settle
+        if command_settle is not None:
+            self.command_settle = self.control_plane.watchSettle(command_settle.table_name, command_settle.name, self.args.settle_tolerance)
+        self.command_deadline = None
+        self.command_stopped = None
 
     def waitForRobotEnabled(self):
-        ctrlTable = NetworkTables.getTable(self.robotEnabledCtrl["table"])
-        robotEnabled = ctrlTable.getBoolean(self.robotEnabledCtrl["entry"], False)
-
+        # Returns False if requestStop was called before the robot was enabled
+        if self.args.sample_mode == TRIGGER_MODE:
+            # A triggered capture fills its pre-trigger buffer from connect,
+            # so a trigger on enabled fires when the robot is enabled
+            print("Collecting without waiting for the robot to be enabled")
+            return self.isCollecting()
         print("Waiting for robot to be enabled")
-                
-        while not robotEnabled:
-            time.sleep(1)
-            robotEnabled = ctrlTable.getBoolean(self.robotEnabledCtrl["entry"], False)
-
+        if not self.control_plane.waitUntil(lambda: self.robot_enabled.value or self.stop_requested.is_set(), self.args.enable_timeout):
+            raise Exception("The robot was not enabled within {} seconds.".format(self.args.enable_timeout))
+        if self.stop_requested.is_set():
+            print("Stopped before the robot was enabled")
+            return False
         print("Robot is enabled")
+        return True
+
+    def requestStop(self):
+        # Ends waitForRobotEnabled and collectData early, safe to call from
+        # any thread. Rows collected so far are still written.
+        self.stop_requested.set()
+        with self.control_plane.condition:
+            self.control_plane.condition.notify_all()
+
+    def isCollecting(self):
+        return not self.stop_requested.is_set()
+
+    def close(self):
+        # Removes the control listeners, needed when nt outlives the collector
+        self.control_plane.close()
 
     def startCommand(self):
-        # Get trigger command from configuration file
-        trigger_cmd = self.config["controls"][self.CONTROL_TRIGGER_CMD]
-        # Get the table associated with the trigger cmd
-        trigger_table = self.config["controls"]["table"]
-        table = NetworkTables.getTable(trigger_table)
-        # Query the running state of the trigger command.
-        # Note that the trigger cmd should look something like this:
-        # "DriveCompensatedDistance/DriveCompensatedDistance/running"
-        table.putBoolean(trigger_cmd, True)
+        self.command_deadline = None
+        if self.args.command_timeout is not None:
+            self.command_deadline = time.monotonic() + self.args.command_timeout
+        self.command_stopped = None
+        self.command_running.set(True)
+        # Send the change now instead of at the next periodic update
+        self.nt.flush()
 
     def isCommandRunning(self):
-        # Get trigger command from configuration file
-        trigger_cmd = self.config["controls"][self.CONTROL_TRIGGER_CMD]
-        # Get the table associated with the trigger cmd
-        trigger_table = self.config["controls"]["table"]
-        table = NetworkTables.getTable(trigger_table)
-        # Query the running state of the trigger command.
-        # Note that the trigger cmd should look something like this:
-        # "DriveCompensatedDistance/DriveCompensatedDistance/running"
-        cmd_current_state = table.getBoolean(trigger_cmd, False)
-        return cmd_current_state
-
-    def commandInitializeInputs(self):
-        for input_table in self.commandInputs:
-            table = NetworkTables.getTable(input_table)
-            for input_entry in input_table:
-                start_value = input_entry.rangeStart
-                table.putNumber(input_entry.name, start_value)
-
-    def commandInputDone(self):
-        all_inputs_reached_completion = True
-        for input_table in self.commandInputs:
-            table = NetworkTables.getTable(input_table)
-            for input_entry in input_table:
-                start_value = input_entry.rangeStart
-                end_value = input_entry.rangeEnd
-                current_value = table.getNumber(input_entry.name, start_value)
-                if current_value != end_value:
-                    all_inputs_reached_completion = False
-        return all_inputs_reached_completion
-
-
-    def commandIncrementInputs(self):
-        for input_table in self.commandInputs:
-            table = NetworkTables.getTable(input_table)
-            for input_entry in input_table:
-                start_value = input_entry.rangeStart
-                end_value = input_entry.rangeEnd
-                increment = input_entry.increment
-                current_value = table.getNumber(input_entry.name, start_value)
-                current_value = current_value + increment
-                # TODO: Correct for over shooting the end value
-                # TODO: Verify that the start, end, and increment values make sense. :)
-
-
-    def insertInputsIntoTableData(self):
-        if self.commandInputs is None:
+        if self.command_deadline is not None and time.monotonic() > self.command_deadline:
+            raise Exception("The command did not finish within {} seconds.".format(self.args.command_timeout))
+        return self.command_running.value
+
+    def isCommandCollecting(self):
+        # Collection continues while the command runs and, with a
+        # commandSettle entry, until that entry stops moving
+        if self.isCommandRunning():
+            return True
+        if self.command_settle is None:
+            return False
+        if self.command_stopped is None:
+            self.command_stopped = time.monotonic()
+        return not self.command_settle.isSettled(self.args.settle_time, self.command_stopped)
+
+    def insertInputsIntoTableData(self, plan):
+        if self.sweep is None:
             return
 
-        for input_table in self.commandInputs:
-            for input_entry in input_table:
-                name = input_entry.name
-                input_type = input_entry.type
-                if not input_table in self.config[self.TABLES]:
-                    self.config[self.TABLES][input_table] = []
-                input_data = {"name": name, "type": input_type}
-                self.config[self.TABLES][input_table].append(input_data)
+        # Tag every sample with its run, the input values follow it
+        self.run_column = len(plan)
+        plan.append(SamplePlanEntry("", self.RUN_COLUMN_NAME, self.RUN_COLUMN_NAME, self.TABLE_ELEMENT_TYPE_DOUBLE,
+                                    self.run_column, None, lambda default: self.run_index, 0))
+        for sweep_input in self.sweep.inputs:
+            self.addToSamplePlan(plan, sweep_input.table_name, sweep_input.name, sweep_input.type)
+
+    def compileSamplePlan(self):
+        plan = []
+        # Insert inputs to the beggining of the plan if present
+        self.insertInputsIntoTableData(plan)
+        planned_names = set((planned.table_name, planned.name) for planned in plan)
+        for config_entry in self.compiled_config.entries:
+            # An input listed in a table is already in the plan
+            if (config_entry.table_name, config_entry.name) in planned_names:
+                continue
+            self.addToSamplePlan(plan, config_entry.table_name, config_entry.name, config_entry.type)
+        return plan
+
+    def addToSamplePlan(self, plan, table_name, sample_name, sample_type):
+        # Resolve the entry once so that sampling only has to read it
+        entry = self.nt.getTable(table_name).getEntry(sample_name)
+        if (sample_type == self.TABLE_ELEMENT_TYPE_BOOLEAN):
+            getter = entry.getBoolean
+            default = False
+        else:
+            getter = entry.getDouble
+            default = 0
+        plan.append(SamplePlanEntry(table_name, sample_name, sample_name.split('/')[-1], sample_type,
+                                    len(plan), entry, getter, default))
 
     def collectFieldNames(self):
-        if not self.TABLES in self.config:
-            print("No tables provided to collect data from.")
-            exit(0)
-        tables = self.config[self.TABLES]
-        field_names = []
-
-        for table_name in tables:
-            nt_table = NetworkTables.getTable(table_name)
-            # Collect each item from the table
-            for entry in tables[table_name]:
-                # Extract field name and add to list
-                if not self.TABLE_ELEMENT_NAME in entry:
-                    continue
-                field_name = entry[self.TABLE_ELEMENT_NAME]
-                field_short_name = field_name.split('/')[-1]
-                field_names.append(field_short_name)
-        return field_names
+        return [name for name, column_type, planned, row_index in self.collectRowColumns()]
+
+    def collectRowColumns(self):
+        # Every row holds the value of each planned entry followed, with
+        # timestamps, by the time each of those values was received
+        columns = [(planned.short_name, planned.type, planned, planned.column) for planned in self.sample_plan]
+        if self.args.timestamps:
+            for planned in self.sample_plan:
+                columns.append((planned.short_name + self.TIMESTAMP_SUFFIX, self.TABLE_ELEMENT_TYPE_DOUBLE,
+                                planned, len(self.sample_plan) + planned.column))
+        # Derived columns come last, computed from the columns before them.
+        # Like the run column they belong to no table.
+        for channel in self.compiled_config.derived:
+            derived = SamplePlanEntry("", channel.name, channel.name, channel.type, len(columns), None, None, None)
+            columns.append((channel.name, channel.type, derived, len(columns)))
+        return columns
+
+    def compileDerivedColumns(self):
+        # Every column that is sampled, derived columns have no getter
+        column_indexes = {name: row_index for name, column_type, planned, row_index in self.collectRowColumns()
+                          if planned.getter is not None}
+        derived_columns = DerivedColumns(self.compiled_config.derived, column_indexes)
+        for name, missing in derived_columns.unavailable:
+            print("Derived column {} uses {}, which {} not collected in {}, it holds NaN".format(
+                name, ", ".join(missing), "is" if len(missing) == 1 else "are", self.args.sample_mode))
+        return derived_columns
+
+    def createSampleStore(self):
+        # Only keep the columns that graphs need unless asked to keep all
+        graphed_field_names = self.collectGraphedFieldNames()
+        columns = []
+        for name, column_type, planned, row_index in self.collectRowColumns():
+            if self.args.keep_all_columns or name in graphed_field_names:
+                columns.append((name, column_type, row_index))
+        max_rows = self.args.max_sample_rows
+        if max_rows is None and (self.isRotatingOutput() or self.args.sample_mode == TRIGGER_MODE):
+            max_rows = ROTATING_MAX_SAMPLE_ROWS
+        return ColumnarSampleStore(columns, max_rows=max_rows)
+
+    def isRotatingOutput(self):
+        return (self.args.compression != NO_COMPRESSION or self.args.rotate_size is not None
+                or self.args.rotate_interval is not None)
+
+    def compileSnapshotGroup(self):
+        # Columns that have to update together before a row is recorded
+        names = self.compiled_config.snapshot_entries
+        if names is None:
+            graphed_field_names = self.collectGraphedFieldNames()
+            names = [planned.short_name for planned in self.sample_plan if planned.short_name in graphed_field_names]
+            if not names:
+                names = [planned.short_name for planned in self.sample_plan]
+        columns = {planned.short_name: planned.column for planned in self.sample_plan}
+        group = set()
+        for name in names:
+            # Sweep inputs are only collected in COMMAND_INPUT_MODE
+            if name not in columns:
+                raise Exception("Snapshot entry {} is only collected in {}.".format(name, COMMAND_INPUT_MODE))
+            group.add(columns[name])
+        self.snapshot_group = group
+        self.snapshot_timeout = self.compiled_config.snapshot_timeout
+        self.snapshot_pending = {}
+        self.snapshot_started = 0.0
+        self.mixed_snapshots = 0
+        if self.args.verbose:
+            print("Recording a row when {} have all updated".format(
+                ", ".join(self.sample_plan[column].short_name for column in sorted(group))))
 
-    def collectData(self):
-        # Check that there are tables to collect data from
-        if not self.TABLES in self.config:
-            print("No tables provided to collect data from.")
-            return
+    def collectGraphedFieldNames(self):
+        return self.compiled_config.graph_columns
 
-        samples = {}
+    def graphFieldNames(self, graph):
+        return GraphConfig.graphFieldNames(graph)
 
-        # Insert inputs to the beggining of the tables section if present
-        self.insertInputsIntoTableData()
+    def collectData(self):
+        # Resolve every entry from the input file up front
+        self.sample_plan = self.compileSamplePlan()
+        # Compile the expressions of the derived columns once
+        self.derived_columns = self.compileDerivedColumns()
 
-        # Collect field names from input file
+        # Collect field names from the sample plan
         field_names = self.collectFieldNames()
         self.field_names = field_names
+        # Keep collected values in memory for graphing
+        samples = self.createSampleStore()
+        # Time every stage of the collection loop
+        self.stats = CollectorStats(field_names, self.args.gap_threshold)
+        self.printer = RateLimitedPrinter(self.args.print_interval)
         # Open output file
-        output_filepath = os.path.join(self.args.output_directory, self.args.output_file)
-        out_file = open(output_filepath, 'w')
-        csv_writer = csv.DictWriter(out_file, fieldnames=field_names, dialect='unix')
-        if not self.args.no_labels: # Write labels by default
-            csv_writer.writeheader()
+        listening = self.args.event_driven or self.args.snapshot
+        per_run_output = self.sweep is not None and self.args.sweep_output == PER_RUN_OUTPUT
+        if self.args.sample_mode == TRIGGER_MODE:
+            row_writer = self.openTriggeredWriter(listening)
+        else:
+            row_writer = self.openRowWriter(self.runOutputFile(0) if per_run_output else self.args.output_file)
+
+        # Choose between polling all entries and recording entry updates
+        self.start_time = time.monotonic()
+        if self.args.snapshot:
+            self.compileSnapshotGroup()
+            self.startEntryListeners(queue.Queue())
+            collect = self.collectSnapshot
+        elif self.args.event_driven:
+            self.startEntryListeners(queue.Queue())
+            collect = self.collectUpdate
+        elif self.args.timestamps:
+            # Receive times are only known from listeners, so rows are built
+            # from the values the listeners last saw
+            self.startEntryListeners(None)
+            collect = self.collectStampedSample
+        else:
+            collect = self.collectSample
 
         number_of_samples = 0
-        # Determine the requested mode and collect samples
-        if (self.args.sample_mode == COUNT_MODE):
-            # While there are still samples to collect
-            while (number_of_samples < self.args.sample_count):
-                # Collect a sample
-                self.collectSample(samples, csv_writer)
-                # Increment sample count
-                number_of_samples += 1
-        elif (self.args.sample_mode == COMMAND_MODE):
-            # Start the command
-            self.startCommand()
-            # While the command is still running
-            while (self.isCommandRunning()):
-                # Collect a sample
-                self.collectSample(samples, csv_writer)
-                # Increment sample count
-                number_of_samples += 1
-        elif (self.args.sample_mode == COMMAND_INPUT_MODE):
-            # Initialize inputs
-            self.commandInitializeInputs()
-            # While not all inputs have reached their target
-            while (not self.commandInputDone()):
+        try:
+            # Determine the requested mode and collect samples
+            if (self.args.sample_mode == COUNT_MODE):
+                # While there are still samples to collect
+                while (number_of_samples < self.args.sample_count) and self.isCollecting():
+                    # Collect a sample and increment sample count
+                    if collect(samples, row_writer):
+                        number_of_samples += 1
+            elif (self.args.sample_mode == COMMAND_MODE):
                 # Start the command
                 self.startCommand()
-                # While the command is still running
-                while (self.isCommandRunning()):
-                    # Collect a sample
-                    self.collectSample(samples, csv_writer)
-                    # Increment sample count
-                    number_of_samples += 1
-                # Increment inputs
-                self.commandIncrementInputs()
-            # Open and write a new file?
-            # TODO: Either write different inputs into different files OR
-            # log the inputs with the samples
-        elif (self.args.sample_mode == TIME_MODE):
-            # Start the clock
-            # While there is still time remaining
-                # Collect a sample
-                # Increment sample count
-            pass
+                # Collect samples while the command is still running
+                number_of_samples += self.collectWhile(collect, samples, row_writer, self.isCommandCollecting, listening)
+            elif (self.args.sample_mode == COMMAND_INPUT_MODE):
+                # Run the command once for every set of inputs in the sweep
+                for run in self.sweep.runs():
+                    if not self.isCollecting():
+                        break
+                    if per_run_output and run.index > 0:
+                        row_writer.close()
+                        row_writer = self.openRowWriter(self.runOutputFile(run.index))
+                    self.startRun(run)
+                    self.startCommand()
+                    # Collect samples while the command is still running
+                    run_samples = self.collectWhile(collect, samples, row_writer, self.isCommandCollecting, listening)
+                    number_of_samples += run_samples
+                    print("Run {} of {} ({}): {} samples".format(run.index + 1, len(self.sweep), self.sweep.describeRun(run), run_samples))
+            elif (self.args.sample_mode == TIME_MODE):
+                # Collect samples until the time runs out
+                number_of_samples = self.collectWhile(collect, samples, row_writer, None, listening, self.args.sample_duration)
+            elif (self.args.sample_mode == TRIGGER_MODE):
+                # Collect samples until stopped or enough events are written,
+                # Ctrl-C is the usual way to end a triggered capture
+                try:
+                    number_of_samples = self.collectWhile(collect, samples, row_writer, lambda: not row_writer.finished, listening)
+                except KeyboardInterrupt:
+                    print("Triggered capture stopped")
+        finally:
+            self.stopEntryListeners()
+            if self.args.snapshot:
+                # The last robot cycle is only complete once collection ends
+                self.recordSnapshot(samples, row_writer)
+                if self.mixed_snapshots > 0:
+                    print("Dropped {} robot cycles whose updates mixed with the next cycle".format(self.mixed_snapshots))
+            # Write out every buffered row, including on Ctrl-C
+            row_writer.close()
+            if self.args.verbose or row_writer.dropped_rows > 0 or self.args.sample_mode == TRIGGER_MODE:
+                row_writer.printStats()
+            self.stats.printSummary()
+            self.writeStats()
         self.samples = samples
 
-    def collectSample(self, samples, csv_writer):
-        tables = self.config[self.TABLES]
-        csv_line = {}
-        # For each table from the input file
-        for table_name in tables:
-            print("Collecting data from table " + table_name)
-            nt_table = NetworkTables.getTable(table_name)
-            # Collect each item from the table
-            for entry in tables[table_name]:
-                # Extract sample name
-                if not self.TABLE_ELEMENT_NAME in entry:
-                    continue
-                sample_name = entry[self.TABLE_ELEMENT_NAME]
-                # Extract sample type (default is double if not provided)
-                sample_type = self.TABLE_ELEMENT_TYPE_DOUBLE
-                if (self.TABLE_ELEMENT_TYPE in entry):
-                    sample_type = entry[self.TABLE_ELEMENT_TYPE]
-                # Collect the sample
-                sample_value = None
-                sample_short_name = sample_name.split('/')[-1]
-                if sample_short_name not in samples:
-                    samples[sample_short_name] = []
-                if (sample_type == self.TABLE_ELEMENT_TYPE_DOUBLE):
-                    sample_value = nt_table.getNumber(sample_name, 0)
-                elif (sample_type == self.TABLE_ELEMENT_TYPE_BOOLEAN):
-                    sample_value = nt_table.getBoolean(sample_name, False)
-                else:
-                    print("Unknown sample type {} for sample {}. Using None.".format(sample_type, sample_name))
-                    sample_value = None
-                samples[sample_short_name].append(sample_value)
-                csv_line[sample_short_name] = sample_value
-                if self.args.verbose:
-                    print("Collected sample {}={} from table {}".format(sample_name, sample_value, table_name))
+    def openRowWriter(self, output_file, queue_size=10000):
+        return self.wrapRowSink(self.openRowSink(output_file), queue_size)
+
+    def openRowSink(self, output_file):
+        output_filepath = os.path.join(self.args.output_directory, output_file)
+        if self.isRotatingOutput():
+            if self.args.format != CSV_FORMAT:
+                raise Exception("Segmented output is written as CSV and cannot be combined with --format {}.".format(self.args.format))
+            labels = None if self.args.no_labels else self.field_names
+            max_bytes = None if self.args.rotate_size is None else int(self.args.rotate_size * 1024 * 1024)
+            row_sink = RotatingRowSink(output_filepath, labels, self.args.compression, max_bytes, self.args.rotate_interval)
+            print("Writing segments listed in {}".format(manifestPath(output_filepath)))
+        elif self.args.format in [BINARY_FORMAT, SPARSE_FORMAT]:
+            columns = [{"name": name, "type": column_type,
+                        "table": planned.table_name, "entry": planned.name}
+                       for name, column_type, planned, row_index in self.collectRowColumns()]
+            if self.args.format == BINARY_FORMAT:
+                row_sink = BinaryRowSink(output_filepath, columns, self.config)
+            else:
+                row_sink = SparseRowSink(output_filepath, columns, self.config, self.args.keyframe_rows)
+        else:
+            labels = None
+            if not self.args.no_labels: # Write labels by default
+                labels = self.field_names
+            row_sink = CsvRowSink(output_filepath, labels)
+        return row_sink
+
+    def wrapRowSink(self, row_sink, queue_size=10000):
+        if self.writer_pool is not None:
+            return self.writer_pool.openWriter(row_sink, self.stats)
+        # Rows are written on a separate thread so file I/O never delays sampling
+        return BufferedRowWriter(row_sink,
+                                 queue_size=queue_size,
+                                 flush_rows=self.args.flush_rows,
+                                 flush_interval=self.args.flush_interval,
+                                 stats=self.stats)
+
+    def openTriggeredWriter(self, listening):
+        # Rows only reach the disk around triggers, one file per event
+        triggers = list(self.compiled_config.triggers)
+        for text in self.args.trigger or []:
+            triggers.append(parseTriggerArgument(text))
+        if not triggers:
+            raise Exception("{} needs a {} section in the input file or --trigger.".format(TRIGGER_MODE, CollectorConfig.TRIGGERS))
+        if self.args.pre_trigger < 0 or self.args.post_trigger < 0:
+            raise Exception("The pre-trigger and post-trigger windows cannot be negative, got {} and {}.".format(
+                self.args.pre_trigger, self.args.post_trigger))
+        column_indexes = {name: row_index for name, column_type, planned, row_index in self.collectRowColumns()}
+        conditions = DerivedColumns(triggers, column_indexes, "Trigger", chained=False)
+        self.trigger_buffer_rows = self.args.trigger_buffer_rows
+        if self.trigger_buffer_rows is None:
+            if listening:
+                self.trigger_buffer_rows = DEFAULT_TRIGGER_BUFFER_ROWS
+            else:
+                self.trigger_buffer_rows = int(math.ceil(self.args.pre_trigger * self.args.sample_rate * 2)) + 1
+        if self.args.verbose:
+            for trigger in triggers:
+                print("Trigger {} fires when {} turns true".format(trigger.name, trigger.expression))
+        event_log_path = os.path.join(self.args.output_directory, os.path.splitext(self.args.output_file)[0] + "_events.csv")
+        # Event files are opened and closed on the writer thread. The whole
+        # pre-trigger window is queued at once when a trigger fires.
+        row_writer = self.wrapRowSink(EventRowSink(self.openEventSink, event_log_path), max(10000, 2 * self.trigger_buffer_rows))
+        return TriggeredRowWriter(conditions, row_writer, self.args.pre_trigger, self.args.post_trigger,
+                                  self.trigger_buffer_rows, self.args.max_events)
+
+    def openEventSink(self, event_index):
+        event_file = self.eventOutputFile(event_index)
+        return event_file, self.openRowSink(event_file)
+
+    def eventOutputFile(self, event_index):
+        base, extension = os.path.splitext(self.args.output_file)
+        return "{}_event{:04d}{}".format(base, event_index, extension)
+
+    def runOutputFile(self, run_index):
+        base, extension = os.path.splitext(self.args.output_file)
+        return "{}_run{:03d}{}".format(base, run_index, extension)
+
+    def startRun(self, run):
+        self.run_index = run.index
+        # prev, delta and integral start over with every run
+        self.derived_columns.reset()
+        # startCommand flushes the inputs together with the trigger
+        self.sweep.applyRun(run)
+        if not self.entry_listeners:
+            return
+        # Listeners are not told about our own changes, so put the run index
+        # and the inputs into the row they build directly
+        received = time.monotonic() - self.start_time
+        self.updateLatestRow(self.run_column, run.index, float('nan'))
+        self.latest_stamped[self.run_column] = (run.index, float('nan'))
+        plan_columns = {(planned.table_name, planned.name): planned.column for planned in self.sample_plan}
+        for sweep_input, value in zip(self.sweep.inputs, run.values):
+            column = plan_columns.get((sweep_input.table_name, sweep_input.name))
+            if column is not None:
+                self.updateLatestRow(column, value, received)
+                self.latest_stamped[column] = (value, received)
+
+    def collectWhile(self, collect, samples, row_writer, keep_running, listening, duration=None):
+        # Returns the number of samples collected
+        command_running = keep_running
+        keep_running = lambda: self.isCollecting() and (command_running is None or command_running())
+        if listening:
+            # collect waits for the next update, so it can be called in a loop
+            number_of_samples = 0
+            end_time = None if duration is None else time.monotonic() + duration
+            while keep_running() and (end_time is None or time.monotonic() < end_time):
+                # Collect a sample and increment sample count
+                if collect(samples, row_writer):
+                    number_of_samples += 1
+            return number_of_samples
+        # Collect samples at a fixed rate instead of spinning
+        scheduler = FixedRateScheduler(self.args.sample_rate, duration)
+        try:
+            scheduler.run(lambda: collect(samples, row_writer), keep_running)
+        finally:
+            scheduler.printReport()
+        return scheduler.ticks
+
+    def writeStats(self):
+        if not self.args.stats_json or self.stats is None:
+            return
+        stats_file_name = os.path.splitext(self.args.output_file)[0] + "_stats.json"
+        self.stats.writeJson(os.path.join(self.args.output_directory, stats_file_name))
+
+    def collectSample(self, samples, row_writer):
+        start = time.perf_counter()
+        # Read every entry in the sample plan
+        csv_line = [planned.getter(planned.default) for planned in self.sample_plan]
+        acquired = time.perf_counter()
+        self.derived_columns.appendTo(csv_line)
+        samples.appendRow(csv_line)
+        built = time.perf_counter()
+        # Log an entry for the collected information in the csv file
+        row_writer.writeRow(csv_line)
+        self.stats.recordSample(start, acquired, built, time.perf_counter(), csv_line)
+        if self.args.verbose:
+            self.printer.print("Collected sample {}", csv_line)
+        return True
+
+    def collectStampedSample(self, samples, row_writer):
+        start = time.perf_counter()
+        # Copy the values the listeners last saw. Each value is stored
+        # together with its receive time, so the pairs always match.
+        stamped = list(self.latest_stamped)
+        acquired = time.perf_counter()
+        csv_line = [value for value, received in stamped]
+        csv_line.extend([received for value, received in stamped])
+        self.derived_columns.appendTo(csv_line)
+        samples.appendRow(csv_line)
+        built = time.perf_counter()
         # Log an entry for the collected information in the csv file
-        csv_writer.writerow(csv_line)
+        row_writer.writeRow(csv_line)
+        self.stats.recordSample(start, acquired, built, time.perf_counter(), csv_line)
+        if self.args.verbose:
+            self.printer.print("Collected sample {}", csv_line)
+        return True
+
+    def startEntryListeners(self, updates):
+        # updates is the queue every update is put on, or None when the
+        # listeners only need to keep the latest values
+        self.entry_updates = updates
+        self.entry_listeners = []
+        flags = self.nt.NotifyFlags.NEW | self.nt.NotifyFlags.UPDATE
+        # Seed the row with the current values so that every row is complete.
+        # Values that have not been received yet have no receive time.
+        self.latest_stamped = [(planned.getter(planned.default), float('nan')) for planned in self.sample_plan]
+        self.latest_row = [value for value, received in self.latest_stamped]
+        if self.args.timestamps:
+            self.latest_row.extend([received for value, received in self.latest_stamped])
+        # Subscribe to every entry in the sample plan
+        for planned in self.sample_plan:
+            if planned.entry is None:
+                continue
+            listener_id = planned.entry.addListener(self.makeEntryListener(planned.column), flags)
+            self.entry_listeners.append((planned.entry, listener_id))
+        if self.args.verbose:
+            print("Listening for updates on {} entries".format(len(self.entry_listeners)))
+
+    def makeEntryListener(self, column):
+        updates = self.entry_updates
+        latest_stamped = self.latest_stamped
+        start_time = self.start_time
+        # Called from the NetworkTables thread, so only record the update and
+        # hand it off
+        def entryListener(entry, key, value, is_new):
+            received = time.monotonic() - start_time
+            latest_stamped[column] = (value, received)
+            if updates is not None:
+                updates.put((column, value, received))
+        return entryListener
+
+    def stopEntryListeners(self):
+        for nt_entry, listener_id in self.entry_listeners:
+            nt_entry.removeListener(listener_id)
+        self.entry_listeners = []
+
+    def collectUpdate(self, samples, row_writer):
+        # Wait for the next entry update. Time out so that the caller can
+        # re-check whether collection should continue.
+        try:
+            column, sample_value, received = self.entry_updates.get(timeout=self.UPDATE_WAIT_TIMEOUT)
+        except queue.Empty:
+            return False
+        start = time.perf_counter()
+        self.updateLatestRow(column, sample_value, received)
+        # Every update produces one row holding the latest value of each entry
+        csv_line = self.derived_columns.appendTo(list(self.latest_row))
+        samples.appendRow(csv_line)
+        built = time.perf_counter()
+        # Log an entry for the collected information in the csv file
+        row_writer.writeRow(csv_line)
+        self.stats.recordSample(start, None, built, time.perf_counter(), csv_line)
+        if self.args.verbose:
+            self.printer.print("Collected update {}={}", self.sample_plan[column].name, sample_value)
+        return True
+
+    def updateLatestRow(self, column, sample_value, received):
+        self.latest_row[column] = sample_value
+        if self.args.timestamps:
+            self.latest_row[len(self.sample_plan) + column] = received
+
+    def collectSnapshot(self, samples, row_writer):
+        # Updates that arrive within snapshot_timeout of the first one belong
+        # to one robot cycle. NetworkTables only sends values that changed,
+        # so an entry of the group without an update in a cycle held still
+        # and keeps its last value. A cycle is recorded once the next one
+        # starts or no update came for longer than snapshot_timeout.
+        try:
+            column, sample_value, received = self.entry_updates.get(timeout=self.UPDATE_WAIT_TIMEOUT)
+        except queue.Empty:
+            if time.monotonic() - self.start_time - self.snapshot_started > self.snapshot_timeout:
+                return self.recordSnapshot(samples, row_writer)
+            return False
+        if column not in self.snapshot_group:
+            # Entries outside of the group show up in the next row
+            self.updateLatestRow(column, sample_value, received)
+            return False
+        pending = self.snapshot_pending
+        recorded = False
+        if pending and received - self.snapshot_started > self.snapshot_timeout:
+            recorded = self.recordSnapshot(samples, row_writer)
+        elif column in pending:
+            # The entry updated twice within one cycle, so updates of two
+            # robot cycles arrived mixed together and cannot be told apart
+            self.mixed_snapshots += 1
+            pending.clear()
+        if not pending:
+            self.snapshot_started = received
+        pending[column] = (sample_value, received)
+        return recorded
+
+    def recordSnapshot(self, samples, row_writer):
+        # Writes the row of the pending robot cycle, if there is one
+        pending = self.snapshot_pending
+        if not pending:
+            return False
+        start = time.perf_counter()
+        for pending_column, (pending_value, pending_received) in pending.items():
+            self.updateLatestRow(pending_column, pending_value, pending_received)
+        pending.clear()
+        csv_line = self.derived_columns.appendTo(list(self.latest_row))
+        samples.appendRow(csv_line)
+        built = time.perf_counter()
+        # Log an entry for the collected information in the csv file
+        row_writer.writeRow(csv_line)
+        self.stats.recordSample(start, None, built, time.perf_counter(), csv_line)
+        if self.args.verbose:
+            self.printer.print("Collected snapshot {}", csv_line)
+        return True
 
     def generateGraphs(self):
         # If there are graphs requested from the input file
-        if not self.GRAPHS in self.config:
+        if not self.compiled_config.graphs:
             print("No graphs to generate.")
             return
 
         if self.args.verbose:
             print("Generating graphs")
 
-        graphs = self.config[self.GRAPHS]
-        # For each graph
-        for graph in graphs:
-            # check that all lables exist for this graph
-            if not self.doGraphLablesExist(graph):
-                continue # skip this graph
-            if self.args.verbose:
-                print("Generating graph: {}".format(graph[self.GRAPH_TITLE]))
-            # Graph x and y field names from the graph
-            x_field_name = graph[self.GRAPH_DATAX].split('/')[-1]
-            y_field_names = [ y.split('/')[-1] for y in graph[self.GRAPH_DATAY]]
-            # Make sure X and Y sample values are present and valid
-            if not self.doGraphFieldNamesExist(graph, x_field_name, y_field_names):
-                continue # skip this graph
-            # Generate a graph with matplotlib
-            # Gather all of the lines for sorting
-            graph_data = list(zip(self.samples[x_field_name], *[self.samples[y_name] for y_name in y_field_names]))
-            graph_data.sort()
-            # Pull the sorted data back out again
-            x = [v[0] for v in graph_data]
-            if self.args.verbose:
-                print("X data: {}".format(x))
-            yvals = []
-            for i in range(len(y_field_names)):
-                yvals.append([v[i+1] for v in graph_data])
-            if self.args.verbose:
-                print("Y data: {}".format(yvals))
-            fig, ax = plt.subplots()
-            lines = []
-            # Graph each line on the plot
-            for t in zip(y_field_names, yvals):
-                data_label = t[0]
-                y = t[1]
-                if self.args.verbose:
-                    print("Graphing yvalue {}".format(t))
-                line, = ax.plot(x,y,label=data_label)
-                lines.append(line)
-            # Set graph properties
-            ax.legend()
-            ax.set_xlabel(graph[self.GRAPH_XLABEL])
-            ax.set_ylabel(graph[self.GRAPH_YLABEL])
-            ax.set_title(graph[self.GRAPH_TITLE])
-            # Save an image of the graph
-            img_file_name = self.args.output_file[0:-4] + "_" + graph[self.GRAPH_TITLE].replace(" ","_").lower() + ".png"
-            img_file_path = os.path.join(self.args.output_directory, img_file_name)
-            fig.savefig(img_file_path)
-
-    def doGraphFieldNamesExist(self, graph, x_field_name, y_field_names):
-        graph_title = graph[self.GRAPH_TITLE]
-        if x_field_name not in self.samples:
-            print("Field name {} for graph {} was not found in the samples collected. Skipping Graph.".format(x_field_name, graph_title))
-            return False
-        if len(y_field_names) == 0:
-            print("There were no {} entries provided for graph {}. Skipping Graph.".format(self.GRAPH_DATAY, graph_title))
-            return False
-        for y_name in y_field_names:
-            if y_name not in self.samples:
-                print("Field name {} for graph {} was not found in the samples collected. Skipping Graph.".format(y_name, graph_title))
-                return False
-        return True
-
-    def doGraphLablesExist(self, graph):
-        graph_title = "no title"
-        if self.GRAPH_TITLE in graph:
-            graph_title = graph[self.GRAPH_TITLE]
-        for label in self.GRAPH_REQUIRED_LABELS:
-            if not label in graph:
-                print("Label '{}' expected in graph '{}' but not found. Skipping graph.".format(label, graph_title))
-                return False
-        return True
-
-data_collector = RobotDataCollector(args)
-data_collector.waitForRobotEnabled()
-data_collector.collectData()
-data_collector.generateGraphs()
+        jobs = GraphConfig.buildGraphJobs(self.compiled_config.graphs, self.samples, self.args.output_directory,
+                                          self.args.output_file, self.args.graph_points)
+        columns = {}
+        for job in jobs:
+            for field_name in [job["dataX"]] + job["dataY"]:
+                columns[field_name] = self.samples.columnArray(field_name)
+
+        # Generate the graphs with matplotlib, in parallel when there are several.
+        # Imported here so that matplotlib only loads when graphs are made.
+        from GraphRenderer import renderGraphs
+        start_time = time.perf_counter()
+        results = renderGraphs(jobs, columns, self.args.graph_workers, self.args.verbose)
+        for title, img_file_path, render_time in results:
+            print("Rendered graph '{}' to {} in {:.3f} seconds".format(title, img_file_path, render_time))
+            if self.stats is not None:
+                self.stats.recordStage("graph", render_time)
+        if results:
+            print("Rendered {} graphs in {:.3f} seconds".format(len(results), time.perf_counter() - start_time))
+            # Add the graph timings to the stats written by collectData
+            self.writeStats()
+
+def parseArgs(argv=None):
+    args = parser.parse_args(argv)
+    # Binary captures should not be mistaken for CSV files
+    if args.format == BINARY_FORMAT and args.output_file.endswith('.csv'):
+        args.output_file = args.output_file[0:-4] + '.bin'
+    elif args.format == SPARSE_FORMAT and args.output_file.endswith('.csv'):
+        args.output_file = args.output_file[0:-4] + '.sparse'
+    return args
+
+def main(argv=None):
+    args = parseArgs(argv)
+    print(args)
+
+    data_collector = RobotDataCollector(args)
+    data_collector.waitForRobotEnabled()
+    data_collector.collectData()
+    data_collector.generateGraphs()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from networktables import NetworkTables
+from FixedRateScheduler import FixedRateScheduler
+
+parser = argparse.ArgumentParser(description = 'Script to simulate a robot by serving NetworkTables locally. ')
+parser.add_argument('-i', '--input-file', action='append', default=None, help='Input file whose controls and tables entries are published, may be given more than once (default robot_nt_names.json)')
+parser.add_argument('-a', '--listen-address', action='store', default='127.0.0.1', help='Address the NetworkTables server listens on, use an empty string for all interfaces')
+parser.add_argument('-p', '--port', action='store', type=int, default=1735, help='Port the NetworkTables server listens on')
+parser.add_argument('-r', '--rate', action='store', type=float, default=100.0, help='Rate in Hz at which the simulated values are updated, up to a few kHz')
+parser.add_argument('-s', '--duration', action='store', type=float, default=None, help='Number of seconds to run for, runs until Ctrl-C by default')
+parser.add_argument('-w', '--waveform', action='append', default=[],
+        help='Waveform for an entry as NAME=KIND[:AMPLITUDE[:FREQUENCY[:OFFSET]]], e.x: instantAccel=sine:2:0.5. KIND is one of {}'.format(', '.join(["sine", "square", "triangle", "sawtooth", "noise", "constant", "time", "model", "off"])))
+parser.add_argument('--enable-delay', action='store', type=float, default=0.0, help='Seconds before the simulated robot reports that it is enabled')
+parser.add_argument('--max-speed', action='store', type=float, default=120.0, help='Speed of the simulated drive at a drivingSpeed of 1.0, in inches per second')
+parser.add_argument('--max-accel', action='store', type=float, default=200.0, help='Acceleration of the simulated drive, in inches per second squared')
+parser.add_argument('--brake-decel', action='store', type=float, default=150.0, help='Deceleration of the simulated drive once the command stops, in inches per second squared')
+parser.add_argument('-v', '--verbose', action='store_true', help='Print more information about what happens')
+
+# Produces the value of one entry from the time since the simulator started
+class Waveform(object):
+    KINDS = ["sine", "square", "triangle", "sawtooth", "noise", "constant", "time", "model", "off"]
+
+    def __init__(self, kind, amplitude=1.0, frequency=1.0, offset=0.0, phase=0.0):
+        if kind not in self.KINDS:
+            raise Exception("Unknown waveform {}, expected one of {}.".format(kind, self.KINDS))
+        self.kind = kind
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.offset = offset
+        self.phase = phase
+
+    def value(self, t):
+        kind = self.kind
+        cycle = t * self.frequency + self.phase
+        if kind == "sine":
+            return self.offset + self.amplitude * math.sin(2 * math.pi * cycle)
+        if kind == "square":
+            return self.offset + (self.amplitude if (cycle % 1.0) < 0.5 else -self.amplitude)
+        if kind == "triangle":
+            return self.offset + self.amplitude * (4 * abs((cycle % 1.0) - 0.5) - 1)
+        if kind == "sawtooth":
+            return self.offset + self.amplitude * (2 * (cycle % 1.0) - 1)
+        if kind == "noise":
+            return self.offset + self.amplitude * random.uniform(-1, 1)
+        if kind == "time":
+            return self.offset + t
+        return self.offset + self.amplitude
+
+def parseWaveform(text):
+    if '=' not in text:
+        raise Exception("Waveform '{}' must look like NAME=KIND[:AMPLITUDE[:FREQUENCY[:OFFSET]]].".format(text))
+    name, spec = text.split('=', 1)
+    parts = spec.split(':')
+    values = [float(part) for part in parts[1:]]
+    return name.split('/')[-1], Waveform(parts[0], *values)
+
+# Models a drive command like DriveCompensatedDistance. When a client sets
+# the running entry to true the robot accelerates to drivingSpeed and, once it
+# has covered drivingDistance, the command sets running back to false. The
+# robot then brakes to a stop, so actualDistance settles a little past the
+# requested distance, like the real robot does.
+class DriveCommandModel(object):
+    IDLE = "idle"
+    DRIVING = "driving"
+    BRAKING = "braking"
+
+    def __init__(self, running_entry, distance_entry, speed_entry, max_speed, max_accel, brake_decel, verbose=False):
+        self.running_entry = running_entry
+        self.distance_entry = distance_entry
+        self.speed_entry = speed_entry
+        self.max_speed = max_speed
+        self.max_accel = max_accel
+        self.brake_decel = brake_decel
+        self.verbose = verbose
+        self.state = self.IDLE
+        self.start_position = 0.0
+        self.position = 0.0
+        self.velocity = 0.0
+        self.acceleration = 0.0
+        self.target_distance = 0.0
+        self.target_velocity = 0.0
+        self.started = threading.Event()
+        flags = NetworkTables.NotifyFlags.NEW | NetworkTables.NotifyFlags.UPDATE
+        running_entry.addListener(self.runningChanged, flags)
+
+    def runningChanged(self, entry, key, value, is_new):
+        # Called from the NetworkTables thread, the drive starts on the next step
+        if value is True and self.state != self.DRIVING:
+            self.started.set()
+
+    def actualDistance(self):
+        return self.position - self.start_position
+
+    def step(self, dt):
+        if self.started.is_set():
+            self.started.clear()
+            speed = self.speed_entry.getDouble(0)
+            self.target_distance = abs(self.distance_entry.getDouble(0))
+            self.target_velocity = max(-1.0, min(1.0, speed)) * self.max_speed
+            self.start_position = self.position
+            self.state = self.DRIVING
+            if self.verbose:
+                print("Driving {} inches at speed {}".format(self.target_distance, speed))
+        if self.state == self.DRIVING:
+            target_velocity = self.target_velocity
+            if abs(self.actualDistance()) >= self.target_distance or target_velocity == 0:
+                # The command is done, let the robot coast to a stop
+                self.state = self.BRAKING
+                self.running_entry.setBoolean(False)
+                if self.verbose:
+                    print("Command finished at {:.2f} inches".format(self.actualDistance()))
+        else:
+            target_velocity = 0.0
+        limit = self.max_accel if self.state == self.DRIVING else self.brake_decel
+        change = max(-limit * dt, min(limit * dt, target_velocity - self.velocity))
+        self.acceleration = change / dt if dt > 0 else 0.0
+        self.velocity += change
+        self.position += self.velocity * dt
+        if self.state == self.BRAKING and self.velocity == 0.0:
+            self.state = self.IDLE
+            if self.verbose:
+                print("Stopped at {:.2f} inches".format(self.actualDistance()))
+
+class RobotSimulator(object):
+    # Entries whose value comes from the drive model unless a waveform is given
+    MODEL_ENTRIES = ["instantAccel", "xInstantAccel", "instantVelocity", "actualDistance"]
+
+    def __init__(self, parsed_args):
+        self.args = parsed_args
+        self.waveforms = dict(parseWaveform(text) for text in self.args.waveform)
+        self.configs = []
+        for input_file in self.args.input_file or ['robot_nt_names.json']:
+            with open(input_file) as fp:
+                self.configs.append(json.load(fp))
+
+    def start(self):
+        NetworkTables.startServer(listenAddress=self.args.listen_address, port=self.args.port)
+        self.resolveEntries()
+        self.start_time = time.monotonic()
+        self.last_time = self.start_time
+        print("Serving NetworkTables on {}:{}".format(self.args.listen_address or "*", self.args.port))
+
+    def resolveEntries(self):
+        trigger_table = "Shuffleboard/Drive"
+        running_name = "DriveCompensatedDistance/DriveCompensatedDistance/running"
+        enabled_path = ("Robot", "enabled")
+        client_entries = set()
+        entries = {}
+        for config in self.configs:
+            controls = config.get("controls", {})
+            if "robotEnabled" in controls:
+                enabled_path = (controls["robotEnabled"]["table"], controls["robotEnabled"]["entry"])
+            trigger = controls.get("triggerCommand", {})
+            if "table" in trigger and "entry" in trigger:
+                trigger_table = trigger["table"]
+                running_name = trigger["entry"]
+            # Command inputs are written by clients, not by the robot
+            for input_table, inputs in trigger.get("inputs", {}).items():
+                for input_entry in inputs:
+                    client_entries.add((input_table, input_entry["name"]))
+            for table_name, table_entries in config.get("tables", {}).items():
+                for entry in table_entries:
+                    if "name" in entry:
+                        entries[(table_name, entry["name"])] = entry.get("type", "double")
+        client_entries.add((trigger_table, running_name))
+        client_entries.add(enabled_path)
+        # Entries the drive model uses
+        trigger_nt_table = NetworkTables.getTable(trigger_table)
+        distance_entry = trigger_nt_table.getEntry("DriveDistance/drivingDistance")
+        speed_entry = trigger_nt_table.getEntry("DriveDistance/drivingSpeed")
+        distance_entry.setDefaultDouble(36)
+        speed_entry.setDefaultDouble(0.5)
+        running_entry = trigger_nt_table.getEntry(running_name)
+        running_entry.setDefaultBoolean(False)
+        entries[(trigger_table, "Data/actualDistance")] = "double"
+        self.model = DriveCommandModel(running_entry, distance_entry, speed_entry, self.args.max_speed,
+                                       self.args.max_accel, self.args.brake_decel, self.args.verbose)
+        self.enabled_entry = NetworkTables.getTable(enabled_path[0]).getEntry(enabled_path[1])
+        self.enabled = self.args.enable_delay <= 0
+        self.enabled_entry.setBoolean(self.enabled)
+        # Decide how every published entry gets its value
+        self.publishers = []
+        for index, ((table_name, name), entry_type) in enumerate(sorted(entries.items())):
+            if (table_name, name) in client_entries:
+                continue
+            short_name = name.split('/')[-1]
+            waveform = self.waveforms.get(short_name)
+            if waveform is None:
+                if short_name == "currentTime":
+                    waveform = Waveform("time")
+                elif short_name in self.MODEL_ENTRIES:
+                    waveform = Waveform("model")
+                elif entry_type == "boolean":
+                    # Booleans like DataCollection are set by the clients
+                    waveform = Waveform("off")
+                else:
+                    waveform = Waveform("sine", 1.0, 0.5, 0.0, index * 0.1)
+            if waveform.kind == "off":
+                continue
+            nt_entry = NetworkTables.getTable(table_name).getEntry(name)
+            setter = nt_entry.setBoolean if entry_type == "boolean" else nt_entry.setDouble
+            self.publishers.append((short_name, waveform, setter, entry_type == "boolean"))
+            if self.args.verbose:
+                print("Publishing {}/{} as {}".format(table_name, name, waveform.kind))
+
+    def modelValue(self, short_name):
+        if short_name == "instantVelocity":
+            return self.model.velocity
+        if short_name == "actualDistance":
+            return self.model.actualDistance()
+        return self.model.acceleration
+
+    def tick(self):
+        now = time.monotonic()
+        t = now - self.start_time
+        self.model.step(now - self.last_time)
+        self.last_time = now
+        if not self.enabled and t >= self.args.enable_delay:
+            self.enabled = True
+            self.enabled_entry.setBoolean(True)
+        for short_name, waveform, setter, is_boolean in self.publishers:
+            if waveform.kind == "model":
+                value = self.modelValue(short_name)
+            else:
+                value = waveform.value(t)
+            setter(value > 0 if is_boolean else value)
+
+    def run(self):
+        scheduler = FixedRateScheduler(self.args.rate, self.args.duration)
+        try:
+            scheduler.run(self.tick)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            scheduler.printReport()
+            NetworkTables.shutdown()
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+    simulator = RobotSimulator(args)
+    simulator.start()
+    simulator.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import io
+import os
+import csv
+import sys
+import gzip
+import lzma
+import json
+import time
+import argparse
+
+# Rotating capture layout, e.x: for the output file data.csv
+#   data_manifest.json   segment list, rewritten after every block
+#   data_0000.csv.gz     first segment
+#   data_0001.csv.gz     next segment, started once the first one got too
+#                        big or too old
+# Every segment is a CSV file of its own, starting with the labels. Rows are
+# compressed in blocks that are appended to the segment as independent gzip
+# members or xz streams, so a crash only loses the block being built and the
+# segments can still be read with gzip or xz.
+NO_COMPRESSION = "none"
+GZIP_COMPRESSION = "gzip"
+LZMA_COMPRESSION = "lzma"
+COMPRESSIONS = [NO_COMPRESSION, GZIP_COMPRESSION, LZMA_COMPRESSION]
+EXTENSIONS = {NO_COMPRESSION: "", GZIP_COMPRESSION: ".gz", LZMA_COMPRESSION: ".xz"}
+MANIFEST_SUFFIX = "_manifest.json"
+MANIFEST_VERSION = 1
+# A block is compressed once it holds this many bytes of CSV text, or when
+# the writer flushes and the block is older than BLOCK_INTERVAL seconds.
+# Small blocks compress badly, large ones lose more rows in a crash.
+BLOCK_BYTES = 256 * 1024
+BLOCK_INTERVAL = 5.0
+
+def compressBlock(data, compression):
+    if compression == GZIP_COMPRESSION:
+        return gzip.compress(data, compresslevel=6)
+    if compression == LZMA_COMPRESSION:
+        return lzma.compress(data, preset=6)
+    return data
+
+def manifestPath(output_path):
+    return os.path.splitext(output_path)[0] + MANIFEST_SUFFIX
+
+# Writes rows to a series of compressed CSV segments. Used as a sink for
+# BufferedRowWriter, so everything here runs on the writer thread. Memory
+# use is bounded by BLOCK_BYTES whatever the length of the run.
+class RotatingRowSink(object):
+    def __init__(self, output_path, labels=None, compression=GZIP_COMPRESSION, max_bytes=None, max_seconds=None):
+        if compression not in COMPRESSIONS:
+            raise Exception("Unknown compression {}, expected one of {}.".format(compression, ", ".join(COMPRESSIONS)))
+        self.directory = os.path.dirname(output_path)
+        base, extension = os.path.splitext(os.path.basename(output_path))
+        self.base_name = base
+        self.extension = (extension or ".csv") + EXTENSIONS[compression]
+        self.manifest_path = manifestPath(output_path)
+        self.labels = labels
+        self.compression = compression
+        # Rotate once a segment holds max_bytes compressed bytes or is
+        # max_seconds old, None means no limit
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.text = io.StringIO()
+        self.csv_writer = csv.writer(self.text, dialect='unix')
+        self.block_rows = 0
+        self.block_started = None
+        self.segments = []
+        self.segment = None
+        self.segment_opened = None
+        self.file = None
+        self.total_rows = 0
+
+    def openSegment(self):
+        index = len(self.segments)
+        file_name = "{}_{:04d}{}".format(self.base_name, index, self.extension)
+        self.file = open(os.path.join(self.directory, file_name), 'wb')
+        self.segment = {"file": file_name, "rows": 0, "bytes": 0, "firstRow": self.total_rows,
+                        "start": None, "end": None, "complete": False}
+        self.segments.append(self.segment)
+        self.segment_opened = time.monotonic()
+        if self.labels is not None:
+            self.csv_writer.writerow(self.labels)
+        self.writeManifest()
+
+    def writeRows(self, rows):
+        if self.file is None:
+            self.openSegment()
+        now = time.time()
+        if self.segment["start"] is None:
+            self.segment["start"] = now
+        self.segment["end"] = now
+        if self.block_started is None:
+            self.block_started = time.monotonic()
+        self.csv_writer.writerows(rows)
+        self.block_rows += len(rows)
+        if self.text.tell() >= BLOCK_BYTES:
+            self.writeBlock()
+
+    def writeBlock(self):
+        if self.block_rows == 0:
+            return
+        data = compressBlock(self.text.getvalue().encode('utf-8'), self.compression)
+        self.text.seek(0)
+        self.text.truncate()
+        self.file.write(data)
+        self.file.flush()
+        self.segment["rows"] += self.block_rows
+        self.segment["bytes"] += len(data)
+        self.total_rows += self.block_rows
+        self.block_rows = 0
+        self.block_started = None
+        if self.isSegmentFull():
+            self.closeSegment()
+        self.writeManifest()
+
+    def isSegmentFull(self):
+        if self.max_bytes is not None and self.segment["bytes"] >= self.max_bytes:
+            return True
+        return self.max_seconds is not None and time.monotonic() - self.segment_opened >= self.max_seconds
+
+    def closeSegment(self):
+        self.file.close()
+        self.file = None
+        self.segment["complete"] = True
+
+    def writeManifest(self):
+        manifest = {"version": MANIFEST_VERSION,
+                    "compression": self.compression,
+                    "labels": self.labels,
+                    "rows": self.total_rows,
+                    "segments": self.segments}
+        # Readers never see a half written manifest
+        temp_path = self.manifest_path + ".tmp"
+        with open(temp_path, 'w') as fp:
+            json.dump(manifest, fp, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def flush(self):
+        if self.block_started is None:
+            return
+        if self.text.tell() >= BLOCK_BYTES or time.monotonic() - self.block_started >= BLOCK_INTERVAL:
+            self.writeBlock()
+        elif self.isSegmentFull():
+            self.writeBlock()
+
+    def close(self):
+        self.writeBlock()
+        if self.file is not None:
+            self.closeSegment()
+        self.writeManifest()
+
+def readManifest(manifest_path):
+    with open(manifest_path) as fp:
+        manifest = json.load(fp)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise Exception("{} has manifest version {} but only version {} is supported.".format(
+            manifest_path, manifest.get("version"), MANIFEST_VERSION))
+    return manifest
+
+def openSegment(file_path, compression):
+    if compression == GZIP_COMPRESSION:
+        return gzip.open(file_path, 'rt', newline='')
+    if compression == LZMA_COMPRESSION:
+        return lzma.open(file_path, 'rt', newline='')
+    return open(file_path, newline='')
+
+# Yields the rows of every segment in order as lists of strings, without the
+# labels. Segments are decompressed as they are read, never all at once. A
+# segment cut short by a crash is read up to its last whole block.
+def readRows(manifest_path):
+    manifest = readManifest(manifest_path)
+    directory = os.path.dirname(manifest_path)
+    for segment in manifest["segments"]:
+        file_path = os.path.join(directory, segment["file"])
+        with openSegment(file_path, manifest["compression"]) as fp:
+            reader = csv.reader(fp)
+            try:
+                if manifest["labels"] is not None:
+                    next(reader, None)
+                for row in reader:
+                    yield row
+            except EOFError:
+                print("{} ends in a partial block, the rows after the last whole block are lost.".format(file_path))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description = 'List the segments of a rotating capture or join them into one CSV file. ')
+    parser.add_argument('manifest_file', help='Manifest file written by RobotDataCollector, e.x: data_manifest.json')
+    parser.add_argument('-o', '--output-file', action='store', default=None, help='Name of the CSV file to join the segments into, - for standard output')
+    parser.add_argument('-l', '--no-labels', action='store_true', help='Do not insert heading labels in the CSV output file')
+    args = parser.parse_args(argv)
+    manifest = readManifest(args.manifest_file)
+    if args.output_file is None:
+        print("{} rows in {} segments, {} compression".format(manifest["rows"], len(manifest["segments"]), manifest["compression"]))
+        for segment in manifest["segments"]:
+            start = "-" if segment["start"] is None else time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(segment["start"]))
+            end = "-" if segment["end"] is None else time.strftime('%H:%M:%S', time.localtime(segment["end"]))
+            print("{:>24} {:>10} rows {:>12} bytes  {} to {}{}".format(segment["file"], segment["rows"], segment["bytes"],
+                  start, end, "" if segment["complete"] else "  (incomplete)"))
+        return
+    fp = sys.stdout if args.output_file == '-' else open(args.output_file, 'w', newline='')
+    try:
+        csv_writer = csv.writer(fp, dialect='unix')
+        if manifest["labels"] is not None and not args.no_labels:
+            csv_writer.writerow(manifest["labels"])
+        rows = 0
+        for row in readRows(args.manifest_file):
+            csv_writer.writerow(row)
+            rows += 1
+    finally:
+        if fp is not sys.stdout:
+            fp.close()
+    if fp is not sys.stdout:
+        print("Wrote {} rows to {}".format(rows, args.output_file))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+from array import array
+
+# Keeps collected samples in typed, preallocated column buffers instead of
+# lists of Python objects. Each column stores 8 bytes per double and 1 byte
+# per boolean. Buffers double in size whenever they fill up.
+#
+# With max_rows the store never grows past max_rows rows. Once full, every
+# other row is dropped and from then on only every second row is kept, then
+# every fourth and so on. The kept rows stay evenly spread over the whole
+# run, which is all graphs need, however long the run is.
+class ColumnarSampleStore(object):
+    TYPE_CODES = {"double": 'd', "boolean": 'b'}
+    NUMPY_TYPES = {'d': 'float64', 'b': 'bool'}
+
+    def __init__(self, columns, initial_capacity=4096, max_rows=None):
+        # columns is a list of (name, sample type, row index) for every
+        # column that should be kept
+        self.length = 0
+        if max_rows is not None:
+            # An even limit keeps the rows evenly spaced after thinning
+            max_rows = max(2, max_rows - max_rows % 2)
+            initial_capacity = min(initial_capacity, max_rows)
+        self.max_rows = max_rows
+        # Only every stride-th row offered is kept
+        self.stride = 1
+        self.offered = 0
+        self.capacity = initial_capacity
+        self.buffers = {}
+        self.kept_columns = []
+        for name, sample_type, row_index in columns:
+            if sample_type not in self.TYPE_CODES:
+                print("Sample {} has type {} which cannot be stored. Skipping it.".format(name, sample_type))
+                continue
+            typecode = self.TYPE_CODES[sample_type]
+            buffer = self.allocate(typecode, initial_capacity)
+            self.buffers[name] = buffer
+            self.kept_columns.append((row_index, buffer))
+
+    def allocate(self, typecode, count):
+        return array(typecode, bytes(count * array(typecode).itemsize))
+
+    def appendRow(self, row):
+        offered = self.offered
+        self.offered += 1
+        if offered % self.stride:
+            return
+        if self.length == self.capacity:
+            if self.capacity == self.max_rows:
+                self.thin()
+                if offered % self.stride:
+                    return
+            else:
+                self.grow()
+        index = self.length
+        for row_index, buffer in self.kept_columns:
+            buffer[index] = row[row_index]
+        self.length += 1
+
+    def grow(self):
+        # Extend in place so that kept_columns keeps pointing at the buffers
+        added = self.capacity
+        if self.max_rows is not None:
+            added = min(added, self.max_rows - self.capacity)
+        for buffer in self.buffers.values():
+            buffer.extend(self.allocate(buffer.typecode, added))
+        self.capacity += added
+
+    def thin(self):
+        # Drops every other row in place and halves the rows kept from now on
+        half = self.length // 2
+        for buffer in self.buffers.values():
+            buffer[0:half] = buffer[0:self.length:2]
+            buffer.extend(self.allocate(buffer.typecode, self.capacity - len(buffer)))
+        self.length = half
+        self.stride *= 2
+
+    def __contains__(self, name):
+        return name in self.buffers
+
+    def __len__(self):
+        return self.length
+
+    def rowsOffered(self):
+        # Number of rows given to appendRow, kept or not
+        return self.offered
+
+    def columnNames(self):
+        return list(self.buffers.keys())
+
+    def column(self, name):
+        # Copy of the collected values of one column
+        return self.buffers[name][:self.length]
+
+    def columnArray(self, name):
+        # NumPy view of the collected values of one column, without a copy.
+        # The store must not grow while the view is in use.
+        import numpy as np
+        buffer = self.buffers[name]
+        return np.frombuffer(buffer, dtype=self.NUMPY_TYPES[buffer.typecode], count=self.length)
+
+    def memoryUsage(self):
+        return sum(buffer.itemsize * len(buffer) for buffer in self.buffers.values())
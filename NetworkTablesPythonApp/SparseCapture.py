@@ -0,0 +1,210 @@
+import os
+import csv
+import json
+import math
+import struct
+import argparse
+
+# Sparse capture file layout:
+#   8 bytes   magic, b'T1100SPC'
+#   4 bytes   format version, little endian unsigned int
+#   4 bytes   header length, little endian unsigned int
+#   header    UTF-8 JSON holding the input config and the column schema
+#   padding   zero bytes up to the next multiple of 8
+#   records   14 byte little endian records of
+#               4 bytes   row index, unsigned int
+#               2 bytes   column index, unsigned short
+#               8 bytes   value, double, booleans are 1.0 and 0.0
+# A record is only written when the value of a column differs from the row
+# before. Every keyframe_rows rows all columns are written, flagged with
+# KEYFRAME_FLAG, so a reader can start from any keyframe. The last record
+# holds the number of rows in the END_COLUMN column, a capture cut short by
+# a crash ends at its last record instead.
+MAGIC = b'T1100SPC'
+VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+RECORD = struct.Struct('<IHd')
+NUMPY_RECORD = [('row', '<u4'), ('column', '<u2'), ('value', '<f8')]
+KEYFRAME_FLAG = 0x8000
+COLUMN_MASK = 0x7FFF
+END_COLUMN = 0x7FFF
+DEFAULT_KEYFRAME_ROWS = 10000
+# Rows converted to CSV at a time, keeps conversion memory bounded
+EXPORT_CHUNK_ROWS = 65536
+
+def dataOffset(header_length):
+    offset = PREAMBLE.size + header_length
+    return (offset + 7) // 8 * 8
+
+def isSparseCapture(file_path):
+    with open(file_path, 'rb') as fp:
+        return fp.read(len(MAGIC)) == MAGIC
+
+# Writes the values that changed from one row to the next. Used as a sink for
+# BufferedRowWriter, so comparing rows happens on the writer thread. Each
+# batch of rows is compared at once with NumPy.
+class SparseRowSink(object):
+    def __init__(self, file_path, columns, config=None, keyframe_rows=DEFAULT_KEYFRAME_ROWS):
+        # columns is a list of dictionaries with at least "name" and "type"
+        if len(columns) >= END_COLUMN:
+            raise Exception("A sparse capture holds at most {} columns, got {}.".format(END_COLUMN - 1, len(columns)))
+        if keyframe_rows <= 0:
+            raise Exception("Keyframes must be at least one row apart, got {}.".format(keyframe_rows))
+        # Imported here so that only sparse output loads NumPy
+        import numpy as np
+        self.np = np
+        self.record_dtype = np.dtype(NUMPY_RECORD)
+        self.columns = columns
+        self.keyframe_rows = keyframe_rows
+        self.last_row = None
+        self.row_index = 0
+        self.records = 0
+        header = json.dumps({"config": config, "columns": columns, "keyframeRows": keyframe_rows,
+                             "recordSize": RECORD.size}).encode('utf-8')
+        self.file = open(file_path, 'wb')
+        self.file.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        self.file.write(header)
+        self.file.write(bytes(dataOffset(len(header)) - PREAMBLE.size - len(header)))
+
+    def writeRows(self, rows):
+        np = self.np
+        try:
+            values = np.array(rows, dtype=float)
+        except TypeError:
+            # Some values are missing (None), store them as NaN
+            values = np.array([[math.nan if value is None else value for value in row] for row in rows], dtype=float)
+        if self.last_row is None:
+            self.last_row = np.full(values.shape[1], np.nan)
+        previous = np.vstack([self.last_row, values[:-1]])
+        # NaN never equals itself, a missing value that stays missing is not
+        # a change
+        changed = (values != previous) & ~(np.isnan(values) & np.isnan(previous))
+        row_indexes = np.arange(self.row_index, self.row_index + len(values))
+        keyframes = row_indexes % self.keyframe_rows == 0
+        changed[keyframes] = True
+        changed_rows, changed_columns = np.nonzero(changed)
+        records = np.empty(len(changed_rows), dtype=self.record_dtype)
+        records["row"] = row_indexes[changed_rows]
+        records["column"] = np.where(keyframes[changed_rows], changed_columns | KEYFRAME_FLAG, changed_columns)
+        records["value"] = values[changed_rows, changed_columns]
+        self.file.write(records.tobytes())
+        self.last_row = values[-1]
+        self.row_index += len(values)
+        self.records += len(records)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.write(RECORD.pack(self.row_index, END_COLUMN, 0.0))
+        self.file.close()
+
+def readHeader(file_path):
+    with open(file_path, 'rb') as fp:
+        magic, version, header_length = PREAMBLE.unpack(fp.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise Exception("{} is not a sparse capture file.".format(file_path))
+        if version != VERSION:
+            raise Exception("{} has sparse capture format version {} but only version {} is supported.".format(file_path, version, VERSION))
+        header = json.loads(fp.read(header_length).decode('utf-8'))
+    header["dataOffset"] = dataOffset(header_length)
+    return header
+
+def readRecords(file_path):
+    # Returns the header, every change record as a NumPy structured array and
+    # the number of rows the capture held
+    import numpy as np
+    header = readHeader(file_path)
+    record_dtype = np.dtype(NUMPY_RECORD)
+    # Ignore a partial record at the end, e.x: after a crash
+    record_count = (os.path.getsize(file_path) - header["dataOffset"]) // record_dtype.itemsize
+    if record_count > 0:
+        records = np.memmap(file_path, dtype=record_dtype, mode='r', offset=header["dataOffset"], shape=(record_count,))
+    else:
+        records = np.zeros(0, dtype=record_dtype)
+    if record_count > 0 and records["column"][-1] == END_COLUMN:
+        row_count = int(records["row"][-1])
+        records = records[:-1]
+    else:
+        row_count = int(records["row"][-1]) + 1 if record_count > 0 else 0
+    return header, records, row_count
+
+def readSeries(file_path, name):
+    # Returns the row indexes at which the column changed and its values
+    # there, without rebuilding any other column
+    import numpy as np
+    header, records, row_count = readRecords(file_path)
+    names = [column["name"] for column in header["columns"]]
+    if name not in names:
+        raise Exception("{} has no column {}, it holds {}.".format(file_path, name, ", ".join(names)))
+    selected = records[(records["column"] & COLUMN_MASK) == names.index(name)]
+    rows = np.asarray(selected["row"], dtype=np.int64)
+    values = np.asarray(selected["value"])
+    # Keyframes repeat values that did not change
+    keep = np.ones(len(values), dtype=bool)
+    keep[1:] = (values[1:] != values[:-1]) & ~(np.isnan(values[1:]) & np.isnan(values[:-1]))
+    return rows[keep], values[keep]
+
+def readCapture(file_path, names=None):
+    # Returns the header and a dictionary of dense NumPy columns with one value
+    # per row collected, like BinaryCapture.readCapture. Only the named
+    # columns are rebuilt when names is given.
+    import numpy as np
+    header, records, row_count = readRecords(file_path)
+    columns = {}
+    column_ids = records["column"] & COLUMN_MASK
+    all_rows = np.arange(row_count)
+    for index, column in enumerate(header["columns"]):
+        if names is not None and column["name"] not in names:
+            continue
+        selected = records[column_ids == index]
+        # Every row takes the value of the last change at or before it
+        change = np.searchsorted(selected["row"], all_rows, side='right') - 1
+        values = np.append(np.asarray(selected["value"]), np.nan)[change]
+        if column["type"] == "boolean":
+            values = values == 1.0
+        columns[column["name"]] = values
+    return header, columns
+
+def exportCsv(capture_path, csv_path, no_labels=False):
+    header, columns = readCapture(capture_path)
+    names = [column["name"] for column in header["columns"]]
+    row_count = len(columns[names[0]]) if names else 0
+    with open(csv_path, 'w', newline='') as fp:
+        csv_writer = csv.writer(fp, dialect='unix')
+        if not no_labels:
+            csv_writer.writerow(names)
+        for start in range(0, row_count, EXPORT_CHUNK_ROWS):
+            end = min(start + EXPORT_CHUNK_ROWS, row_count)
+            # tolist() gives Python floats and bools, so the text matches
+            # what the collector writes for CSV output
+            chunk = [columns[name][start:end].tolist() for name in names]
+            csv_writer.writerows(zip(*chunk))
+    return row_count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description = 'Describe a sparse robot data capture or convert it to CSV. ')
+    parser.add_argument('capture_file', help='Sparse capture file written by RobotDataCollector')
+    parser.add_argument('-o', '--output-file', action='store', default=None, help='Name of the CSV file to write, prints how much each column changed by default')
+    parser.add_argument('-l', '--no-labels', action='store_true', help='Do not insert heading labels in the CSV output file')
+    args = parser.parse_args(argv)
+    if args.output_file is not None:
+        rows = exportCsv(args.capture_file, args.output_file, args.no_labels)
+        print("Wrote {} rows to {}".format(rows, args.output_file))
+        return
+    import numpy as np
+    header, records, row_count = readRecords(args.capture_file)
+    columns = header["columns"]
+    # A dense binary capture stores one 8 byte double or 1 byte boolean per
+    # column and row
+    dense_size = row_count * sum(1 if column["type"] == "boolean" else 8 for column in columns)
+    sparse_size = os.path.getsize(args.capture_file) - header["dataOffset"]
+    print("{} rows, {} records, keyframe every {} rows".format(row_count, len(records), header["keyframeRows"]))
+    print("{} bytes of records, {} bytes as dense binary records ({:.1f}x smaller)".format(
+        sparse_size, dense_size, dense_size / sparse_size if sparse_size else 0.0))
+    changes = np.bincount(records["column"][(records["column"] & KEYFRAME_FLAG) == 0], minlength=len(columns))
+    for index, column in enumerate(columns):
+        print("  {:<24} {:>10} changes".format(column["name"], changes[index]))
+
+if __name__ == '__main__':
+    main()
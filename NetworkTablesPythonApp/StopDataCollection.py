@@ -1,43 +1,24 @@
-import threading
 from networktables import NetworkTables
 import argparse
-import time
+from NetworkTablesConnection import DEFAULT_ROBOT_IP, addConnectionArguments, connectToNetworkTables, disconnectFromNetworkTables
 
 
-parser = argparse.ArgumentParser(description = 'Script to log data from robot. ')
-args = parser.parse_args()
-print(args)
-
-cond = threading.Condition()
-notified = [False]
-
-def connectionListener(connected, info):
-    print(info, '; Connected=%s' % connected)
-    with cond:
-        notified[0] = True
-        cond.notify()
-
-NetworkTables.initialize(server='10.11.21.2') #10.11.21.2 #127.0.0.1
-NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-
-with cond:
-    print("Waiting")
-    if not notified[0]:
-        cond.wait()
-
-# Insert your processing code here
-print("Connected!")
-table = NetworkTables.getTable('Shuffleboard/Drive')
-
-# This retrieves a boolean at /SmartDashboard/foo
-
-table.putBoolean('DataCollection', False)
-
-time.sleep(1)
+parser = argparse.ArgumentParser(description = 'Script to stop data collection on the robot. ')
+addConnectionArguments(parser, DEFAULT_ROBOT_IP)
 
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
 
+    connectToNetworkTables(NetworkTables, args.robot_ip, args.robot_team, args.connect_timeout)
+    table = NetworkTables.getTable('Shuffleboard/Drive')
 
+    # This retrieves a boolean at /SmartDashboard/foo
 
+    table.putBoolean('DataCollection', False)
 
+    # Make sure the change reaches the robot before exiting
+    disconnectFromNetworkTables(NetworkTables)
 
+if __name__ == '__main__':
+    main()
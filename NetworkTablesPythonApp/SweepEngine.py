@@ -0,0 +1,130 @@
+import math
+import itertools
+from collections import namedtuple
+from networktables import NetworkTables
+
+CARTESIAN_SWEEP = "cartesian"
+ZIP_SWEEP = "zip"
+
+# One command input and every value it takes during the sweep
+SweepInput = namedtuple('SweepInput', ['table_name', 'name', 'short_name', 'type', 'values', 'entry'])
+# One execution of the command, values holds one value per input in input order
+SweepRun = namedtuple('SweepRun', ['index', 'values'])
+
+# Values differing by less than this many increments are the same step
+STEP_TOLERANCE = 1e-9
+
+# Lists the values of a range. The end is always included, even when the
+# range is not a whole number of increments, and floating point drift is
+# rounded away so that 0.1 steps give 0.3 rather than 0.30000000000000004.
+def rangeValues(start, end, increment):
+    if start == end:
+        return [start]
+    if increment == 0 or (end - start) * increment < 0:
+        raise Exception("An increment of {} never gets from {} to {}.".format(increment, start, end))
+    steps = (end - start) / increment
+    whole_steps = int(math.floor(steps + STEP_TOLERANCE))
+    # Round to the precision of the numbers given
+    digits = max(decimalPlaces(start), decimalPlaces(increment))
+    values = [round(start + step * increment, digits) for step in range(whole_steps + 1)]
+    if abs(steps - whole_steps) > STEP_TOLERANCE:
+        values.append(end)
+    return values
+
+def decimalPlaces(value):
+    text = repr(float(value))
+    if 'e' in text or 'E' in text:
+        return 15
+    return len(text.split('.')[1])
+
+# Input entry keywords
+INPUT_NAME = "name"
+INPUT_TYPE = "type"
+INPUT_VALUES = "values"
+INPUT_RANGE_START = "rangeStart"
+INPUT_RANGE_END = "rangeEnd"
+INPUT_INCREMENT = "increment"
+REQUIRED_RANGE_LABELS = [INPUT_RANGE_START, INPUT_RANGE_END, INPUT_INCREMENT]
+
+# Checks one input entry of the input file and lists its values. The
+# returned SweepInput has no NetworkTables entry yet.
+def compileSweepInput(table_name, input_entry):
+    if not INPUT_NAME in input_entry:
+        raise Exception("An input of table {} has no {}.".format(table_name, INPUT_NAME))
+    name = input_entry[INPUT_NAME]
+    input_type = input_entry.get(INPUT_TYPE, "double")
+    if INPUT_VALUES in input_entry:
+        values = list(input_entry[INPUT_VALUES])
+        if not values:
+            raise Exception("The input {} from table {} has an empty list of values.".format(name, table_name))
+    else:
+        for label in REQUIRED_RANGE_LABELS:
+            if not label in input_entry:
+                raise Exception("The input {} from table {} must have either {} or {} but has no {}.".format(
+                    name, table_name, INPUT_VALUES, ", ".join(REQUIRED_RANGE_LABELS), label))
+        if input_type == "boolean":
+            raise Exception("The boolean input {} from table {} needs a list of {}.".format(name, table_name, INPUT_VALUES))
+        values = rangeValues(input_entry[INPUT_RANGE_START], input_entry[INPUT_RANGE_END],
+                             input_entry[INPUT_INCREMENT])
+    return SweepInput(table_name, name, name.split('/')[-1], input_type, values, None)
+
+# Lists the values of every run, one value per input in input order
+def sweepRuns(inputs, mode):
+    if mode not in [CARTESIAN_SWEEP, ZIP_SWEEP]:
+        raise Exception("Unknown sweep {}, expected {} or {}.".format(mode, CARTESIAN_SWEEP, ZIP_SWEEP))
+    value_lists = [sweep_input.values for sweep_input in inputs]
+    if mode == CARTESIAN_SWEEP:
+        return list(itertools.product(*value_lists))
+    lengths = set(len(values) for values in value_lists if len(values) > 1)
+    if len(lengths) > 1:
+        raise Exception("A {} sweep needs the same number of values for every input, got {}.".format(
+            ZIP_SWEEP, ", ".join("{}={}".format(sweep_input.short_name, len(sweep_input.values)) for sweep_input in inputs)))
+    run_count = lengths.pop() if lengths else 1
+    return [tuple(values[index] if len(values) > 1 else values[0] for values in value_lists) for index in range(run_count)]
+
+# Runs a command over a sweep of inputs. The inputs come from the inputs
+# block of the triggerCommand control, e.x:
+#   "inputs": {"Shuffleboard/Drive": [
+#       {"name": "DriveDistance/drivingSpeed", "type": "double",
+#        "rangeStart": 0, "rangeEnd": 1, "increment": 0.1},
+#       {"name": "DriveDistance/drivingDistance", "type": "double", "values": [24, 36]}]}
+# A cartesian sweep runs every combination of values with the first input
+# changing slowest. A zip sweep runs the n-th values of every input together,
+# inputs with a single value are held constant.
+class SweepEngine(object):
+    # inputs is either the inputs block of an input file or a list of
+    # SweepInput, e.x: the inputs of a CompiledConfig
+    def __init__(self, inputs, mode=CARTESIAN_SWEEP, nt=NetworkTables):
+        self.mode = mode
+        self.nt = nt
+        if isinstance(inputs, dict):
+            inputs = [compileSweepInput(table_name, input_entry)
+                      for table_name in inputs for input_entry in inputs[table_name]]
+        if not inputs:
+            raise Exception("The sweep has no inputs.")
+        self.inputs = [sweep_input._replace(entry=self.nt.getTable(sweep_input.table_name).getEntry(sweep_input.name))
+                       for sweep_input in inputs]
+        self.run_values = sweepRuns(self.inputs, mode)
+
+    def __len__(self):
+        return len(self.run_values)
+
+    def runs(self):
+        for index, values in enumerate(self.run_values):
+            yield SweepRun(index, values)
+
+    def inputNames(self):
+        return [sweep_input.short_name for sweep_input in self.inputs]
+
+    def describeRun(self, run):
+        return ", ".join("{}={}".format(sweep_input.short_name, value) for sweep_input, value in zip(self.inputs, run.values))
+
+    def applyRun(self, run):
+        # Only sets the entries, the values go out with the next flush. Flush
+        # after setting the trigger so the robot gets the inputs in the same
+        # update as the command start.
+        for sweep_input, value in zip(self.inputs, run.values):
+            if sweep_input.type == "boolean":
+                sweep_input.entry.setBoolean(bool(value))
+            else:
+                sweep_input.entry.setDouble(value)
@@ -1,66 +1,198 @@
+import json
+import time
+import argparse
 import threading
+import itertools
+from pathlib import Path
+from datetime import datetime
 from networktables import NetworkTables
 
-import itertools
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
+from Downsample import minMaxDecimate
+from FixedRateScheduler import FixedRateScheduler
+from BufferedWriter import BufferedRowWriter, CsvRowSink
+from NetworkTablesConnection import addConnectionArguments, connectToNetworkTables
 
-# initialize graphing variables
-fig, ax = plt.subplots()
-xdata, ydata = [], []
-ln, = plt.plot([], [])
-
-# initialize network table variables
-cond = threading.Condition()
-notified = [False]
-
-# open file
-from pathlib import Path
 home = str(Path.home())
-from datetime import datetime
 date_str = datetime.now().strftime('%Y%m%d%H%M%S')
-file = "{}/Documents/{}_frc_data.csv".format(home,date_str)
-fh = open(file,mode='w')
-
-def connectionListener(connected, info):
-    print(info, '; Connected=%s' % connected)
-    with cond:
-        notified[0] = True
-        cond.notify()
-
-NetworkTables.initialize(server='127.0.0.1')
-NetworkTables.addConnectionListener(connectionListener, immediateNotify=True)
-
-with cond:
-    print("Waiting")
-    if not notified[0]:
-        cond.wait()
-
-# Insert your processing code here
-print("Connected!")
-table = NetworkTables.getTable('SmartDashboard')
-
-# graphing functions
-def init():
-    ax.set_xlim(-1,1)
-    ax.set_ylim(-2048,2048)
-    return ln,
-
-def update(frame):
-    motorInput = table.getNumber('Motor2Input', True)
-    motorOutput = table.getNumber('Motor2FakeOutput', True)
-    xdata.append(motorInput)
-    ydata.append(motorOutput)
-    ln.set_data(xdata, ydata)
-    timestamp = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-    fh.write("{}, {:0.3f}, {:0.3f}\n".format(timestamp, motorInput, motorOutput))
-    return ln,
-
-
-# Start graphing
-ani = FuncAnimation(fig, update, frames=itertools.count(start=0,step=1),
-                    init_func=init, blit=True, interval=10)
-plt.show()
-
-fh.close()
+
+parser = argparse.ArgumentParser(description = 'Script to graph data from the robot in real time. ')
+parser.add_argument('-i', '--input-file', action='store', default='robot_nt_names.json', help='Input file whose graphs section defines what to plot')
+parser.add_argument('-o', '--output-file', action='store', default="{}/Documents/{}_frc_data.csv".format(home, date_str), help='Name of file to use for logging the plotted data')
+parser.add_argument('-r', '--sample-rate', action='store', type=float, default=100.0, help='Rate in Hz at which values are read from the robot')
+parser.add_argument('-w', '--window', action='store', type=float, default=10.0, help='Number of seconds of the most recent data to plot')
+parser.add_argument('-n', '--buffer-size', action='store', type=int, default=20000, help='Maximum number of samples kept for each series')
+parser.add_argument('--interval', action='store', type=int, default=10, help='Milliseconds between frames')
+addConnectionArguments(parser, '127.0.0.1')
+
+# Fixed-size history of one graph. Samples overwrite the oldest ones once
+# the buffer is full, so memory and frame time do not grow with run length.
+class GraphRingBuffer(object):
+    def __init__(self, size, y_count):
+        self.size = size
+        self.times = np.zeros(size)
+        self.x = np.zeros(size)
+        self.y = np.zeros((y_count, size))
+        self.count = 0
+        self.head = 0
+        self.lock = threading.Lock()
+
+    def append(self, timestamp, x_value, y_values):
+        with self.lock:
+            head = self.head
+            self.times[head] = timestamp
+            self.x[head] = x_value
+            self.y[:, head] = y_values
+            self.head = (head + 1) % self.size
+            if self.count < self.size:
+                self.count += 1
+
+    def window(self, start_time):
+        # Returns copies of the samples taken at or after start_time, oldest first
+        with self.lock:
+            if self.count < self.size:
+                order = np.arange(self.count)
+            else:
+                order = np.arange(self.head, self.head + self.size) % self.size
+            first = np.searchsorted(self.times[order], start_time)
+            order = order[first:]
+            return self.x[order], self.y[:, order]
+
+def loadGraphs(input_file):
+    # Returns the graphs of the input file that can be plotted, with the
+    # names of their columns, and the table of every entry
+    with open(input_file) as fp:
+        config = json.load(fp)
+    entry_paths = {}
+    for table_name, entries in config.get("tables", {}).items():
+        for entry in entries:
+            if "name" in entry:
+                entry_paths[entry["name"].split('/')[-1]] = (table_name, entry["name"], entry.get("type", "double"))
+
+    graphs = []
+    for graph in config.get("graphs", []):
+        y_names = graph["dataY"]
+        if isinstance(y_names, str):
+            y_names = [y_names]
+        names = [graph["dataX"].split('/')[-1]] + [y.split('/')[-1] for y in y_names]
+        missing = [name for name in names if name not in entry_paths]
+        if missing:
+            print("Graph '{}' uses {} which are not in the tables section. Skipping graph.".format(graph.get("title", "no title"), missing))
+            continue
+        graphs.append((graph, names))
+    return graphs, entry_paths
+
+def rescaleLimits(low, high, data_low, data_high, headroom):
+    # Only move the axis when the data leaves it or uses less than half of
+    # it, so that the full redraw this needs happens rarely
+    data_span = data_high - data_low
+    if data_span <= 0:
+        # Constant data, center it in a range that depends on its size
+        data_span = max(abs(data_high), 1.0)
+    new_low = data_low - data_span * 0.1
+    new_high = data_high + data_span * headroom
+    inside = data_low >= low and data_high <= high
+    if inside and (new_high - new_low) >= (high - low) / 2:
+        return None
+    return new_low, new_high
+
+def main(argv=None):
+    args = parser.parse_args(argv)
+    print(args)
+
+    # Load the graphs to plot and find the table of every value they use
+    graphs, entry_paths = loadGraphs(args.input_file)
+    if not graphs:
+        print("No graphs to plot.")
+        return
+
+    connectToNetworkTables(NetworkTables, args.robot_ip, args.robot_team, args.connect_timeout)
+
+    # Resolve every entry that is plotted once
+    column_names = []
+    for graph, names in graphs:
+        for name in names:
+            if name not in column_names:
+                column_names.append(name)
+    getters = []
+    for name in column_names:
+        table_name, entry_name, entry_type = entry_paths[name]
+        entry = NetworkTables.getTable(table_name).getEntry(entry_name)
+        getters.append(entry.getBoolean if entry_type == "boolean" else entry.getDouble)
+    graph_columns = [[column_names.index(name) for name in names] for graph, names in graphs]
+    buffers = [GraphRingBuffer(args.buffer_size, len(names) - 1) for graph, names in graphs]
+
+    # Sampling and logging run on their own threads, away from the render path
+    row_writer = BufferedRowWriter(CsvRowSink(args.output_file, ["timestamp"] + column_names))
+    sampling = [True]
+
+    def sample():
+        timestamp = time.monotonic()
+        row = [float(getter(0)) for getter in getters]
+        for buffer, columns in zip(buffers, graph_columns):
+            buffer.append(timestamp, row[columns[0]], [row[column] for column in columns[1:]])
+        row_writer.writeRow([datetime.now().strftime('%d/%m/%Y %H:%M:%S.%f')] + row)
+
+    scheduler = FixedRateScheduler(args.sample_rate)
+    sampling_thread = threading.Thread(target=scheduler.run, args=(sample, lambda: sampling[0]), daemon=True)
+    sampling_thread.start()
+
+    # initialize graphing variables
+    fig, axes = plt.subplots(len(graphs), 1, squeeze=False)
+    axes = axes[:, 0]
+    lines = []
+    for ax, (graph, names) in zip(axes, graphs):
+        ax.set_title(graph.get("title", ""))
+        ax.set_xlabel(graph.get("xlabel", names[0]))
+        ax.set_ylabel(graph.get("ylabel", ""))
+        ax.set_xlim(0, 1)
+        ax.set_ylim(-1, 1)
+        graph_lines = [ax.plot([], [], label=name, animated=True)[0] for name in names[1:]]
+        ax.legend(loc='upper left')
+        lines.append(graph_lines)
+    all_lines = [line for graph_lines in lines for line in graph_lines]
+
+    # graphing functions
+    def init():
+        return all_lines
+
+    def update(frame):
+        start_time = time.monotonic() - args.window
+        rescaled = False
+        for ax, buffer, graph_lines in zip(axes, buffers, lines):
+            x, ys = buffer.window(start_time)
+            if len(x) == 0:
+                continue
+            # Never draw more points than there are pixels
+            buckets = max(int(ax.bbox.width), 1)
+            for line, y in zip(graph_lines, ys):
+                line.set_data(*minMaxDecimate(x, y, buckets))
+            xlim = rescaleLimits(*ax.get_xlim(), x.min(), x.max(), 0.25)
+            ylim = rescaleLimits(*ax.get_ylim(), ys.min(), ys.max(), 0.1)
+            if xlim is not None:
+                ax.set_xlim(*xlim)
+                rescaled = True
+            if ylim is not None:
+                ax.set_ylim(*ylim)
+                rescaled = True
+        if rescaled:
+            # Redraw the static parts so the blit background has the new ticks
+            fig.canvas.draw()
+        return all_lines
+
+    # Start graphing
+    ani = FuncAnimation(fig, update, frames=itertools.count(start=0,step=1),
+                        init_func=init, blit=True, interval=args.interval,
+                        cache_frame_data=False)
+    try:
+        plt.show()
+    finally:
+        sampling[0] = False
+        sampling_thread.join()
+        row_writer.close()
+        NetworkTables.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+import csv
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+from DerivedChannels import DerivedChannel, parseExpression
+from CollectorConfig import TABLE_ELEMENT_TYPE_BOOLEAN
+
+# A triggered capture works like the trigger of an oscilloscope. The last
+# seconds of rows are kept in memory and only the rows around the moments a
+# trigger fires are written to disk, one event file per event, so a capture
+# can run all day. Triggers are conditions on the columns of a row, e.x: in
+# the triggers section of an input file
+#   "triggers": [
+#     {"name": "commandStarted", "condition": "running"},
+#     {"name": "bump", "condition": "abs(instantAccel) > 200"}
+#   ]
+# A condition is an expression like those of derived columns and may use
+# derived columns. A trigger fires when its condition turns true, so
+# "running" fires on the rising edge of the running entry and
+# "abs(instantAccel) > 200" when the acceleration crosses 200. Conditions
+# are armed by the first row collected: a condition that already holds then
+# does not fire until it turns false and true again. A triggered capture does
+# not wait for the robot to be enabled, so "enabled" fires when the robot is
+# enabled. An event file holds the rows of the pre-trigger window, the row
+# that fired and the rows of the post-trigger window. A trigger that fires while an event is written
+# extends its post-trigger window instead of starting another event.
+
+# Markers sent along with the rows to the writer thread, which opens and
+# closes the event files so that the collection thread never waits on them
+EventStart = namedtuple('EventStart', ['index', 'triggers'])
+EventEnd = namedtuple('EventEnd', ['index', 'triggers', 'trigger_time', 'pre_trigger_rows', 'rows'])
+
+def parseTriggerArgument(text):
+    # --trigger takes NAME=CONDITION, or only a condition which then names
+    # the trigger, e.x: "bump=abs(instantAccel) > 200" or "running"
+    name, separator, condition = text.partition('=')
+    if not separator or not name.strip().isidentifier() or condition.startswith('='):
+        # e.x: instantAccel>=200 or running==1
+        name, condition = text, text
+    name = name.strip()
+    tree, columns = parseExpression(name, condition, "Trigger")
+    return DerivedChannel(name, condition, TABLE_ELEMENT_TYPE_BOOLEAN, columns)
+
+# Sink of the row writer of a triggered capture. Rows go to the file of the
+# current event, which EventStart and EventEnd markers in the rows open and
+# close. openSink(event_index) returns the name and the sink of an event
+# file, e.x: a CsvRowSink.
+class EventRowSink(object):
+    EVENT_LOG_FIELDS = ["event", "file", "triggers", "triggerTime", "preTriggerRows", "rows"]
+
+    def __init__(self, openSink, event_log_path=None):
+        self.openSink = openSink
+        self.sink = None
+        self.event_file = None
+        self.written_rows = 0
+        # Rows that arrived without an open event, after a dropped EventStart
+        self.lost_rows = 0
+        self.event_log = None
+        if event_log_path is not None:
+            self.event_log = open(event_log_path, 'w', newline='')
+            self.event_log_writer = csv.writer(self.event_log, dialect='unix')
+            self.event_log_writer.writerow(self.EVENT_LOG_FIELDS)
+            print("Listing events in {}".format(event_log_path))
+
+    def writeRows(self, rows):
+        # Rows between markers are written in one go
+        start = 0
+        for index, row in enumerate(rows):
+            if isinstance(row, (EventStart, EventEnd)):
+                self.writeEventRows(rows[start:index])
+                start = index + 1
+                if isinstance(row, EventStart):
+                    self.startEvent(row)
+                else:
+                    self.endEvent(row)
+        self.writeEventRows(rows[start:])
+
+    def writeEventRows(self, rows):
+        if not rows:
+            return
+        if self.sink is None:
+            self.lost_rows += len(rows)
+            return
+        self.sink.writeRows(rows)
+        self.written_rows += len(rows)
+
+    def startEvent(self, marker):
+        self.closeSink()
+        self.event_file, self.sink = self.openSink(marker.index)
+        print("Event {}: {} fired, writing {}".format(marker.index, ", ".join(marker.triggers), self.event_file))
+
+    def endEvent(self, marker):
+        event_file = self.event_file
+        self.closeSink()
+        if self.event_log is not None:
+            self.event_log_writer.writerow([marker.index, event_file, " ".join(marker.triggers),
+                                            marker.trigger_time.isoformat(), marker.pre_trigger_rows, marker.rows])
+
+    def closeSink(self):
+        if self.sink is not None:
+            sink = self.sink
+            self.sink = None
+            sink.close()
+
+    def flush(self):
+        if self.sink is not None:
+            self.sink.flush()
+        if self.event_log is not None:
+            self.event_log.flush()
+
+    def close(self):
+        self.closeSink()
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+
+# Takes the place of the row writer of a capture. Every row goes through the
+# trigger conditions and then into the pre-trigger buffer or, through
+# row_writer, the file of the current event. row_writer is a
+# BufferedRowWriter or PooledRowWriter over an EventRowSink, so the
+# collection thread only queues rows and markers. The buffer holds at most
+# max_buffered_rows rows, so memory stays the same however long the capture
+# runs.
+class TriggeredRowWriter(object):
+    def __init__(self, conditions, row_writer, pre_trigger, post_trigger, max_buffered_rows, max_events=None):
+        # conditions is a DerivedColumns of the trigger conditions, built
+        # with chained False
+        self.conditions = conditions
+        self.trigger_names = [channel.name for channel in conditions.channels]
+        self.row_writer = row_writer
+        self.pre_trigger = pre_trigger
+        self.post_trigger = post_trigger
+        self.max_events = max_events
+        # (time, row) of the rows since the last event, oldest first
+        self.buffer = deque(maxlen=max_buffered_rows)
+        self.previous_values = None
+        self.event_open = False
+        self.event_end = None
+        self.event_triggers = []
+        self.event_time = None
+        self.event_pre_rows = 0
+        self.event_rows = 0
+        self.events = 0
+        self.rows = 0
+        # Events whose pre-trigger window held more rows than the buffer
+        self.short_windows = 0
+
+    @property
+    def finished(self):
+        # True once max_events events have been written
+        return self.max_events is not None and self.events >= self.max_events and not self.event_open
+
+    @property
+    def dropped_rows(self):
+        return self.row_writer.dropped_rows
+
+    def firedTriggers(self, row):
+        # Names of the triggers whose condition turned true with this row
+        values = self.conditions.evaluate(row)
+        previous_values = self.previous_values
+        self.previous_values = values
+        if previous_values is None:
+            return []
+        return [name for name, value, previous in zip(self.trigger_names, values, previous_values) if value and not previous]
+
+    def writeRow(self, row):
+        now = time.monotonic()
+        self.rows += 1
+        fired = self.firedTriggers(row)
+        if self.event_open:
+            self.row_writer.writeRow(row)
+            self.event_rows += 1
+            if fired:
+                self.event_end = now + self.post_trigger
+                self.event_triggers.extend(name for name in fired if name not in self.event_triggers)
+            elif now >= self.event_end:
+                self.endEvent()
+            return True
+        if fired and not self.finished:
+            self.startEvent(now, fired, row)
+            return True
+        buffer = self.buffer
+        buffer.append((now, row))
+        oldest = now - self.pre_trigger
+        while buffer[0][0] < oldest:
+            buffer.popleft()
+        return True
+
+    def startEvent(self, now, fired, row):
+        self.events += 1
+        self.event_open = True
+        row_writer = self.row_writer
+        row_writer.writeRow(EventStart(self.events, tuple(fired)))
+        buffer = self.buffer
+        if len(buffer) == buffer.maxlen and buffer[0][0] > now - self.pre_trigger:
+            self.short_windows += 1
+        for buffered_time, buffered_row in buffer:
+            row_writer.writeRow(buffered_row)
+        self.event_pre_rows = len(buffer)
+        # Rows written to an event are not part of the next one
+        buffer.clear()
+        row_writer.writeRow(row)
+        self.event_rows = self.event_pre_rows + 1
+        self.event_end = now + self.post_trigger
+        self.event_triggers = list(fired)
+        self.event_time = datetime.now()
+
+    def endEvent(self):
+        self.event_open = False
+        self.row_writer.writeRow(EventEnd(self.events, tuple(self.event_triggers), self.event_time,
+                                          self.event_pre_rows, self.event_rows))
+
+    def close(self):
+        # Writes out an event still in its post-trigger window
+        if self.event_open:
+            self.endEvent()
+        self.row_writer.close()
+
+    def printStats(self):
+        sink = self.row_writer.sink
+        print("Saw {} rows, wrote {} rows in {} events".format(self.rows, sink.written_rows, self.events))
+        if self.dropped_rows > 0 or sink.lost_rows > 0:
+            print("Dropped {} rows that the event files could not keep up with".format(self.dropped_rows + sink.lost_rows))
+        if self.short_windows > 0:
+            print("{} events have a pre-trigger window shorter than {} seconds, raise --trigger-buffer-rows to keep more rows".format(
+                self.short_windows, self.pre_trigger))
@@ -0,0 +1,64 @@
+import os
+import sys
+import importlib
+
+# Single entry point for the tools in this directory, e.x:
+#   python NetworkTablesPythonApp stop -a 127.0.0.1
+#   python NetworkTablesPythonApp collect -m TIME_MODE -s 5
+# Each command lives in its own module with a main(argv) function. Modules are
+# only imported when their command runs, so quick commands like stop and
+# state never load matplotlib or NumPy.
+COMMANDS = [
+    ("collect", "RobotDataCollector", "Log the entries of an input file from a robot and graph them"),
+    ("multi", "MultiRobotCollector", "Log from several robots at once"),
+    ("stop", "StopDataCollection", "Turn off DataCollection on the robot"),
+    ("state", "GetRobotState", "Print whether the robot is enabled"),
+    ("accel", "AccelerometerDataCollector", "Log instantAccel against currentTime"),
+    ("accel-xy", "AccelerometerDataCollectorXY", "Log xInstantAccel and yInstantAccel against currentTime"),
+    ("stopping-distance", "CompensatedStoppingDistanceDataCollector", "Measure the stopping distance over a sweep of speeds"),
+    ("daemon", "CollectorDaemon", "Stay connected to the robot and run jobs sent with the job command"),
+    ("job", "CollectorClient", "Send a state, get, put, capture, stop or shutdown job to the daemon"),
+    ("realtime", "TestRobotRealtimeGraph", "Graph the entries of an input file live while logging them"),
+    ("plot", "PlotCapture", "Graph a CSV or binary capture"),
+    ("export", "BinaryCapture", "Convert a binary capture to CSV"),
+    ("sparse", "SparseCapture", "Describe a sparse capture or convert it to CSV"),
+    ("segments", "RotatingCapture", "List the segments of a segmented capture or join them into one CSV"),
+    ("analyze", "CaptureAnalysis", "Integrate acceleration and fit stopping distance over many captures"),
+    ("benchmark", "CollectorBenchmark", "Measure collector throughput and latency against a fake NetworkTables"),
+    ("simulate", "RobotSimulator", "Serve NetworkTables like a robot, for testing without one"),
+    ("replay", "CaptureReplay", "Serve a recorded capture on a local NetworkTables server"),
+]
+
+def printUsage(program):
+    print("usage: {} COMMAND [options]".format(program))
+    print("")
+    print("commands:")
+    for name, module_name, description in COMMANDS:
+        print("  {:<20}{}".format(name, description))
+    print("")
+    print("Run {} COMMAND -h for the options of a command.".format(program))
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    app_directory = os.path.dirname(os.path.abspath(__file__))
+    program = os.path.basename(app_directory)
+    # Also allows python -m NetworkTablesPythonApp from the parent directory
+    if app_directory not in sys.path:
+        sys.path.insert(0, app_directory)
+    if not argv or argv[0] in ['-h', '--help']:
+        printUsage(program)
+        return
+    commands = {name: module_name for name, module_name, description in COMMANDS}
+    if argv[0] not in commands:
+        print("Unknown command {}.".format(argv[0]))
+        printUsage(program)
+        sys.exit(2)
+    # argparse names the program after sys.argv[0] when the module's parser
+    # is created, so set it before the import
+    sys.argv[0] = "{} {}".format(program, argv[0])
+    module = importlib.import_module(commands[argv[0]])
+    module.main(argv[1:])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tools are scripts that import each other by module name, so the tests
+# import them the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,101 @@
+import time
+import threading
+import pytest
+
+from BufferedWriter import BufferedRowWriter
+
+# Keeps the rows in memory. While blocked, writeRows waits for release so
+# that rows pile up in the queue of the writer.
+class MemorySink(object):
+    def __init__(self, blocked=False):
+        self.rows = []
+        # Number of rows written at every flush
+        self.flushes = []
+        self.closed = False
+        self.writing = threading.Event()
+        self.released = threading.Event()
+        if not blocked:
+            self.released.set()
+
+    def writeRows(self, rows):
+        self.writing.set()
+        self.released.wait()
+        self.rows.extend(rows)
+
+    def flush(self):
+        self.flushes.append(len(self.rows))
+
+    def close(self):
+        self.closed = True
+
+class FailingSink(MemorySink):
+    def writeRows(self, rows):
+        raise IOError("disk full")
+
+def waitFor(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+def test_rows_are_dropped_and_counted_when_the_queue_is_full():
+    sink = MemorySink(blocked=True)
+    writer = BufferedRowWriter(sink, queue_size=2)
+    assert writer.writeRow([0])
+    # The writer thread holds the first row while the sink is blocked
+    assert sink.writing.wait(2.0)
+    assert writer.writeRow([1])
+    assert writer.writeRow([2])
+    assert not writer.writeRow([3])
+    assert not writer.writeRow([4])
+    assert writer.dropped_rows == 2
+    assert writer.high_water_mark == 2
+    sink.released.set()
+    writer.close()
+    assert sink.rows == [[0], [1], [2]]
+    assert writer.written_rows == 3
+
+def test_flushes_every_flush_rows_rows():
+    sink = MemorySink()
+    writer = BufferedRowWriter(sink, batch_size=1, flush_rows=3, flush_interval=10.0)
+    for index in range(7):
+        writer.writeRow([index])
+    writer.close()
+    # The last row is flushed by close
+    assert sink.flushes == [3, 6, 7]
+
+def test_flushes_after_flush_interval():
+    sink = MemorySink()
+    writer = BufferedRowWriter(sink, flush_rows=1000, flush_interval=0.05)
+    writer.writeRow([0])
+    assert waitFor(lambda: sink.flushes)
+    assert sink.flushes == [1]
+    assert not sink.closed
+    writer.close()
+
+def test_close_drains_the_queue():
+    sink = MemorySink(blocked=True)
+    writer = BufferedRowWriter(sink, queue_size=1000, flush_interval=10.0)
+    rows = [[index, index * 0.5] for index in range(800)]
+    for row in rows:
+        writer.writeRow(row)
+    assert sink.writing.wait(2.0)
+    sink.released.set()
+    writer.close()
+    assert sink.rows == rows
+    assert sink.flushes[-1] == len(rows)
+    assert sink.closed
+    assert writer.dropped_rows == 0
+    # Closing twice does nothing
+    writer.close()
+
+def test_close_reports_a_failed_sink():
+    sink = FailingSink()
+    writer = BufferedRowWriter(sink)
+    writer.writeRow([0])
+    writer.writeRow([1])
+    with pytest.raises(Exception, match="disk full"):
+        writer.close()
+    assert sink.closed
@@ -0,0 +1,190 @@
+import csv
+import math
+import os
+import pytest
+
+np = pytest.importorskip("numpy")
+import BinaryCapture
+import SparseCapture
+import RotatingCapture
+
+COLUMNS = [{"name": "enabled", "type": "boolean", "table": "Robot", "entry": "enabled"},
+           {"name": "instantAccel", "type": "double", "table": "Shuffleboard/Drive", "entry": "Accelerometer/instantAccel"},
+           {"name": "currentTime", "type": "double", "table": "Shuffleboard/Drive", "entry": "Accelerometer/currentTime"}]
+CONFIG = {"tables": {"Shuffleboard/Drive": [{"name": "Accelerometer/instantAccel", "type": "double"}]}}
+
+def captureRows(count):
+    # Mostly repeated values, like a polled capture, with a missing value
+    rows = []
+    for index in range(count):
+        rows.append([index >= 3, float(index // 4), index * 0.02])
+    if count > 5:
+        rows[5][1] = None
+    return rows
+
+def expectedColumns(rows):
+    return {"enabled": [row[0] for row in rows],
+            "instantAccel": [math.nan if row[1] is None else row[1] for row in rows],
+            "currentTime": [row[2] for row in rows]}
+
+def assertColumns(columns, rows):
+    for name, expected in expectedColumns(rows).items():
+        np.testing.assert_array_equal(np.asarray(columns[name]), np.array(expected))
+
+def writeCapture(sink, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        sink.writeRows(rows[start:start + batch_size])
+    sink.close()
+
+def test_binary_round_trip(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    rows = captureRows(20)
+    writeCapture(BinaryCapture.BinaryRowSink(path, COLUMNS, CONFIG), rows, 7)
+    header, columns = BinaryCapture.readCapture(path)
+    assert header["config"] == CONFIG
+    assert [column["name"] for column in header["columns"]] == [column["name"] for column in COLUMNS]
+    assertColumns(columns, rows)
+    assert columns["enabled"].dtype == bool
+
+def test_binary_reader_ignores_a_partial_record(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    rows = captureRows(10)
+    writeCapture(BinaryCapture.BinaryRowSink(path, COLUMNS), rows, 10)
+    with open(path, 'r+b') as fp:
+        fp.truncate(os.path.getsize(path) - 3)
+    header, columns = BinaryCapture.readCapture(path)
+    assertColumns(columns, rows[:9])
+
+@pytest.mark.parametrize("keyframe_rows, batch_size", [(10000, 64), (4, 3), (1, 5)])
+def test_sparse_round_trip_rebuilds_every_row(tmp_path, keyframe_rows, batch_size):
+    path = str(tmp_path / "capture.sparse")
+    rows = captureRows(23)
+    writeCapture(SparseCapture.SparseRowSink(path, COLUMNS, CONFIG, keyframe_rows), rows, batch_size)
+    header, columns = SparseCapture.readCapture(path)
+    assert header["config"] == CONFIG
+    assert header["keyframeRows"] == keyframe_rows
+    assertColumns(columns, rows)
+    assert columns["enabled"].dtype == bool
+
+def test_sparse_only_records_changes(tmp_path):
+    path = str(tmp_path / "capture.sparse")
+    rows = [[True, 1.0, 0.0]] * 50 + [[True, 2.0, 0.0]] * 50
+    writeCapture(SparseCapture.SparseRowSink(path, COLUMNS), rows, 30)
+    header, records, row_count = SparseCapture.readRecords(path)
+    assert row_count == 100
+    # Every column once in the first row, then the one change
+    assert len(records) == len(COLUMNS) + 1
+    change_rows, values = SparseCapture.readSeries(path, "instantAccel")
+    assert list(change_rows) == [0, 50]
+    assert list(values) == [1.0, 2.0]
+
+def test_sparse_reads_selected_columns(tmp_path):
+    path = str(tmp_path / "capture.sparse")
+    rows = captureRows(12)
+    writeCapture(SparseCapture.SparseRowSink(path, COLUMNS), rows, 12)
+    header, columns = SparseCapture.readCapture(path, names=["currentTime"])
+    assert list(columns) == ["currentTime"]
+    np.testing.assert_array_equal(columns["currentTime"], np.array([row[2] for row in rows]))
+
+def test_sparse_capture_without_end_record(tmp_path):
+    # A crash leaves the capture without its end record, it then ends at
+    # its last change
+    path = str(tmp_path / "capture.sparse")
+    rows = captureRows(12)
+    writeCapture(SparseCapture.SparseRowSink(path, COLUMNS), rows, 12)
+    with open(path, 'r+b') as fp:
+        fp.truncate(os.path.getsize(path) - SparseCapture.RECORD.size)
+    header, columns = SparseCapture.readCapture(path)
+    assertColumns(columns, rows)
+
+def test_sparse_reader_ignores_a_partial_record(tmp_path):
+    path = str(tmp_path / "capture.sparse")
+    rows = captureRows(12)
+    writeCapture(SparseCapture.SparseRowSink(path, COLUMNS), rows, 12)
+    # Only currentTime changes in the last row, cutting its record short
+    # leaves the rows before it
+    with open(path, 'r+b') as fp:
+        fp.truncate(os.path.getsize(path) - SparseCapture.RECORD.size - 2)
+    header, columns = SparseCapture.readCapture(path)
+    assertColumns(columns, rows[:11])
+
+def test_sparse_csv_export_matches_the_rows(tmp_path):
+    path = str(tmp_path / "capture.sparse")
+    csv_path = str(tmp_path / "capture.csv")
+    rows = captureRows(9)
+    writeCapture(SparseCapture.SparseRowSink(path, COLUMNS), rows, 4)
+    assert SparseCapture.exportCsv(path, csv_path) == len(rows)
+    with open(csv_path, newline='') as fp:
+        exported = list(csv.reader(fp))
+    assert exported[0] == [column["name"] for column in COLUMNS]
+    assert exported[1] == ["False", "0.0", "0.0"]
+    assert exported[6] == ["True", "nan", "0.1"]
+
+def test_sparse_rejects_other_files(tmp_path):
+    path = str(tmp_path / "capture.bin")
+    writeCapture(BinaryCapture.BinaryRowSink(path, COLUMNS), captureRows(3), 3)
+    assert not SparseCapture.isSparseCapture(path)
+    with pytest.raises(Exception):
+        SparseCapture.readHeader(path)
+
+def csvValues(rows):
+    # Rows as read back from CSV text
+    return [["" if value is None else str(value) for value in row] for row in rows]
+
+def writeRotatingCapture(tmp_path, monkeypatch, rows, compression, max_bytes):
+    # Small blocks so that a few hundred rows make several of them
+    monkeypatch.setattr(RotatingCapture, "BLOCK_BYTES", 300)
+    path = str(tmp_path / "capture.csv")
+    sink = RotatingCapture.RotatingRowSink(path, [column["name"] for column in COLUMNS], compression, max_bytes)
+    writeCapture(sink, rows, 7)
+    return RotatingCapture.manifestPath(path)
+
+@pytest.mark.parametrize("compression", RotatingCapture.COMPRESSIONS)
+def test_rotating_round_trip(tmp_path, monkeypatch, compression):
+    rows = captureRows(200)
+    manifest_path = writeRotatingCapture(tmp_path, monkeypatch, rows, compression, 1)
+    manifest = RotatingCapture.readManifest(manifest_path)
+    assert manifest["rows"] == 200
+    assert manifest["labels"] == [column["name"] for column in COLUMNS]
+    segments = manifest["segments"]
+    # Every block fills a segment of 1 byte
+    assert len(segments) > 3
+    assert all(segment["complete"] for segment in segments)
+    assert sum(segment["rows"] for segment in segments) == 200
+    first_rows = [segment["firstRow"] for segment in segments]
+    assert first_rows == [sum(segment["rows"] for segment in segments[:index]) for index in range(len(segments))]
+    for index, segment in enumerate(segments):
+        assert segment["file"] == "capture_{:04d}.csv{}".format(index, RotatingCapture.EXTENSIONS[compression])
+        assert os.path.getsize(str(tmp_path / segment["file"])) == segment["bytes"]
+    assert list(RotatingCapture.readRows(manifest_path)) == csvValues(rows)
+
+def test_rotating_capture_keeps_one_segment_without_limits(tmp_path, monkeypatch):
+    rows = captureRows(200)
+    manifest_path = writeRotatingCapture(tmp_path, monkeypatch, rows, RotatingCapture.GZIP_COMPRESSION, None)
+    manifest = RotatingCapture.readManifest(manifest_path)
+    assert len(manifest["segments"]) == 1
+    assert list(RotatingCapture.readRows(manifest_path)) == csvValues(rows)
+
+@pytest.mark.parametrize("compression", [RotatingCapture.GZIP_COMPRESSION, RotatingCapture.LZMA_COMPRESSION])
+def test_rotating_reader_stops_at_a_partial_block(tmp_path, monkeypatch, capsys, compression):
+    rows = captureRows(200)
+    manifest_path = writeRotatingCapture(tmp_path, monkeypatch, rows, compression, None)
+    manifest = RotatingCapture.readManifest(manifest_path)
+    # Cut in the middle of a block, like a crash while writing it
+    segment_path = str(tmp_path / manifest["segments"][0]["file"])
+    with open(segment_path, 'r+b') as fp:
+        fp.truncate(int(os.path.getsize(segment_path) * 0.6))
+    read_rows = list(RotatingCapture.readRows(manifest_path))
+    assert 0 < len(read_rows) < len(rows)
+    assert read_rows == csvValues(rows[:len(read_rows)])
+    assert "ends in a partial block" in capsys.readouterr().out
+
+def test_rotating_capture_joins_into_one_csv_file(tmp_path, monkeypatch):
+    rows = captureRows(50)
+    manifest_path = writeRotatingCapture(tmp_path, monkeypatch, rows, RotatingCapture.LZMA_COMPRESSION, 1)
+    output_path = str(tmp_path / "joined.csv")
+    RotatingCapture.main([manifest_path, "-o", output_path])
+    with open(output_path, newline='') as fp:
+        joined = list(csv.reader(fp))
+    assert joined[0] == [column["name"] for column in COLUMNS]
+    assert joined[1:] == csvValues(rows)
@@ -0,0 +1,113 @@
+import os
+import json
+import pytest
+
+pytest.importorskip("networktables")
+import CollectorConfig
+from CollectorConfig import ControlEntry, loadCollectorConfig
+
+INPUT_FILE = os.path.join(os.path.dirname(os.path.abspath(CollectorConfig.__file__)), "robot_nt_names.json")
+
+def inputSource():
+    with open(INPUT_FILE) as fp:
+        return json.load(fp)
+
+def writeInput(path, source):
+    with open(str(path), 'w') as fp:
+        json.dump(source, fp)
+    return str(path)
+
+@pytest.fixture
+def compiles(tmp_path, monkeypatch):
+    # Caches in tmp_path and counts the input files compiled
+    monkeypatch.setattr(CollectorConfig, "CACHE_DIRECTORY", str(tmp_path / "cache"))
+    compiled_paths = []
+    compile = CollectorConfig.ConfigCompiler.compile
+    def countingCompile(compiler):
+        compiled_paths.append(compiler.path)
+        return compile(compiler)
+    monkeypatch.setattr(CollectorConfig.ConfigCompiler, "compile", countingCompile)
+    return compiled_paths
+
+def test_compiles_the_input_file(compiles):
+    compiled = loadCollectorConfig(INPUT_FILE, False)
+    assert compiled.robot_enabled == ControlEntry("Robot", "enabled")
+    assert [entry.short_name for entry in compiled.entries] == ["DataCollection", "instantAccel", "instantVelocity",
+                                                               "currentTime", "enabled"]
+    assert [trigger.name for trigger in compiled.triggers] == ["robotEnabled", "bump"]
+    assert compiled.snapshot_entries == ("instantAccel", "instantVelocity", "currentTime")
+    assert compiled.graph_columns == frozenset(["currentTime", "instantAccel", "instantVelocity"])
+
+def test_lists_every_error_at_once(tmp_path, compiles):
+    source = inputSource()
+    del source["controls"]["triggerCommand"]
+    source["tables"]["Robot"][0]["type"] = "int"
+    source["graphs"][1]["dataY"] = "speed"
+    source["triggers"].append({"name": "fast", "condition": "speed > 3"})
+    source["triggers"].append({"name": "bump", "condition": "instantAccel < 0"})
+    path = writeInput(tmp_path / "broken.json", source)
+    with pytest.raises(Exception) as error:
+        loadCollectorConfig(path)
+    message = str(error.value)
+    assert message.startswith("{} has 6 errors:".format(path))
+    for problem in ["no triggerCommand entry", "unknown type int", "Graph 'Velocity vs Time' uses speed",
+                    "Trigger robotEnabled uses enabled", "Trigger fast uses speed", "Trigger bump is listed more than once"]:
+        assert problem in message
+    # Broken files are not cached
+    assert not os.path.exists(CollectorConfig.CACHE_DIRECTORY)
+
+def test_reports_invalid_json(tmp_path, compiles):
+    path = tmp_path / "broken.json"
+    path.write_text('{"controls": ')
+    with pytest.raises(Exception, match="is not valid JSON"):
+        loadCollectorConfig(str(path))
+
+def test_second_load_comes_from_the_cache(tmp_path, compiles):
+    path = writeInput(tmp_path / "robot.json", inputSource())
+    first = loadCollectorConfig(path)
+    assert compiles == [path]
+    assert len(os.listdir(CollectorConfig.CACHE_DIRECTORY)) == 1
+    # Another file with the same content is found by its hash
+    copy_path = writeInput(tmp_path / "copy.json", inputSource())
+    second = loadCollectorConfig(copy_path)
+    assert compiles == [path]
+    assert second.path == copy_path
+    assert second._replace(path=path) == first
+
+def test_edited_file_is_compiled_again(tmp_path, compiles):
+    source = inputSource()
+    path = writeInput(tmp_path / "robot.json", source)
+    loadCollectorConfig(path)
+    source["snapshot"]["timeout"] = 0.02
+    writeInput(path, source)
+    assert loadCollectorConfig(path).snapshot_timeout == 0.02
+    assert compiles == [path, path]
+
+def test_edited_compiler_compiles_again(tmp_path, monkeypatch, compiles):
+    path = writeInput(tmp_path / "robot.json", inputSource())
+    loadCollectorConfig(path)
+    monkeypatch.setattr(CollectorConfig, "COMPILER_DIGEST", CollectorConfig.COMPILER_DIGEST[::-1])
+    loadCollectorConfig(path)
+    assert compiles == [path, path]
+    assert len(os.listdir(CollectorConfig.CACHE_DIRECTORY)) == 2
+
+def test_compiler_digest_covers_the_compiler_source():
+    assert CollectorConfig.COMPILER_DIGEST
+    assert CollectorConfig.compilerDigest() == CollectorConfig.COMPILER_DIGEST
+
+def test_unreadable_cache_file_is_compiled_again(tmp_path, compiles):
+    path = writeInput(tmp_path / "robot.json", inputSource())
+    loadCollectorConfig(path)
+    cache_directory = CollectorConfig.CACHE_DIRECTORY
+    for name in os.listdir(cache_directory):
+        with open(os.path.join(cache_directory, name), 'wb') as fp:
+            fp.write(b"not a pickle")
+    loadCollectorConfig(path)
+    assert compiles == [path, path]
+
+def test_without_cache(tmp_path, compiles):
+    path = writeInput(tmp_path / "robot.json", inputSource())
+    loadCollectorConfig(path, False)
+    loadCollectorConfig(path, False)
+    assert compiles == [path, path]
+    assert not os.path.exists(CollectorConfig.CACHE_DIRECTORY)
@@ -0,0 +1,83 @@
+import pytest
+
+from CollectorInstrumentation import CollectorStats, LatencyHistogram
+
+def test_small_values_have_their_own_buckets():
+    histogram = LatencyHistogram()
+    for value in range(LatencyHistogram.LINEAR_LIMIT):
+        assert histogram.bucketIndex(value) == value
+        assert histogram.bucketValue(value) == value
+
+def test_buckets_are_within_three_percent():
+    histogram = LatencyHistogram()
+    previous_index = histogram.bucketIndex(LatencyHistogram.LINEAR_LIMIT - 1)
+    value = LatencyHistogram.LINEAR_LIMIT
+    while value < 10 ** 10:
+        index = histogram.bucketIndex(value)
+        assert index >= previous_index
+        assert histogram.bucketValue(index) == pytest.approx(value, rel=1.0 / LatencyHistogram.SUB_BUCKETS)
+        previous_index = index
+        value = value * 9 // 8 + 1
+
+def test_percentiles_of_a_uniform_spread():
+    histogram = LatencyHistogram()
+    # 1 to 1000 microseconds
+    for value in range(1, 1001):
+        histogram.record(value * 1e-6)
+    assert histogram.count == 1000
+    assert histogram.percentile(50) == pytest.approx(500e-6, rel=0.03)
+    assert histogram.percentile(90) == pytest.approx(900e-6, rel=0.03)
+    assert histogram.percentile(99) == pytest.approx(990e-6, rel=0.03)
+    assert histogram.percentile(100) == pytest.approx(1000e-6, rel=1e-6)
+    summary = histogram.summary()
+    assert summary["min"] == pytest.approx(1e-6, rel=1e-6)
+    assert summary["max"] == pytest.approx(1000e-6, rel=1e-6)
+    assert summary["mean"] == pytest.approx(500.5e-6, rel=1e-3)
+
+def test_percentile_never_exceeds_the_max():
+    histogram = LatencyHistogram()
+    histogram.record(0.0105)
+    assert histogram.percentile(50) <= histogram.max / 1e9
+    assert histogram.percentile(99.9) == pytest.approx(0.0105, rel=1e-6)
+
+def test_negative_values_count_as_zero():
+    histogram = LatencyHistogram()
+    histogram.record(-0.5)
+    assert histogram.min == 0
+    assert histogram.percentile(50) == 0.0
+
+def test_empty_histogram():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(99) == 0.0
+    assert histogram.summary()["count"] == 0
+
+def recordRows(stats, rows):
+    for index, row in enumerate(rows):
+        start = index * 0.01
+        stats.recordSample(start, start + 1e-5, start + 2e-5, start + 3e-5, row)
+
+def test_counts_unchanged_values_and_duplicate_rows():
+    stats = CollectorStats(["enabled", "accel", "time"])
+    unchanged = stats.unchanged
+    recordRows(stats, [[True, 0.0, 0.00],
+                       [True, 0.0, 0.01],
+                       [True, 1.5, 0.02],
+                       [True, 1.5, 0.02],
+                       [False, 1.5, 0.03]])
+    assert stats.samples == 5
+    assert stats.duplicate_rows == 1
+    # Counted in the same list
+    assert stats.unchanged is unchanged
+    assert stats.summary()["unchangedValues"] == {"enabled": 3, "accel": 3, "time": 1}
+
+def test_records_stage_times():
+    stats = CollectorStats(["time"])
+    recordRows(stats, [[0.0], [0.01], [0.02]])
+    # Samples without an acquire stage, e.x: entry updates
+    stats.recordSample(0.03, None, 0.03 + 2e-5, 0.03 + 3e-5, [0.03])
+    summary = stats.summary()
+    assert summary["stages"]["acquire"]["count"] == 3
+    assert summary["stages"]["build"]["count"] == 4
+    assert summary["stages"]["enqueue"]["p50"] == pytest.approx(1e-5, rel=0.03)
+    assert summary["intervals"]["count"] == 3
+    assert summary["seconds"] == pytest.approx(0.03)
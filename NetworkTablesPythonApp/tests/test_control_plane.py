@@ -0,0 +1,177 @@
+import time
+import threading
+import pytest
+
+pytest.importorskip("networktables")
+import ControlPlane
+from ControlPlane import BooleanWatcher, SettleWatcher
+
+# Entry that keeps its value and listeners in memory. Tests call the
+# listeners themselves, the way the NetworkTables thread would.
+class FakeEntry(object):
+    def __init__(self, value=None):
+        self.value = value
+        self.listeners = {}
+
+    def getBoolean(self, default):
+        return default if self.value is None else self.value
+
+    def getDouble(self, default):
+        return default if self.value is None else self.value
+
+    def setBoolean(self, value):
+        self.value = value
+
+    def addListener(self, listener, flags):
+        listener_id = len(self.listeners) + 1
+        self.listeners[listener_id] = listener
+        return listener_id
+
+    def removeListener(self, listener_id):
+        del self.listeners[listener_id]
+
+    def update(self, value):
+        self.value = value
+        for listener in list(self.listeners.values()):
+            listener(self, "key", value, False)
+
+class FakeTable(object):
+    def __init__(self):
+        self.entries = {}
+
+    def getEntry(self, key):
+        return self.entries.setdefault(key, FakeEntry())
+
+class FakeNotifyFlags(object):
+    NEW = 1
+    UPDATE = 2
+
+class FakeNetworkTables(object):
+    NotifyFlags = FakeNotifyFlags
+
+    def __init__(self):
+        self.tables = {}
+
+    def getTable(self, name):
+        return self.tables.setdefault(name, FakeTable())
+
+# time.monotonic for isSettled, only moves when told to
+class FakeClock(object):
+    def __init__(self):
+        self.now = 50.0
+
+    def monotonic(self):
+        return self.now
+
+def updateLater(entry, values, interval):
+    # Sends values to the listeners from another thread, like NetworkTables
+    def send():
+        for value in values:
+            time.sleep(interval)
+            entry.update(value)
+    thread = threading.Thread(target=send, daemon=True)
+    thread.start()
+    return thread
+
+def test_counts_rising_and_falling_edges():
+    entry = FakeEntry(False)
+    watcher = BooleanWatcher(threading.Condition(), entry, 3)
+    for value in [True, True, False, True, False, False]:
+        entry.update(value)
+    assert watcher.rising_edges == 2
+    assert watcher.falling_edges == 2
+    assert watcher.value is False
+
+def test_starts_from_the_entry_value():
+    entry = FakeEntry(True)
+    watcher = BooleanWatcher(threading.Condition(), entry, 3)
+    assert watcher.value is True
+    entry.update(True)
+    assert watcher.rising_edges == 0
+
+def test_set_counts_our_own_change():
+    entry = FakeEntry(False)
+    watcher = BooleanWatcher(threading.Condition(), entry, 3)
+    watcher.set(True)
+    assert entry.value is True
+    assert watcher.rising_edges == 1
+    assert watcher.waitFor(True, timeout=0)
+
+def test_wait_for_rise_after_a_count():
+    entry = FakeEntry(False)
+    watcher = BooleanWatcher(threading.Condition(), entry, 3)
+    count = watcher.rising_edges
+    thread = updateLater(entry, [True, False], 0.01)
+    assert watcher.waitForRise(count, timeout=2.0)
+    assert watcher.waitForFall(timeout=2.0)
+    thread.join()
+    # An edge that happened before the wait started still counts
+    assert watcher.waitForRise(count, timeout=0)
+
+def test_waits_time_out():
+    entry = FakeEntry(False)
+    watcher = BooleanWatcher(threading.Condition(), entry, 3)
+    start = time.monotonic()
+    assert not watcher.waitFor(True, timeout=0.05)
+    assert not watcher.waitForRise(timeout=0.05)
+    assert not watcher.waitForFall(timeout=0.05)
+    assert time.monotonic() - start >= 0.15
+
+def test_settled_once_the_value_stops_moving(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ControlPlane.time, "monotonic", clock.monotonic)
+    entry = FakeEntry(0.0)
+    watcher = SettleWatcher(threading.Condition(), entry, 3, tolerance=0.1)
+    clock.now += 0.3
+    entry.update(5.0)
+    assert not watcher.isSettled(0.2)
+    clock.now += 0.25
+    assert watcher.isSettled(0.2)
+
+def test_slow_creep_still_counts_as_moving(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ControlPlane.time, "monotonic", clock.monotonic)
+    entry = FakeEntry(0.0)
+    watcher = SettleWatcher(threading.Condition(), entry, 3, tolerance=0.1)
+    # Every step is within tolerance, together they are not
+    for step in range(1, 5):
+        clock.now += 0.1
+        entry.update(step * 0.06)
+    assert watcher.reference == pytest.approx(0.24)
+    assert watcher.last_change == pytest.approx(50.4)
+    clock.now += 0.15
+    assert not watcher.isSettled(0.2)
+
+def test_settled_ignores_changes_before_since(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ControlPlane.time, "monotonic", clock.monotonic)
+    entry = FakeEntry(0.0)
+    watcher = SettleWatcher(threading.Condition(), entry, 3)
+    clock.now += 1.0
+    assert watcher.isSettled(0.5)
+    assert not watcher.isSettled(0.5, since=clock.now - 0.2)
+
+def test_wait_for_settle():
+    entry = FakeEntry(0.0)
+    watcher = SettleWatcher(threading.Condition(), entry, 3, tolerance=0.1)
+    # Still moving when the timeout ends
+    thread = updateLater(entry, [index * 1.0 for index in range(1, 40)], 0.01)
+    assert not watcher.waitForSettle(0.1, timeout=0.2)
+    thread.join()
+    # Stops moving
+    assert watcher.waitForSettle(0.05, timeout=2.0)
+
+def test_control_plane_waits_on_several_entries():
+    nt = FakeNetworkTables()
+    control_plane = ControlPlane.ControlPlane(nt)
+    enabled = control_plane.watchBoolean("Robot", "enabled")
+    running = control_plane.watchBoolean("Drive", "running")
+    enabled_entry = nt.getTable("Robot").getEntry("enabled")
+    running_entry = nt.getTable("Drive").getEntry("running")
+    assert enabled_entry.listeners and running_entry.listeners
+    updateLater(enabled_entry, [True], 0.01)
+    updateLater(running_entry, [True], 0.03)
+    assert control_plane.waitUntil(lambda: enabled.value and running.value, timeout=2.0)
+    assert not control_plane.waitUntil(lambda: not enabled.value, timeout=0.02)
+    control_plane.close()
+    assert not enabled_entry.listeners and not running_entry.listeners
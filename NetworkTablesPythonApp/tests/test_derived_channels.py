@@ -0,0 +1,111 @@
+import math
+import pytest
+
+from DerivedChannels import DerivedChannel, DerivedColumns, parseExpression
+
+def derivedColumns(definitions, column_names, chained=True):
+    # definitions are (name, expression) or (name, expression, type)
+    channels = []
+    for definition in definitions:
+        name, expression = definition[0], definition[1]
+        value_type = definition[2] if len(definition) > 2 else "double"
+        tree, columns = parseExpression(name, expression)
+        channels.append(DerivedChannel(name, expression, value_type, columns))
+    column_indexes = {name: index for index, name in enumerate(column_names)}
+    return DerivedColumns(channels, column_indexes, chained=chained)
+
+def derivedValues(derived, rows):
+    # Derived values of every row, in order
+    return [derived.appendTo(list(row))[len(row):] for row in rows]
+
+def test_columns_in_order_of_first_use():
+    tree, columns = parseExpression("x", "abs(b - a) + b * pi")
+    assert columns == ("b", "a")
+    tree, columns = parseExpression("x", "integral(instantAccel)")
+    assert columns == ("currentTime", "instantAccel")
+
+@pytest.mark.parametrize("expression", ["__import__('os')", "a.real", "'text'", "[a]", "a[0]", "lambda: a",
+                                        "unknown(a)", "prev(a, b)", "integral()", "delta()", "abs(a, key=b)", ""])
+def test_rejects_unsupported_expressions(expression):
+    with pytest.raises(Exception):
+        parseExpression("x", expression)
+
+def test_chained_columns():
+    derived = derivedColumns([("expectedDistance", "drivingDistance * sign(drivingSpeed)"),
+                              ("stoppingDistance", "abs(actualDistance - expectedDistance)"),
+                              ("stopped", "stoppingDistance < 1", "boolean")],
+                             ["drivingDistance", "drivingSpeed", "actualDistance"])
+    assert derivedValues(derived, [[36.0, -0.5, -36.5], [36.0, 0.5, 38.0]]) == [[-36.0, 0.5, True], [36.0, 2.0, False]]
+
+def test_evaluate_leaves_the_row_alone():
+    derived = derivedColumns([("double", "a * 2")], ["a"])
+    row = [1.5]
+    assert derived.evaluate(row) == [3.0]
+    assert row == [1.5]
+
+def test_prev_and_delta():
+    derived = derivedColumns([("previous", "prev(a)"), ("change", "delta(a)")], ["a"])
+    assert derivedValues(derived, [[1.0], [4.0], [2.0]]) == [[1.0, 0.0], [1.0, 3.0], [4.0, -2.0]]
+
+def test_every_call_keeps_its_own_state():
+    derived = derivedColumns([("twice", "prev(a) + prev(a * 10)")], ["a"])
+    assert derivedValues(derived, [[1.0], [2.0], [3.0]]) == [[11.0], [11.0], [22.0]]
+
+def test_integral_is_trapezoidal_over_current_time():
+    derived = derivedColumns([("velocity", "integral(accel)")], ["accel", "currentTime"])
+    rows = [[0.0, 0.0], [2.0, 0.5], [2.0, 1.0], [0.0, 2.0]]
+    assert derivedValues(derived, rows) == [[0.0], [0.5], [1.5], [2.5]]
+
+def test_integral_over_another_column():
+    derived = derivedColumns([("distance", "integral(speed, t)")], ["speed", "t"])
+    assert derivedValues(derived, [[1.0, 10.0], [3.0, 12.0]]) == [[0.0], [4.0]]
+
+def test_integral_skips_repeated_and_earlier_times():
+    derived = derivedColumns([("velocity", "integral(accel)")], ["accel", "currentTime"])
+    rows = [[1.0, 0.0], [1.0, 1.0], [5.0, 1.0], [1.0, 0.5], [1.0, 1.5]]
+    assert derivedValues(derived, rows) == [[0.0], [1.0], [1.0], [1.0], [2.0]]
+
+def test_integral_skips_missing_values():
+    derived = derivedColumns([("velocity", "integral(accel)")], ["accel", "currentTime"])
+    nan = float('nan')
+    rows = [[nan, 0.0], [1.0, 1.0], [nan, 2.0], [1.0, nan], [3.0, 3.0]]
+    assert derivedValues(derived, rows) == [[0.0], [0.0], [0.0], [0.0], [4.0]]
+
+def test_reset_starts_over():
+    derived = derivedColumns([("velocity", "integral(accel)"), ("previous", "prev(accel)")], ["accel", "currentTime"])
+    derivedValues(derived, [[1.0, 0.0], [1.0, 1.0]])
+    derived.reset()
+    assert derivedValues(derived, [[2.0, 5.0], [2.0, 6.0]]) == [[0.0, 2.0], [2.0, 2.0]]
+
+def test_math_errors_give_nan():
+    derived = derivedColumns([("ratio", "a / b"), ("root", "sqrt(a)"), ("bigger", "ratio > 1", "boolean")], ["a", "b"])
+    values = derivedValues(derived, [[-1.0, 0.0]])[0]
+    assert math.isnan(values[0])
+    assert math.isnan(values[1])
+    assert values[2] is False
+
+def test_missing_columns_give_nan_or_false():
+    derived = derivedColumns([("speed", "input * 2"), ("fast", "speed > 1", "boolean"), ("sum", "speed + a"),
+                              ("scaled", "a * 3")],
+                             ["a"])
+    assert derived.unavailable == [("speed", ("input",))]
+    values = derivedValues(derived, [[1.0]])[0]
+    assert math.isnan(values[0])
+    # Comparisons with NaN are False and NaN carries through arithmetic
+    assert values[1] is False
+    assert math.isnan(values[2])
+    assert values[3] == 3.0
+
+def test_boolean_column_with_missing_columns_is_false():
+    derived = derivedColumns([("running", "input > 0", "boolean")], ["a"])
+    assert derivedValues(derived, [[1.0]]) == [[False]]
+
+def test_unchained_expressions_must_use_collected_columns():
+    with pytest.raises(Exception, match="not collected"):
+        derivedColumns([("bump", "abs(accel) > 200", "boolean")], ["a"], chained=False)
+
+def test_unchained_expressions_do_not_add_columns():
+    derived = derivedColumns([("bump", "a > 2", "boolean"), ("low", "a < 0", "boolean")], ["a"], chained=False)
+    assert derived.evaluate([3.0]) == [True, False]
+    with pytest.raises(Exception):
+        derivedColumns([("bump", "a > 2", "boolean"), ("again", "bump", "boolean")], ["a"], chained=False)
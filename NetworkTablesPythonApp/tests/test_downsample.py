@@ -0,0 +1,59 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+from Downsample import largestTriangleThreeBuckets, minMaxDecimate
+
+def sineTrace(count):
+    x = np.arange(count, dtype=float)
+    return x, np.sin(x / 50.0)
+
+def test_lttb_keeps_first_and_last_point():
+    x, y = sineTrace(1000)
+    sampled_x, sampled_y = largestTriangleThreeBuckets(x, y, 50)
+    assert len(sampled_x) == len(sampled_y) == 50
+    assert sampled_x[0] == x[0] and sampled_y[0] == y[0]
+    assert sampled_x[-1] == x[-1] and sampled_y[-1] == y[-1]
+
+def test_lttb_keeps_points_in_order_and_from_the_trace():
+    x, y = sineTrace(1000)
+    sampled_x, sampled_y = largestTriangleThreeBuckets(x, y, 50)
+    assert np.all(np.diff(sampled_x) > 0)
+    indexes = sampled_x.astype(int)
+    assert np.array_equal(sampled_y, y[indexes])
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(10000, dtype=float)
+    y = np.zeros(10000)
+    y[5003] = 100.0
+    sampled_x, sampled_y = largestTriangleThreeBuckets(x, y, 100)
+    assert 5003.0 in sampled_x
+    assert sampled_y.max() == 100.0
+
+@pytest.mark.parametrize("count, threshold", [(100, 100), (10, 100), (100, 2), (100, 0)])
+def test_lttb_returns_short_traces_as_given(count, threshold):
+    x, y = sineTrace(count)
+    sampled_x, sampled_y = largestTriangleThreeBuckets(x, y, threshold)
+    assert sampled_x is x and sampled_y is y
+
+def test_lttb_of_one_more_point_than_the_threshold():
+    x, y = sineTrace(4)
+    sampled_x, sampled_y = largestTriangleThreeBuckets(x, y, 3)
+    assert list(sampled_x[[0, -1]]) == [0.0, 3.0]
+    assert len(sampled_x) == 3
+
+def test_min_max_keeps_extremes_and_the_last_point():
+    x = np.arange(1001, dtype=float)
+    y = np.zeros(1001)
+    y[123] = 5.0
+    y[877] = -7.0
+    y[-1] = 1.0
+    sampled_x, sampled_y = minMaxDecimate(x, y, 10)
+    assert len(sampled_x) <= 2 * 10 + 1
+    assert 123.0 in sampled_x and 877.0 in sampled_x
+    assert sampled_x[-1] == 1000.0
+    assert np.all(np.diff(sampled_x) >= 0)
+
+def test_min_max_returns_short_traces_as_given():
+    x, y = sineTrace(20)
+    sampled_x, sampled_y = minMaxDecimate(x, y, 10)
+    assert sampled_x is x and sampled_y is y
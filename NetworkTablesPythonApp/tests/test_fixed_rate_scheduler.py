@@ -0,0 +1,78 @@
+import time
+import pytest
+
+from FixedRateScheduler import FixedRateScheduler
+
+# Clock that only moves when the scheduler sleeps or a tick takes time
+class FakeClock(object):
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake_clock.monotonic)
+    monkeypatch.setattr(time, "sleep", fake_clock.sleep)
+    return fake_clock
+
+def runTicks(clock, scheduler, tick_lengths=None, keep_running=None):
+    # Runs the scheduler and returns when every tick started, from the start
+    # of the run. tick_lengths maps a tick to how long it takes.
+    start = clock.now
+    tick_starts = []
+    def tick():
+        tick_starts.append(clock.now - start)
+        if tick_lengths is not None:
+            clock.now += tick_lengths.get(len(tick_starts) - 1, 0.0)
+    scheduler.run(tick, keep_running)
+    return tick_starts
+
+def test_ticks_start_on_their_deadlines(clock):
+    scheduler = FixedRateScheduler(4.0, 2.0)
+    tick_starts = runTicks(clock, scheduler)
+    assert tick_starts == pytest.approx([0.0, 0.25, 0.5, 0.75, 1.0, 1.25, 1.5, 1.75])
+    assert scheduler.ticks == 8
+    assert scheduler.skipped_ticks == 0
+    assert clock.sleeps == pytest.approx([0.25] * 7)
+    assert scheduler.lateness.max == 0
+    assert scheduler.elapsed == pytest.approx(1.75)
+
+def test_overrunning_tick_skips_the_deadlines_it_missed(clock):
+    scheduler = FixedRateScheduler(4.0, 2.0)
+    # The third tick runs past the deadlines at 0.75 and 1.0
+    tick_starts = runTicks(clock, scheduler, {2: 0.6})
+    # The deadline at 0.75 is skipped, the one at 1.0 runs late and the
+    # ticks after it are back on their deadlines
+    assert tick_starts == pytest.approx([0.0, 0.25, 0.5, 1.1, 1.25, 1.5, 1.75])
+    assert scheduler.ticks == 7
+    assert scheduler.skipped_ticks == 1
+    assert scheduler.lateness.max / 1e9 == pytest.approx(0.1, rel=0.01)
+
+def test_long_overrun_skips_several_ticks(clock):
+    scheduler = FixedRateScheduler(10.0, 1.0)
+    tick_starts = runTicks(clock, scheduler, {0: 0.55})
+    assert tick_starts == pytest.approx([0.0, 0.55, 0.6, 0.7, 0.8, 0.9])
+    assert scheduler.ticks == 6
+    assert scheduler.skipped_ticks == 4
+    assert scheduler.ticks + scheduler.skipped_ticks == 10
+
+def test_keep_running_stops_a_run_without_duration(clock):
+    scheduler = FixedRateScheduler(50.0)
+    runTicks(clock, scheduler, keep_running=lambda: scheduler.ticks < 5)
+    assert scheduler.ticks == 5
+    assert scheduler.elapsed == pytest.approx(0.08)
+    assert scheduler.achievedRate() == pytest.approx(62.5)
+
+def test_rate_must_be_positive():
+    with pytest.raises(Exception):
+        FixedRateScheduler(0)
+    with pytest.raises(Exception):
+        FixedRateScheduler(-10.0)
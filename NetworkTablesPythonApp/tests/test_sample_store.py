@@ -0,0 +1,59 @@
+import pytest
+
+from SampleStore import ColumnarSampleStore
+
+COLUMNS = [("time", "double", 0), ("enabled", "boolean", 2)]
+
+def offerRows(store, count, start=0):
+    for index in range(start, start + count):
+        store.appendRow([float(index), "skipped", index % 3 == 0])
+
+def test_keeps_every_row_without_max_rows():
+    store = ColumnarSampleStore(COLUMNS, initial_capacity=4)
+    offerRows(store, 10)
+    assert len(store) == 10
+    assert store.rowsOffered() == 10
+    assert list(store.column("time")) == [float(index) for index in range(10)]
+    assert list(store.column("enabled")) == [index % 3 == 0 for index in range(10)]
+
+def test_skips_columns_that_cannot_be_stored():
+    store = ColumnarSampleStore(COLUMNS + [("name", "string", 1)])
+    assert store.columnNames() == ["time", "enabled"]
+    assert "name" not in store
+
+def test_thins_to_every_other_row_once_full():
+    store = ColumnarSampleStore(COLUMNS, max_rows=8)
+    offerRows(store, 9)
+    assert list(store.column("time")) == [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert store.stride == 2
+
+def test_keeps_rows_evenly_spread_over_the_run():
+    store = ColumnarSampleStore(COLUMNS, max_rows=8)
+    offerRows(store, 20)
+    assert list(store.column("time")) == [0.0, 4.0, 8.0, 12.0, 16.0]
+    assert list(store.column("enabled")) == [True, False, False, True, False]
+    assert store.rowsOffered() == 20
+
+def test_long_run_stays_under_max_rows():
+    store = ColumnarSampleStore(COLUMNS, max_rows=100)
+    offerRows(store, 100)
+    memory = store.memoryUsage()
+    offerRows(store, 99900, 100)
+    times = list(store.column("time"))
+    assert 50 <= len(store) <= 100
+    assert times[0] == 0.0
+    assert len(set(b - a for a, b in zip(times, times[1:]))) == 1
+    assert store.memoryUsage() == memory
+
+def test_odd_max_rows_is_rounded_down():
+    store = ColumnarSampleStore(COLUMNS, max_rows=7)
+    assert store.max_rows == 6
+    offerRows(store, 7)
+    assert list(store.column("time")) == [0.0, 2.0, 4.0, 6.0]
+
+def test_column_array_views_the_kept_rows():
+    np = pytest.importorskip("numpy")
+    store = ColumnarSampleStore(COLUMNS, max_rows=8)
+    offerRows(store, 9)
+    np.testing.assert_array_equal(store.columnArray("time"), [0.0, 2.0, 4.0, 6.0, 8.0])
+    assert store.columnArray("enabled").dtype == bool
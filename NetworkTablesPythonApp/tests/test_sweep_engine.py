@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip("networktables")
+from SweepEngine import (CARTESIAN_SWEEP, ZIP_SWEEP, compileSweepInput, decimalPlaces,
+                         rangeValues, sweepRuns)
+
+def test_range_of_whole_steps():
+    assert rangeValues(0, 1, 0.25) == [0.0, 0.25, 0.5, 0.75, 1.0]
+    assert rangeValues(-1, 1, 0.5) == [-1.0, -0.5, 0.0, 0.5, 1.0]
+
+def test_range_rounds_away_floating_point_drift():
+    assert rangeValues(0, 0.3, 0.1) == [0.0, 0.1, 0.2, 0.3]
+    assert rangeValues(0.1, 0.7, 0.2) == [0.1, 0.3, 0.5, 0.7]
+
+def test_range_appends_end_that_is_not_a_whole_step():
+    assert rangeValues(0, 1, 0.3) == [0.0, 0.3, 0.6, 0.9, 1]
+    assert rangeValues(0, 10, 4) == [0, 4, 8, 10]
+
+def test_range_counts_down():
+    assert rangeValues(1, 0, -0.5) == [1.0, 0.5, 0.0]
+
+def test_range_of_one_value():
+    assert rangeValues(36, 36, 0) == [36]
+
+@pytest.mark.parametrize("start, end, increment", [(0, 1, 0), (0, 1, -0.1), (1, 0, 0.1)])
+def test_range_that_never_reaches_its_end(start, end, increment):
+    with pytest.raises(Exception):
+        rangeValues(start, end, increment)
+
+def test_decimal_places():
+    assert decimalPlaces(0.25) == 2
+    assert decimalPlaces(1) == 1
+    assert decimalPlaces(1e-20) == 15
+
+def test_compile_range_and_value_inputs():
+    speed = compileSweepInput("Shuffleboard/Drive", {"name": "DriveDistance/drivingSpeed",
+                                                     "rangeStart": 0, "rangeEnd": 1, "increment": 0.5})
+    assert speed.short_name == "drivingSpeed"
+    assert speed.type == "double"
+    assert speed.values == [0.0, 0.5, 1.0]
+    distance = compileSweepInput("Shuffleboard/Drive", {"name": "DriveDistance/drivingDistance", "values": [24, 36]})
+    assert distance.values == [24, 36]
+
+@pytest.mark.parametrize("input_entry", [
+    {"values": [1]},
+    {"name": "speed", "values": []},
+    {"name": "speed", "rangeStart": 0, "rangeEnd": 1},
+    {"name": "reversed", "type": "boolean", "rangeStart": 0, "rangeEnd": 1, "increment": 1},
+])
+def test_compile_invalid_inputs(input_entry):
+    with pytest.raises(Exception):
+        compileSweepInput("Shuffleboard/Drive", input_entry)
+
+def sweepInputs(*value_lists):
+    return [compileSweepInput("Table", {"name": "input{}".format(index), "values": values})
+            for index, values in enumerate(value_lists)]
+
+def test_cartesian_sweep_changes_the_first_input_slowest():
+    runs = sweepRuns(sweepInputs([1, 2], ["a", "b", "c"]), CARTESIAN_SWEEP)
+    assert runs == [(1, "a"), (1, "b"), (1, "c"), (2, "a"), (2, "b"), (2, "c")]
+
+def test_zip_sweep_holds_single_values_constant():
+    runs = sweepRuns(sweepInputs([1, 2, 3], [36], ["a", "b", "c"]), ZIP_SWEEP)
+    assert runs == [(1, 36, "a"), (2, 36, "b"), (3, 36, "c")]
+
+def test_zip_sweep_of_single_values_runs_once():
+    assert sweepRuns(sweepInputs([1], [2]), ZIP_SWEEP) == [(1, 2)]
+
+def test_zip_sweep_needs_lists_of_one_length():
+    with pytest.raises(Exception):
+        sweepRuns(sweepInputs([1, 2], [1, 2, 3]), ZIP_SWEEP)
+
+def test_unknown_sweep():
+    with pytest.raises(Exception):
+        sweepRuns(sweepInputs([1]), "spiral")
@@ -0,0 +1,163 @@
+import csv
+import time
+import pytest
+
+pytest.importorskip("networktables")
+from DerivedChannels import DerivedColumns
+from TriggeredCapture import EventRowSink, TriggeredRowWriter, parseTriggerArgument
+
+# Rows are [accel, time], one every PERIOD seconds
+PERIOD = 0.125
+COLUMN_INDEXES = {"accel": 0, "t": 1}
+
+class MemorySink(object):
+    def __init__(self):
+        self.rows = []
+        self.closed = False
+
+    def writeRows(self, rows):
+        self.rows.extend(rows)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+# Hands rows and markers straight to the sink, in place of the writer thread
+class DirectRowWriter(object):
+    def __init__(self, sink):
+        self.sink = sink
+        self.dropped_rows = 0
+
+    def writeRow(self, row):
+        self.sink.writeRows([row])
+        return True
+
+    def close(self):
+        self.sink.close()
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake_clock = FakeClock()
+    monkeypatch.setattr(time, "monotonic", fake_clock.monotonic)
+    return fake_clock
+
+def openCapture(triggers, pre_trigger=0.5, post_trigger=0.25, max_buffered_rows=1000, max_events=None, event_log_path=None):
+    # Returns the TriggeredRowWriter and the sinks of the events by index
+    conditions = DerivedColumns([parseTriggerArgument(trigger) for trigger in triggers], COLUMN_INDEXES, "Trigger", chained=False)
+    event_sinks = {}
+    def openSink(index):
+        event_sinks[index] = MemorySink()
+        return "event{}.csv".format(index), event_sinks[index]
+    event_sink = EventRowSink(openSink, event_log_path)
+    writer = TriggeredRowWriter(conditions, DirectRowWriter(event_sink), pre_trigger, post_trigger, max_buffered_rows, max_events)
+    return writer, event_sinks
+
+def writeRows(clock, writer, accels, first_index=0):
+    for index, accel in enumerate(accels, first_index):
+        clock.now = index * PERIOD
+        writer.writeRow([accel, index * PERIOD])
+
+def rowIndexes(sink):
+    return [int(row[1] / PERIOD) for row in sink.rows]
+
+def test_event_holds_the_pre_and_post_trigger_windows(clock):
+    writer, event_sinks = openCapture(["bump=abs(accel) > 200"])
+    accels = [0.0] * 20
+    accels[10] = 300.0
+    writeRows(clock, writer, accels)
+    writer.close()
+    assert list(event_sinks) == [1]
+    # 0.5 seconds before the row that fired and 0.25 seconds after it
+    assert rowIndexes(event_sinks[1]) == [5, 6, 7, 8, 9, 10, 11, 12]
+    assert event_sinks[1].closed
+    assert writer.events == 1
+    assert writer.rows == 20
+    assert writer.row_writer.sink.written_rows == 8
+
+def test_trigger_while_writing_extends_the_event(clock):
+    writer, event_sinks = openCapture(["bump=accel > 200", "low=accel < -100"])
+    accels = [0.0] * 30
+    accels[10] = 300.0
+    accels[12] = -300.0
+    accels[20] = 300.0
+    writeRows(clock, writer, accels)
+    writer.close()
+    assert list(event_sinks) == [1, 2]
+    assert rowIndexes(event_sinks[1]) == [5, 6, 7, 8, 9, 10, 11, 12, 13, 14]
+    # Rows of the first event are not in the pre-trigger window of the next
+    assert rowIndexes(event_sinks[2]) == [15, 16, 17, 18, 19, 20, 21, 22]
+
+def test_event_log_lists_every_event(tmp_path, clock):
+    log_path = str(tmp_path / "events.csv")
+    writer, event_sinks = openCapture(["bump=accel > 200", "low=accel < -100"], event_log_path=log_path)
+    accels = [0.0] * 20
+    accels[10] = 300.0
+    accels[11] = -300.0
+    writeRows(clock, writer, accels)
+    writer.close()
+    with open(log_path, newline='') as fp:
+        events = list(csv.DictReader(fp))
+    assert len(events) == 1
+    assert events[0]["event"] == "1"
+    assert events[0]["file"] == "event1.csv"
+    assert events[0]["triggers"] == "bump low"
+    assert events[0]["preTriggerRows"] == "5"
+    assert events[0]["rows"] == "9"
+
+def test_condition_true_from_the_first_row_waits_for_an_edge(clock):
+    writer, event_sinks = openCapture(["enabled=accel > 0"])
+    writeRows(clock, writer, [1.0] * 10 + [0.0] * 5 + [1.0] * 5)
+    writer.close()
+    assert list(event_sinks) == [1]
+    assert rowIndexes(event_sinks[1])[5] == 15
+
+def test_close_ends_an_event_in_its_post_trigger_window(clock):
+    writer, event_sinks = openCapture(["bump=accel > 200"], post_trigger=10.0)
+    writeRows(clock, writer, [0.0] * 5 + [300.0] * 3)
+    assert writer.event_open
+    writer.close()
+    assert not writer.event_open
+    assert rowIndexes(event_sinks[1]) == [0, 1, 2, 3, 4, 5, 6, 7]
+    assert event_sinks[1].closed
+
+def test_max_events_ends_the_capture(clock):
+    writer, event_sinks = openCapture(["bump=accel > 200"], max_events=1)
+    accels = [0.0] * 30
+    accels[10] = 300.0
+    accels[20] = 300.0
+    writeRows(clock, writer, accels[:15])
+    assert writer.finished
+    writeRows(clock, writer, accels[15:], 15)
+    writer.close()
+    assert list(event_sinks) == [1]
+    assert writer.events == 1
+
+def test_buffer_memory_stays_the_same(clock):
+    writer, event_sinks = openCapture(["bump=accel > 200"], pre_trigger=1000.0, max_buffered_rows=16)
+    writeRows(clock, writer, [0.0] * 5000)
+    assert len(writer.buffer) == 16
+    writeRows(clock, writer, [300.0], 5000)
+    writer.close()
+    # The window of 1000 seconds held more rows than the buffer
+    assert rowIndexes(event_sinks[1])[:16] == list(range(4984, 5000))
+    assert writer.event_pre_rows == 16
+    assert writer.short_windows == 1
+
+def test_rows_without_an_open_event_are_counted_as_lost():
+    sinks = []
+    def openSink(index):
+        sinks.append(MemorySink())
+        return "event{}.csv".format(index), sinks[-1]
+    event_sink = EventRowSink(openSink)
+    event_sink.writeRows([[1.0, 0.0], [2.0, 0.125]])
+    assert event_sink.lost_rows == 2
+    assert sinks == []